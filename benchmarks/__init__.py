@@ -0,0 +1,12 @@
+"""
+离线基准测试。
+
+所有基准测试都运行在 `LocalBackend` 之上，不访问网络，测得的是本库和 leancloud SDK 自身的开销。
+
+运行方式： ::
+
+    python -m benchmarks                      # 全部
+    python -m benchmarks 'query.*' --rows 100000
+    python -m benchmarks --save before.json
+    python -m benchmarks --compare before.json
+"""
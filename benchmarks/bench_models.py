@@ -0,0 +1,121 @@
+import io
+import json
+
+from benchmarks.harness import benchmark
+from leancloud_better_storage.storage.fields import DateTimeField, Field, NumberField, StringField
+from leancloud_better_storage.storage.models import Model
+
+
+def wide_model(n_fields, name='BenchWide'):
+    attributes = {'__lc_cls__': name}
+    attributes.update(('field_{}'.format(i), Field()) for i in range(n_fields))
+    return type(name, (Model,), attributes)
+
+
+class BenchPerson(Model):
+    name = StringField(max_length=32)
+    age = NumberField()
+    score = NumberField(default=0)
+    bio = Field()
+
+
+class BenchStamped(Model):
+    name = StringField(max_length=32)
+    created = DateTimeField(auto_now_add=True)
+    modified = DateTimeField(auto_now=True)
+
+
+def people(n):
+    return [BenchPerson.create(name='person {}'.format(i), age=i % 100, bio='bio') for i in range(n)]
+
+
+@benchmark('model.create[3 fields]')
+def create_narrow(ctx):
+    return lambda: BenchPerson.create(name='remilia', age=549)
+
+
+@benchmark('model.create[30 fields]')
+def create_wide(ctx):
+    model = wide_model(30)
+    values = {'field_{}'.format(i): i for i in range(30)}
+    return lambda: model.create(**values)
+
+
+@benchmark('model.commit[single]')
+def commit_single(ctx):
+    return (lambda: BenchPerson.create(name='flandre', age=495)), (lambda instance: instance.commit())
+
+
+@benchmark('model.commit_all[{rows}]', scaled=True)
+def commit_all(ctx):
+    return (lambda: people(ctx.rows)), (lambda instances: BenchPerson.commit_all(*instances))
+
+
+@benchmark('model.drop_all[{rows}]', scaled=True)
+def drop_all(ctx):
+    def setup():
+        instances = people(ctx.rows)
+        BenchPerson.commit_all(*instances)
+        return instances
+
+    return setup, (lambda instances: BenchPerson.drop_all(*instances))
+
+
+@benchmark('model.commit_all[{rows} @5ms rtt, 1 worker]', scaled=True)
+def commit_all_serial_with_latency(ctx):
+    ctx.backend.latency = 0.005
+    return (lambda: people(ctx.rows)), (lambda instances: BenchPerson.commit_all(*instances, workers=1))
+
+
+@benchmark('model.commit_all[{rows} @5ms rtt, 8 workers]', scaled=True)
+def commit_all_concurrent_with_latency(ctx):
+    ctx.backend.latency = 0.005
+    return (lambda: people(ctx.rows)), (lambda instances: BenchPerson.commit_all(*instances, workers=8))
+
+
+@benchmark('model.commit_all[100k, lifecycle hooks]')
+def commit_all_with_hooks(ctx):
+    # run repeatedly in one process: cost per commit must not grow with the number of previous commits.
+    def setup():
+        return [BenchStamped.create(name='stamped {}'.format(i)) for i in range(100000)]
+
+    return setup, (lambda instances: BenchStamped.commit_all(*instances, chunk_size=500))
+
+
+@benchmark('model.create x{rows}', scaled=True)
+def create_loop(ctx):
+    rows = [{'name': 'person {}'.format(i), 'age': i % 100, 'bio': 'bio'} for i in range(ctx.rows)]
+    return lambda: [BenchPerson.create(**row) for row in rows]
+
+
+@benchmark('model.create_many[{rows} dicts]', scaled=True)
+def create_many_dicts(ctx):
+    rows = [{'name': 'person {}'.format(i), 'age': i % 100, 'bio': 'bio'} for i in range(ctx.rows)]
+    return lambda: BenchPerson.create_many(rows)
+
+
+@benchmark('model.create_many[{rows} columns]', scaled=True)
+def create_many_columns(ctx):
+    columns = {
+        'name': ['person {}'.format(i) for i in range(ctx.rows)],
+        'age': [i % 100 for i in range(ctx.rows)],
+        'bio': ['bio'] * ctx.rows,
+    }
+    return lambda: BenchPerson.create_many(columns)
+
+
+def people_jsonl(n):
+    return ''.join(json.dumps({'name': 'person {}'.format(i), 'age': i % 100, 'bio': 'bio'}) + '\n' for i in range(n))
+
+
+@benchmark('model.bulk_import[{rows} jsonl]', scaled=True)
+def bulk_import(ctx):
+    source = people_jsonl(ctx.rows)
+    return lambda: BenchPerson.bulk_import(io.StringIO(source))
+
+
+@benchmark('model.bulk_import[{rows} jsonl @5ms rtt, 8 workers]', scaled=True)
+def bulk_import_with_latency(ctx):
+    ctx.backend.latency = 0.005
+    source = people_jsonl(ctx.rows)
+    return lambda: BenchPerson.bulk_import(io.StringIO(source), workers=8)
@@ -0,0 +1,237 @@
+import io
+import time
+
+from benchmarks.bench_models import BenchPerson, people
+from benchmarks.harness import benchmark
+from leancloud_better_storage.storage.metrics import Histogram
+from leancloud_better_storage.storage.query import Param
+
+PAGE_SIZE = 1000
+
+
+def seed(rows):
+    BenchPerson.commit_all(*people(rows))
+
+
+@benchmark('query.filter[5 conditions]')
+def filter_conditions(ctx):
+    def op():
+        return BenchPerson.query().filter(BenchPerson.age > 10, BenchPerson.age < 90,
+                                          BenchPerson.name.startswith('person'),
+                                          BenchPerson.score >= 0, BenchPerson.bio != 'nothing')
+
+    return op
+
+
+@benchmark('query.prepare.bind[5 conditions]')
+def prepared_conditions(ctx):
+    prepared = BenchPerson.query().filter(BenchPerson.age > Param('min_age'), BenchPerson.age < Param('max_age'),
+                                          BenchPerson.name.startswith(Param('prefix')),
+                                          BenchPerson.score >= Param('score'), BenchPerson.bio != Param('bio')).prepare()
+
+    def op():
+        return prepared.bind(min_age=10, max_age=90, prefix='person', score=0, bio='nothing')
+
+    return op
+
+
+@benchmark('query.filter_by[3 fields]')
+def filter_by_fields(ctx):
+    def op():
+        return BenchPerson.query().filter_by(name='person 1', age=1, bio='nothing')
+
+    return op
+
+
+@benchmark('query.prepare.bind[3 fields]')
+def prepared_fields(ctx):
+    prepared = BenchPerson.query().filter_by(name=Param('name'), age=Param('age'), bio=Param('bio')).prepare()
+    return lambda: prepared.bind(name='person 1', age=1, bio='nothing')
+
+
+@benchmark('query.filter_by[chain of 5]')
+def filter_by_chain(ctx):
+    def op():
+        query = BenchPerson.query()
+        for age in range(5):
+            query = query.filter_by(age=age, name='person {}'.format(age)).or_()
+        return query
+
+    return op
+
+
+@benchmark('query.find[{rows}]', scaled=True)
+def find(ctx):
+    seed(ctx.rows)
+
+    def op():
+        query = BenchPerson.query()
+        return [query.find(skip, PAGE_SIZE) for skip in range(0, ctx.rows, PAGE_SIZE)]
+
+    return op
+
+
+@benchmark('query.find[{rows}, raw records]', scaled=True)
+def find_raw(ctx):
+    seed(ctx.rows)
+
+    def op():
+        query = BenchPerson.query()
+        pages = [query.find(skip, PAGE_SIZE, raw=True) for skip in range(0, ctx.rows, PAGE_SIZE)]
+        return sum(record.age for records in pages for record in records)
+
+    return op
+
+
+@benchmark('query.iter_records[{rows}]', scaled=True)
+def iter_records(ctx):
+    seed(ctx.rows)
+    return lambda: sum(record.age for record in BenchPerson.query().iter_records(batch_size=PAGE_SIZE))
+
+
+@benchmark('cursor.iterate[{rows}]', scaled=True)
+def cursor_iterate(ctx):
+    seed(ctx.rows)
+    return lambda: sum(1 for _ in BenchPerson.query().scan(batch_size=PAGE_SIZE))
+
+
+@benchmark('pages.walk[{rows}]', scaled=True)
+def pages_walk(ctx):
+    seed(ctx.rows)
+    return lambda: sum(len(page.items) for page in BenchPerson.query().paginate(0, PAGE_SIZE))
+
+
+def _consume_slowly(cursor):
+    # simulated consumer work: 5ms per fetched batch
+    count = 0
+    for count, _ in enumerate(cursor, 1):
+        if count % PAGE_SIZE == 0:
+            time.sleep(0.005)
+    return count
+
+
+@benchmark('cursor.iterate[{rows} @5ms rtt]', scaled=True)
+def cursor_iterate_with_latency(ctx):
+    seed(ctx.rows)
+    ctx.backend.latency = 0.005
+    return lambda: _consume_slowly(BenchPerson.query().scan(batch_size=PAGE_SIZE))
+
+
+@benchmark('cursor.iterate[{rows} @5ms rtt, prefetch=4]', scaled=True)
+def cursor_iterate_prefetch(ctx):
+    seed(ctx.rows)
+    ctx.backend.latency = 0.005
+    return lambda: _consume_slowly(BenchPerson.query().scan(batch_size=PAGE_SIZE, prefetch=4))
+
+
+@benchmark('pages.walk[{rows}, keyset]', scaled=True)
+def pages_walk_keyset(ctx):
+    seed(ctx.rows)
+    return lambda: sum(len(page.items) for page in BenchPerson.query().paginate(0, PAGE_SIZE, keyset=True))
+
+
+@benchmark('pages.construct[5 conditions]')
+def pages_construct(ctx):
+    query = BenchPerson.query().filter(BenchPerson.age > 10, BenchPerson.age < 90,
+                                       BenchPerson.name.startswith('person'),
+                                       BenchPerson.score >= 0, BenchPerson.bio != 'nothing')
+    return lambda: query.paginate(1, PAGE_SIZE)
+
+
+@benchmark('pages.walk[{rows} @5ms rtt]', scaled=True)
+def pages_walk_with_latency(ctx):
+    seed(ctx.rows)
+    ctx.backend.latency = 0.005
+    return lambda: sum(len(page.items) for page in BenchPerson.query().paginate(0, PAGE_SIZE))
+
+
+@benchmark('pages.walk[{rows} @5ms rtt, prefetch=4]', scaled=True)
+def pages_walk_prefetch(ctx):
+    seed(ctx.rows)
+    ctx.backend.latency = 0.005
+    return lambda: sum(len(page.items) for page in BenchPerson.query().paginate(0, PAGE_SIZE, prefetch=4))
+
+
+@benchmark('query.materialize[100k rows]')
+def materialize(ctx):
+    seed(100000)
+    return lambda: list(BenchPerson.query().scan(batch_size=PAGE_SIZE))
+
+
+@benchmark('model.wrap[100k rows]')
+def wrap(ctx):
+    # memory of Model wrappers only, the leancloud.Object instances already exist.
+    seed(100000)
+    lc_objects = [person.lc_object for person in BenchPerson.query().scan(batch_size=PAGE_SIZE)]
+    return lambda: [BenchPerson(lc_object) for lc_object in lc_objects]
+
+
+@benchmark('query.export[{rows}, jsonl]', scaled=True)
+def export_jsonl(ctx):
+    seed(ctx.rows)
+    return lambda: BenchPerson.query().export(io.StringIO())
+
+
+@benchmark('query.export[{rows}, csv]', scaled=True)
+def export_csv(ctx):
+    seed(ctx.rows)
+    return lambda: BenchPerson.query().export(io.StringIO(), format='csv')
+
+
+@benchmark('query.export[{rows}, jsonl @5ms rtt, prefetch=0]', scaled=True)
+def export_serial_with_latency(ctx):
+    seed(ctx.rows)
+    ctx.backend.latency = 0.005
+    return lambda: BenchPerson.query().export(io.StringIO(), prefetch=0)
+
+
+@benchmark('query.export[{rows}, jsonl @5ms rtt, prefetch=2]', scaled=True)
+def export_prefetch_with_latency(ctx):
+    seed(ctx.rows)
+    ctx.backend.latency = 0.005
+    return lambda: BenchPerson.query().export(io.StringIO())
+
+
+@benchmark('query.find -> columns[{rows}]', scaled=True)
+def find_to_columns(ctx):
+    seed(ctx.rows)
+
+    def op():
+        import numpy
+        people = list(BenchPerson.query().scan(batch_size=PAGE_SIZE))
+        return {'name': numpy.array([person.name for person in people], dtype=object),
+                'age': numpy.array([person.age for person in people], dtype=numpy.float64),
+                'score': numpy.array([person.score for person in people], dtype=numpy.float64),
+                'bio': numpy.array([person.bio for person in people], dtype=object)}
+
+    return op
+
+
+@benchmark('query.to_columns[{rows}]', scaled=True)
+def to_columns(ctx):
+    seed(ctx.rows)
+    return lambda: BenchPerson.query().to_columns()
+
+
+def _find_first_page(ctx):
+    seed(ctx.rows)
+    query = BenchPerson.query().filter(BenchPerson.age > 10)
+    return lambda: query.find(limit=10)
+
+
+@benchmark('query.find x1[{rows}, no observer]', scaled=True)
+def find_uninstrumented(ctx):
+    return _find_first_page(ctx)
+
+
+@benchmark('query.find x1[{rows}, histogram]', scaled=True)
+def find_instrumented(ctx):
+    ctx.enter(Histogram())
+    return _find_first_page(ctx)
+
+
+@benchmark('cursor.iterate[{rows}, histogram]', scaled=True)
+def cursor_iterate_instrumented(ctx):
+    seed(ctx.rows)
+    ctx.enter(Histogram())
+    return lambda: sum(1 for _ in BenchPerson.query().scan(batch_size=PAGE_SIZE))
@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.bench_models import BenchPerson
+from benchmarks.harness import benchmark
+from leancloud_better_storage.storage.local_backend import LocalServer
+from leancloud_better_storage.storage.transport import Transport
+
+REQUESTS = 256
+SERVER_LATENCY = 0.002
+
+TRANSPORTS = (
+    ('default pool', None),
+    ('pool 32', dict(pool_maxsize=32)),
+    ('pool 32, no keep-alive', dict(pool_maxsize=32, keep_alive=False)),
+)
+
+
+def concurrent_counts(workers, transport):
+    def bench(ctx):
+        # real HTTP over loopback, so connection setup and pooling are measured.
+        ctx.backend.latency = SERVER_LATENCY
+        ctx.enter(LocalServer(ctx.backend))
+        if transport is not None:
+            ctx.enter(Transport(**transport))
+        BenchPerson.create(name='remilia').commit()
+        executor = ctx.enter(ThreadPoolExecutor(max_workers=workers))
+
+        def op():
+            return sum(executor.map(lambda _: BenchPerson.query().count(), range(REQUESTS)))
+
+        return op
+
+    return bench
+
+
+for _workers in (1, 4, 16, 32):
+    for _label, _transport in TRANSPORTS:
+        benchmark('transport.count x{}[{} threads, {}]'.format(REQUESTS, _workers, _label))(
+            concurrent_counts(_workers, _transport))
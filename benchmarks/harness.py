@@ -0,0 +1,197 @@
+import argparse
+import fnmatch
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from leancloud_better_storage.storage.local_backend import LocalBackend
+
+registry = []
+
+
+class Benchmark(object):
+    """
+    一个基准测试。
+
+    被注册的函数负责准备数据，并返回被计时的操作：
+
+    - 返回一个无参数可调用对象时，直接对其计时；
+    - 返回 `(setup, op)` 时，每轮先调用不计时的 `setup()`，再对 `op(setup())` 计时。
+
+    :param name: benchmark name, may contain `{rows}` placeholder.
+    :param fn: function accept a `Context` and return the operation.
+    :param scaled: run once per `--rows` value if True.
+    """
+
+    def __init__(self, name, fn, scaled=False):
+        self.name = name
+        self.fn = fn
+        self.scaled = scaled
+
+    def variants(self, rows):
+        if not self.scaled:
+            return [(self.name, None)]
+        return [(self.name.format(rows=n), n) for n in rows]
+
+
+class Context(object):
+    """ 单个基准测试运行时的上下文，持有独立的 `LocalBackend`。 """
+
+    def __init__(self, backend, rows, stack=None):
+        self.backend = backend
+        self.rows = rows
+        self._stack = stack
+
+    def enter(self, context_manager):
+        """ 进入 `context_manager`，在这个基准测试结束后退出。 """
+        return self._stack.enter_context(context_manager)
+
+
+class Result(object):
+
+    def __init__(self, name, rounds, seconds, peak_bytes, blocks):
+        self.name = name
+        self.rounds = rounds
+        self.seconds = seconds
+        self.peak_bytes = peak_bytes
+        self.blocks = blocks
+
+    @property
+    def ops_per_sec(self):
+        return self.rounds / self.seconds if self.seconds else float('inf')
+
+    @property
+    def usec_per_op(self):
+        return self.seconds / self.rounds * 1e6
+
+    def dump(self):
+        return {
+            'ops_per_sec': self.ops_per_sec,
+            'usec_per_op': self.usec_per_op,
+            'peak_kib_per_op': self.peak_bytes / 1024,
+            'blocks_per_op': self.blocks,
+        }
+
+
+def benchmark(name, scaled=False):
+    """ 注册基准测试的装饰器。 """
+
+    def wrapper(fn):
+        registry.append(Benchmark(name, fn, scaled))
+        return fn
+
+    return wrapper
+
+
+def _normalize(op):
+    if isinstance(op, tuple):
+        return op
+    return (lambda: None), (lambda _: op())
+
+
+def measure(name, op, min_time=0.2, min_rounds=1, max_rounds=10000):
+    """
+    对操作计时，并统计单次操作的内存峰值（tracemalloc）和常驻内存块增量。
+
+    :return: Result
+    """
+    setup, run = _normalize(op)
+
+    # warm up, also triggers lazy initialization in SDK and library.
+    run(setup())
+
+    rounds, elapsed = 0, 0.0
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    while rounds < max_rounds and (rounds < min_rounds or elapsed < min_time):
+        arg = setup()
+        begin = time.perf_counter()
+        run(arg)
+        elapsed += time.perf_counter() - begin
+        rounds += 1
+    del arg
+    gc.collect()
+    blocks = (sys.getallocatedblocks() - blocks_before) / rounds
+
+    arg = setup()
+    tracemalloc.start()
+    try:
+        run(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return Result(name, rounds, elapsed, peak, blocks)
+
+
+def run_benchmarks(patterns=None, rows=(1000, 10000), min_time=0.2):
+    """ 依次运行匹配的基准测试，逐个产出 `Result`。 """
+    for bench in registry:
+        for name, n in bench.variants(rows):
+            if patterns and not any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                continue
+
+            with LocalBackend() as backend, ExitStack() as stack:
+                op = bench.fn(Context(backend, n, stack))
+                result = measure(name, op, min_time=min_time)
+            yield result
+
+
+def _format_row(result, baseline=None):
+    row = '{:<44} {:>14,.1f} {:>14,.1f} {:>12,.1f} {:>10,.1f}'.format(
+        result.name, result.ops_per_sec, result.usec_per_op, result.peak_bytes / 1024, result.blocks)
+    if baseline and result.name in baseline:
+        change = result.ops_per_sec / baseline[result.name]['ops_per_sec'] - 1
+        row += ' {:>+8.1%}'.format(change)
+    return row
+
+
+def main(argv=None):
+    from benchmarks import bench_models, bench_query, bench_transport  # noqa: F401  register benchmarks
+
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Offline benchmarks of leancloud-better-storage.')
+    parser.add_argument('patterns', nargs='*', help='glob patterns of benchmark names to run.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000],
+                        help='row counts of scaled benchmarks (default: 1000 10000).')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimal seconds measured per benchmark.')
+    parser.add_argument('--save', metavar='PATH', help='save results as JSON.')
+    parser.add_argument('--compare', metavar='PATH', help='compare with results saved by --save.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='ops/sec drop ratio reported as regression when comparing (default: 0.1).')
+    parser.add_argument('--list', action='store_true', help='list benchmarks and exit.')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for bench in registry:
+            for name, _ in bench.variants(args.rows):
+                print(name)
+        return 0
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as fp:
+            baseline = json.load(fp)
+
+    print('{:<44} {:>14} {:>14} {:>12} {:>10}'.format('benchmark', 'ops/sec', 'usec/op', 'peak KiB/op',
+                                                      'blocks/op'))
+    results = {}
+    regressions = []
+    for result in run_benchmarks(args.patterns, args.rows, args.min_time):
+        print(_format_row(result, baseline))
+        results[result.name] = result.dump()
+        if baseline and result.name in baseline:
+            if result.ops_per_sec < baseline[result.name]['ops_per_sec'] * (1 - args.threshold):
+                regressions.append(result.name)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+
+    if regressions:
+        print('\nregressions: {}'.format(', '.join(regressions)))
+        return 1
+    return 0
@@ -0,0 +1,13 @@
+"""
+批量导入命令行入口： ::
+
+    python -m leancloud_better_storage.import myapp.models:Person people.jsonl
+
+参数说明请使用 `--help` 查看，实现参考 `storage.importer`。
+"""
+import sys
+
+from leancloud_better_storage.storage.importer import main
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import logging
+import time
 from functools import wraps
 from threading import Lock
 from collections import UserDict
@@ -24,6 +25,38 @@ class ThreadSafeDict(UserDict):
             return super().__getitem__(key)
 
 
+class TTLCache(object):
+    """ Thread safe cache whose entries expire after `ttl` seconds.
+    线程安全、带过期时间的缓存。
+    """
+
+    def __init__(self, ttl, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = Lock()
+        self._data = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= self._clock():
+                del self._data[key]
+                return default
+            return entry[1]
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
 def cache_result(cache_location='fn'):
     """
     缓存结果装饰器。
@@ -0,0 +1,164 @@
+import asyncio
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Lock
+
+from leancloud_better_storage.storage.query import Query
+
+_executor = None
+_executor_lock = Lock()
+
+DEFAULT_MAX_WORKERS = 10  # same as pool size of requests.Session used by leancloud SDK
+
+
+def set_executor(executor):
+    """
+    指定 asyncio 接口使用的线程池。
+
+    所有异步接口都把 leancloud SDK 的同步请求放到这个线程池中执行，线程之间共享 SDK 的 HTTP 连接池。
+    线程数不宜超过连接池大小，否则多出的线程只会在连接池上排队。
+
+    :param executor: concurrent.futures.Executor instance, None to use default one.
+    """
+    global _executor
+    with _executor_lock:
+        _executor = executor
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS)
+        return _executor
+
+
+def run_in_executor(fn, *args, **kwargs):
+    """ 在共享线程池中执行同步调用，返回可 await 的 Future。 """
+    loop = asyncio.get_event_loop()
+    return loop.run_in_executor(get_executor(), partial(fn, *args, **kwargs))
+
+
+class AsyncCursor(object):
+    """
+    `Query.scan` 的异步版本，支持 `async for`。
+
+    每次从线程池取回一批结果（`batch_size` 个），在事件循环中逐个返回。
+    """
+
+    def __init__(self, cursor, batch_size=None):
+        self._cursor = cursor
+        self._batch_size = batch_size or 100
+        self._buffer = []
+        self._exhausted = False
+
+    @property
+    def cursor(self):
+        return self._cursor
+
+    def _next_batch(self):
+        return list(itertools.islice(self._cursor, self._batch_size))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._buffer and not self._exhausted:
+            self._buffer = await run_in_executor(self._next_batch)
+            self._buffer.reverse()
+            self._exhausted = len(self._buffer) < self._batch_size
+
+        if not self._buffer:
+            raise StopAsyncIteration()
+        return self._buffer.pop()
+
+
+def _sync_query(query):
+    """ 把 `query` 的状态复制到一个普通的 `Query`，它的方法可以在线程池中同步执行。 """
+    sync = Query.__new__(Query)
+    sync.__dict__.update(query._snapshot().__dict__)
+    return sync
+
+
+class AsyncPages(object):
+    """
+    `Query.paginate` 的异步版本，支持 `async for`。
+
+    包装同步的 `Pages` 或 `KeysetPages`，需要发出请求的属性变为协程，翻页在线程池中进行。 ::
+
+        async for page in People.async_query().paginate(0, 100):
+            for person in await page.items():
+                ...
+    """
+
+    def __init__(self, pages):
+        self._pages = pages
+
+    @property
+    def pages(self):
+        return self._pages
+
+    @property
+    def element_offset(self):
+        return self._pages.element_offset
+
+    @property
+    def token(self):
+        """ keyset 分页当前页的起始令牌。 """
+        return self._pages.token
+
+    async def items(self):
+        """ get all element of current page. """
+        return await run_in_executor(lambda: self._pages.items)
+
+    async def total_pages(self):
+        return await run_in_executor(lambda: self._pages.total_pages)
+
+    async def next_token(self):
+        """ keyset 分页当前页之后的续页令牌。 """
+        return await run_in_executor(lambda: self._pages.next_token)
+
+    def _advance(self):
+        try:
+            next(self._pages)
+        except StopIteration:  # can not be set on a future
+            return False
+        return True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not await run_in_executor(self._advance):
+            raise StopAsyncIteration()
+        return self
+
+
+class AsyncQuery(Query):
+    """
+    asyncio 版本的 Query。
+
+    查询条件的构造与 `Query` 完全相同，只有发出请求的方法变成了协程。 ::
+
+        people = await People.async_query().filter(People.age > 18).find()
+        async for person in People.async_query().scan(batch_size=1000):
+            ...
+        async for page in People.async_query().paginate(0, 100):
+            ...
+    """
+
+    async def find(self, skip=None, limit=None, raw=False):
+        return await run_in_executor(super().find, skip, limit, raw)
+
+    async def first(self):
+        return await run_in_executor(super().first)
+
+    async def count(self):
+        return await run_in_executor(super().count)
+
+    def scan(self, batch_size=None, scan_key=None, prefetch=0):
+        return AsyncCursor(super().scan(batch_size, scan_key, prefetch), batch_size)
+
+    def paginate(self, page, size, keyset=False, token=None, prefetch=0):
+        return AsyncPages(_sync_query(self).paginate(page, size, keyset, token, prefetch))
@@ -0,0 +1,360 @@
+import inspect
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy
+from itertools import islice
+
+import leancloud
+from leancloud import client
+
+from leancloud_better_storage.storage import instrument
+
+DEFAULT_CHUNK_SIZE = 50
+DEFAULT_WORKERS = 4
+SCAN_BATCH_SIZE = 1000
+
+
+class BatchResult(object):
+    """
+    批量操作的结果，按传入顺序记录每个对象成功与否。
+
+    某个对象（或者它所在的整个分块）失败不会影响其他对象，失败原因保存在 `failed` 里。 ::
+
+        result = Person.commit_all(*persons)
+        for instance, error in result.failed:
+            ...
+        result.raise_for_errors()  # 有失败时抛出第一个错误
+    """
+
+    def __init__(self, instances=(), errors=()):
+        self._instances = list(instances)
+        self._errors = list(errors)
+
+    @property
+    def instances(self):
+        return self._instances
+
+    @property
+    def errors(self):
+        """ 与 `instances` 一一对应，成功的对象为 None。 """
+        return self._errors
+
+    @property
+    def succeeded(self):
+        return [instance for instance, error in zip(self._instances, self._errors) if error is None]
+
+    @property
+    def failed(self):
+        return [(instance, error) for instance, error in zip(self._instances, self._errors) if error is not None]
+
+    @property
+    def ok(self):
+        return all(error is None for error in self._errors)
+
+    def raise_for_errors(self):
+        for error in self._errors:
+            if error is not None:
+                raise error
+
+    def __len__(self):
+        return len(self._instances)
+
+    def __iter__(self):
+        return iter(zip(self._instances, self._errors))
+
+    def __repr__(self):
+        return '<BatchResult succeeded={} failed={}>'.format(len(self.succeeded), len(self.failed))
+
+
+class BatchRequestError(leancloud.LeanCloudError):
+    """ 整个 `/batch` 请求被拒绝，`status` 为 HTTP 状态码，可以据此判断是否值得重试。 """
+
+    def __init__(self, code, error, status):
+        super().__init__(code, error)
+        self.status = status
+
+
+# `client.post` without `check_error`, which drops the HTTP status of failed requests
+_post = client.need_init(inspect.unwrap(client.post))
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _batch_request(lc_objects, make_request, on_success):
+    http_response = _post('/batch', {'requests': [make_request(obj) for obj in lc_objects]})
+    if http_response.headers.get('Content-Type') == 'text/html':
+        raise BatchRequestError(-1, 'Bad Request', http_response.status_code)
+    response = http_response.json()
+    if isinstance(response, dict) and 'error' in response:
+        raise BatchRequestError(response.get('code', 1), response.get('error', 'Unknown Error'),
+                                http_response.status_code)
+    if not isinstance(response, list) or len(response) != len(lc_objects):
+        # results are matched to objects by position, a short response would shift or drop them
+        raise BatchRequestError(1, 'Expect {} results from /batch, got {!r}'.format(
+            len(lc_objects), len(response) if isinstance(response, list) else response), http_response.status_code)
+
+    errors = []
+    for obj, content in zip(lc_objects, response):
+        error = content.get('error')
+        if error:
+            errors.append(leancloud.LeanCloudError(error.get('code'), error.get('error')))
+        else:
+            on_success(obj, content['success'])
+            errors.append(None)
+    return errors
+
+
+def _save_request(obj):
+    if obj.id is None:
+        path = '/{0}/classes/{1}'.format(client.SERVER_VERSION, obj._class_name)
+        method = 'POST'
+    else:
+        path = '/{0}/classes/{1}/{2}'.format(client.SERVER_VERSION, obj._class_name, obj.id)
+        method = 'PUT'
+    return {'method': method, 'path': path, 'body': obj._dump_save()}
+
+
+def _update_request(body):
+    def make_request(obj):
+        return {
+            'method': 'PUT',
+            'path': '/{0}/classes/{1}/{2}'.format(client.SERVER_VERSION, obj._class_name, obj.id),
+            'body': body,
+        }
+
+    return make_request
+
+
+def _destroy_request(obj):
+    return {
+        'method': 'DELETE',
+        'path': '/{0}/classes/{1}/{2}'.format(client.SERVER_VERSION, obj._class_name, obj.id),
+        'body': obj._flags,
+    }
+
+
+def _run_shared(executor, guarded, chunks, workers):
+    """
+    在已有的线程池中处理分块，调用线程也参与处理。
+
+    调用线程本身可能就是这个线程池中的线程，线程池被占满时提交的任务可能永远不会开始，
+    所以调用线程处理完所有分块后取消尚未开始的任务，只等待正在运行的任务，不会死锁。
+    """
+    results = [None] * len(chunks)
+    pending = deque(enumerate(chunks))
+
+    def drain():
+        while True:
+            try:
+                i, chunk = pending.popleft()
+            except IndexError:
+                return
+            results[i] = guarded(chunk)
+
+    helpers = [executor.submit(drain) for _ in range(workers - 1)]
+    drain()
+    for future in helpers:
+        if not future.cancel():
+            future.result()
+    return results
+
+
+def _run_chunks(lc_objects, send, chunk_size, workers, executor=None):
+    chunks = _chunks(lc_objects, chunk_size or DEFAULT_CHUNK_SIZE)
+
+    @instrument.propagate
+    def guarded(chunk):
+        try:
+            return send(chunk)
+        except Exception as exc:  # whole chunk failed, e.g. network error or request rejected
+            return [exc] * len(chunk)
+
+    workers = min(workers or DEFAULT_WORKERS, len(chunks))
+    if workers <= 1:
+        results = [guarded(chunk) for chunk in chunks]
+    elif executor is not None:
+        results = _run_shared(executor, guarded, chunks, workers)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(guarded, chunks))
+
+    return [error for errors in results for error in errors]
+
+
+def save_all(lc_objects, chunk_size=None, workers=None, executor=None):
+    """
+    分块、并发地保存 `leancloud.Object`。
+
+    :param lc_objects: objects to save
+    :param chunk_size: requests per `/batch` call, default `DEFAULT_CHUNK_SIZE`
+    :param workers: concurrent `/batch` calls, default `DEFAULT_WORKERS`
+    :param executor: send chunks in this executor instead of a new thread pool
+    :return: list of error (or None) for each object
+    """
+
+    def send(chunk):
+        return _batch_request(chunk, _save_request, lambda obj, content: obj._update_data(content))
+
+    return _run_chunks(list(lc_objects), send, chunk_size, workers, executor)
+
+
+def destroy_all(lc_objects, chunk_size=None, workers=None, executor=None):
+    """
+    分块、并发地删除 `leancloud.Object`，未保存过的对象直接记为失败。
+
+    :return: list of error (or None) for each object
+    """
+    lc_objects = list(lc_objects)
+    saved = [obj for obj in lc_objects if not obj.is_new()]
+
+    def send(chunk):
+        return _batch_request(chunk, _destroy_request, lambda obj, content: None)
+
+    errors = dict(zip(map(id, saved), _run_chunks(saved, send, chunk_size, workers, executor)))
+    return [errors[id(obj)] if id(obj) in errors else ValueError('Could not destroy unsaved object')
+            for obj in lc_objects]
+
+
+def save_and_destroy_all(saves, destroys, chunk_size=None, workers=None):
+    """
+    在同一组 `/batch` 请求中保存 `saves` 并删除 `destroys`，用于减少请求次数。
+
+    :return: list of error (or None) for each object, in order of `saves` then `destroys`
+    """
+    lc_objects = list(saves) + list(destroys)
+    destroy_ids = set(map(id, destroys))
+
+    def make_request(obj):
+        return _destroy_request(obj) if id(obj) in destroy_ids else _save_request(obj)
+
+    def on_success(obj, content):
+        if id(obj) not in destroy_ids:
+            obj._update_data(content)
+
+    def send(chunk):
+        return _batch_request(chunk, make_request, on_success)
+
+    return _run_chunks(lc_objects, send, chunk_size, workers)
+
+
+def update_where(lc_query, body, **kwargs):
+    """ 把 `body` 写入 `lc_query` 匹配的所有对象，参数参考 `bulk_apply`。 """
+    return bulk_apply(lc_query, _update_request(body), **kwargs)
+
+
+def destroy_where(lc_query, **kwargs):
+    """ 删除 `lc_query` 匹配的所有对象，参数参考 `bulk_apply`。 """
+    return bulk_apply(lc_query, _destroy_request, **kwargs)
+
+
+class BulkResult(object):
+    """
+    按查询批量更新、删除的结果。
+
+    为了在处理大量对象时保持内存稳定，只记录处理数量和失败的对象。
+    """
+
+    def __init__(self, processed=0, failed=None, last_object_id=None):
+        self.processed = processed
+        self.failed = failed if failed is not None else []
+        self.last_object_id = last_object_id
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def raise_for_errors(self):
+        for _, error in self.failed:
+            raise error
+
+    def __repr__(self):
+        return '<BulkResult processed={} failed={}>'.format(self.processed, len(self.failed))
+
+
+def _load_checkpoint(path):
+    try:
+        with open(path, encoding='utf-8') as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return None
+
+
+def _save_checkpoint(path, result):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as fp:
+        json.dump({'last_object_id': result.last_object_id, 'processed': result.processed,
+                   'failed': len(result.failed)}, fp)
+    os.replace(tmp, path)
+
+
+def bulk_apply(lc_query, make_request, chunk_size=None, workers=None, progress=None, checkpoint=None):
+    """
+    扫描 `lc_query` 匹配的对象 id，并把 `make_request` 生成的请求分块、并发地发送。
+
+    扫描只取回 objectId，并按 objectId 升序进行，所以可以用最后一个处理完成的 objectId 作为断点。
+    传入 `checkpoint` 文件路径时，每处理完一个分块就更新断点；再次以同一文件调用时从断点继续，全部完成后删除断点文件。
+
+    :param lc_query: leancloud.Query, must not have skip/limit.
+    :param make_request: build batch request dict from a `leancloud.Object` which only has id.
+    :param chunk_size: requests per `/batch` call.
+    :param workers: concurrent `/batch` calls.
+    :param progress: callable receive the `BulkResult` after every finished chunk.
+    :param checkpoint: checkpoint file path.
+    :return: BulkResult
+    """
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    workers = workers or DEFAULT_WORKERS
+    result = BulkResult()
+
+    state = _load_checkpoint(checkpoint) if checkpoint else None
+    if state and state['last_object_id']:
+        result.processed = state['processed']
+        result.last_object_id = state['last_object_id']
+        lc_query = leancloud.Query.and_(
+            lc_query, leancloud.Query(lc_query._query_class._class_name).greater_than('objectId',
+                                                                                     state['last_object_id']))
+    else:
+        lc_query = copy(lc_query)
+    lc_query._select = ['objectId']
+    lc_query._include = []
+    lc_query._order = []
+
+    @instrument.propagate
+    def send(chunk):
+        try:
+            return _batch_request(chunk, make_request, lambda obj, content: None)
+        except Exception as exc:
+            return [exc] * len(chunk)
+
+    def finish(chunk, errors):
+        result.processed += len(chunk)
+        result.failed.extend((obj.id, error) for obj, error in zip(chunk, errors) if error is not None)
+        result.last_object_id = chunk[-1].id
+        if checkpoint:
+            _save_checkpoint(checkpoint, result)
+        if progress:
+            progress(result)
+
+    pending = deque()  # (chunk, future) in scan order, checkpoint only moves past finished prefix
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        cursor = iter(lc_query.scan(SCAN_BATCH_SIZE))
+        while True:
+            chunk = list(islice(cursor, chunk_size))
+            if chunk:
+                pending.append((chunk, executor.submit(send, chunk)))
+
+            # keep a bounded window of in-flight chunks
+            while pending and (len(pending) > workers * 2 or not chunk or pending[0][1].done()):
+                head, future = pending.popleft()
+                finish(head, future.result())
+
+            if not chunk:
+                break
+
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return result
@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from copy import copy
+
+from leancloud_better_storage.storage.cursor import Cursor
+from leancloud_better_storage.storage.export import DEFAULT_BATCH_SIZE, columns
+
+
+def _import(name):
+    try:
+        return __import__(name)
+    except ImportError:
+        raise ImportError('columnar results require {0}, install it with `pip install {0}`.'.format(name))
+
+
+def _objects(np, values):
+    array = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):  # assign one by one, nested lists must not be broadcast
+        array[i] = value
+    return array
+
+
+def arrays(np, cols, rows):
+    """
+    把一批原始 JSON 数据转换为按列的 numpy 数组。
+
+    `NumberField` 为 float64（空值为 nan），`DateTimeField` 和创建/更新时间为 UTC 的 datetime64[ms]（空值为 NaT），
+    `BooleanField` 为 bool（含空值时为 object），`GeoPointField` 拆分为 `<name>_latitude`、`<name>_longitude` 两列 float64，
+    `RefField` 为 objectId 字符串，其余字段为 object 数组。
+    """
+    result = OrderedDict()
+    for column in cols:
+        values = [column.value(row) for row in rows]
+        if column.kind == 'number':
+            result[column.name] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        elif column.kind == 'date':
+            result[column.name] = np.array(['NaT' if v is None else v.rstrip('Z') for v in values],
+                                           dtype='datetime64[ms]')
+        elif column.kind == 'geo':
+            result['{}_latitude'.format(column.name)] = np.array(
+                [np.nan if v is None else v['latitude'] for v in values], dtype=np.float64)
+            result['{}_longitude'.format(column.name)] = np.array(
+                [np.nan if v is None else v['longitude'] for v in values], dtype=np.float64)
+        elif column.kind == 'bool' and None not in values:
+            result[column.name] = np.array(values, dtype=bool)
+        else:
+            result[column.name] = _objects(np, values)
+    return result
+
+
+def _batches(query, chunk_size, prefetch):
+    query._check_bound()
+    params = query._query.dump()
+    if 'skip' in params or 'limit' in params:
+        # scan does not support skip or limit, fetch the page once.
+        yield query._find_raw(copy(query._query))
+        return
+
+    with Cursor(query._scan_raw(query._scan_params(chunk_size)), None, prefetch, chunk_size) as cursor:
+        yield from cursor.batches()
+
+
+def iter_columns(query, chunk_size, prefetch=0):
+    np = _import('numpy')
+    cols = columns(query)
+    for batch in _batches(query, chunk_size, prefetch):
+        yield arrays(np, cols, batch)
+
+
+def to_columns(query, chunk_size=None, prefetch=0):
+    """ 参考 `Query.to_columns`。 """
+    if chunk_size:
+        return iter_columns(query, chunk_size, prefetch)
+
+    np = _import('numpy')
+    chunks = list(iter_columns(query, DEFAULT_BATCH_SIZE, prefetch))
+    if len(chunks) == 1:
+        return chunks[0]
+    if not chunks:
+        return arrays(np, columns(query), [])
+    return OrderedDict((name, np.concatenate([chunk[name] for chunk in chunks])) for name in chunks[0])
+
+
+def to_dataframe(query, chunk_size=None, prefetch=0):
+    """ 参考 `Query.to_dataframe`。 """
+    pd = _import('pandas')
+    if chunk_size:
+        return (pd.DataFrame(chunk, copy=False) for chunk in iter_columns(query, chunk_size, prefetch))
+    return pd.DataFrame(to_columns(query, prefetch=prefetch), copy=False)
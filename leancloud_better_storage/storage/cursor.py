@@ -1,15 +1,170 @@
+import weakref
+from functools import partial
+from itertools import islice
+from queue import Full, Queue
+from threading import Event, Thread
+
+from leancloud_better_storage.storage import instrument
+
+DEFAULT_BATCH_SIZE = 100  # default scan batch size of LeanCloud
+
+
+class _Done:
+    pass
+
+
+class _Failed:
+
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class _Prefetcher(Thread):
+    """ 后台线程，把 `fetch` 按批取回的结果放入有界队列。 """
+
+    def __init__(self, fetch, depth):
+        super().__init__(daemon=True)
+        self._fetch = fetch
+        self.queue = Queue(maxsize=depth)
+        self.stopped = Event()
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                batch = self._fetch()
+                if not batch:
+                    break
+                if not self._put(batch):
+                    return
+            self._put(_Done)
+        except Exception as exc:
+            self._put(_Failed(exc))
+
+
+def _fetch_batch(cursor_iter, batch_size, source):
+    if source is None:
+        return list(islice(cursor_iter, batch_size))
+
+    with instrument.operation('scan', source._model, source._query) as op:
+        batch = list(islice(cursor_iter, batch_size))
+        op.objects = len(batch)
+    return batch
+
+
 class Cursor:
-    def __init__(self, cursor, model):
+    """
+    `Query.scan` 的结果游标。
+
+    `prefetch` 大于 0 时，由后台线程提前取回之后的 `prefetch` 批结果，放入有界队列，
+    使网络请求与调用方的处理重叠。队列满时后台线程暂停，内存占用最多为 `prefetch` 批结果。
+
+    提前结束遍历时应调用 `close()`，或以 `with` 语句使用游标，以便及时停止后台线程。
+    后台线程不持有游标本身，游标被回收时（例如 `for` 循环中 `break` 之后不再引用）线程也会自动停止。
+
+    `refs` 中的 `RefField` 按批解析，每批结果对每个被引用的数据集只多一次查询。
+
+    给出 `source`（发起遍历的 `Query`）并且创建游标时有 `instrument` 订阅者时，每取回一批结果发出一个 `scan` 事件。
+
+    `model` 为 None 时不创建实例，直接返回 `cursor` 给出的原始对象，例如 `Query._scan_raw` 的 JSON 数据。
+    """
+    __slots__ = ('_cursor', '_cursor_iter', '_cls', '_batch_size', '_refs', '_source', '_prefetcher', '_buffer',
+                 '_fast', '__weakref__')
+
+    def __init__(self, cursor, model, prefetch=0, batch_size=None, refs=(), source=None):
         self._cursor = cursor
         self._cursor_iter = iter(self._cursor)
         self._cls = model
+        self._batch_size = batch_size or DEFAULT_BATCH_SIZE
+        self._refs = refs
+        self._source = source if instrument.enabled() else None
+        self._prefetcher = None
+        self._buffer = iter(())
+        self._fast = model is not None and not self._refs and not prefetch > 0 and self._source is None
+
+        if prefetch > 0:
+            # the thread must not reference the cursor, otherwise an abandoned cursor is never collected
+            fetch = partial(_fetch_batch, self._cursor_iter, self._batch_size, self._source)
+            self._prefetcher = _Prefetcher(fetch, prefetch)
+            self._prefetcher.start()
+            weakref.finalize(self, self._prefetcher.stopped.set)
 
     @property
     def lc_cursor(self):
         return self._cursor
 
+    def close(self):
+        """ 停止后台预取线程。 """
+        if self._prefetcher is not None:
+            self._prefetcher.stopped.set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
     def __iter__(self):
         return self
 
+    def _fetch(self):
+        return _fetch_batch(self._cursor_iter, self._batch_size, self._source)
+
+    def _next_batch(self):
+        if self._prefetcher is None:
+            return self._fetch()
+
+        batch = self._prefetcher.queue.get()
+        if batch is _Done:
+            self._prefetcher.queue.put(_Done)  # keep returning empty batch on later calls
+            return []
+        if isinstance(batch, _Failed):
+            self._prefetcher.queue.put(batch)  # the thread has exited, keep raising on later calls
+            raise batch.exc
+        return batch
+
+    def _wrap(self, batch):
+        if self._cls is None:
+            return batch
+        instances = [self._cls(obj) for obj in batch]
+        for field in self._refs:
+            field.resolve(instances)
+        return instances
+
+    def batches(self):
+        """
+        按批遍历，每次返回一个 list，最多 `batch_size` 个结果，预取和引用解析与逐个遍历相同。
+
+        与逐个遍历共享进度，已经取回但尚未返回的结果作为第一批返回。
+        """
+        rest = list(self._buffer)
+        if rest:
+            yield rest
+
+        while True:
+            batch = self._wrap(self._next_batch())
+            if not batch:
+                return
+            yield batch
+
     def __next__(self):
-        return self._cls(next(self._cursor_iter))
+        if self._fast:
+            return self._cls(next(self._cursor_iter))
+
+        for instance in self._buffer:
+            return instance
+
+        instances = self._wrap(self._next_batch())
+        if not instances:
+            raise StopIteration()
+
+        self._buffer = iter(instances)
+        return next(self._buffer)
@@ -0,0 +1,223 @@
+import csv
+import json
+
+from leancloud_better_storage.storage.cursor import Cursor
+from leancloud_better_storage.storage.fields import (BooleanField, DateTimeField, FileField, GeoPointField, NumberField,
+                                                     RefField, StringField)
+
+DEFAULT_BATCH_SIZE = 1000  # max scan batch size of LeanCloud
+
+# column kind of each field type, checked in order so subclasses match first.
+_FIELD_KINDS = (
+    (DateTimeField, 'date'),
+    (GeoPointField, 'geo'),
+    (RefField, 'ref'),
+    (NumberField, 'number'),
+    (BooleanField, 'bool'),
+    (FileField, 'file'),
+    (StringField, 'string'),
+)
+_METADATA_KINDS = (('object_id', 'string'), ('created_at', 'date'), ('updated_at', 'date'))
+
+
+def _get(key):
+    return lambda value: value.get(key) if isinstance(value, dict) else value
+
+
+def _geo_point(value):
+    return {'latitude': value['latitude'], 'longitude': value['longitude']}
+
+
+# 把 JSON 值转换为与格式无关的导出值
+_CONVERTERS = {
+    'date': _get('iso'),
+    'ref': _get('objectId'),
+    'file': _get('url'),
+    'geo': _geo_point,
+}
+
+
+class _Column(object):
+    """ 导出的一列，对应 Model 的一个字段。 """
+    __slots__ = ('name', 'key', 'kind', '_convert')
+
+    def __init__(self, name, key, kind):
+        self.name = name
+        self.key = key
+        self.kind = kind
+        self._convert = _CONVERTERS.get(kind)
+
+    def value(self, row):
+        value = row.get(self.key)
+        if value is None or self._convert is None:
+            return value
+        return self._convert(value)
+
+
+def columns(query):
+    """
+    按字段类型生成导出的列。`objectId`、`createdAt`、`updatedAt` 在前，其余字段按定义顺序排列，
+    被 `only`/`defer` 排除的字段不导出。
+    """
+    fields = query._model.__fields__
+    unloaded = query._unloaded or ()
+    result = [_Column(attr_name, fields[attr_name].field_name, kind) for attr_name, kind in _METADATA_KINDS]
+    metadata = dict(_METADATA_KINDS)
+    for attr_name, field in fields.items():
+        if attr_name in metadata or field.field_name in unloaded:
+            continue
+        kind = next((kind for field_type, kind in _FIELD_KINDS if isinstance(field, field_type)), 'any')
+        result.append(_Column(attr_name, field.field_name, kind))
+    return result
+
+
+def _is_path(target):
+    return isinstance(target, (str, bytes)) or hasattr(target, '__fspath__')
+
+
+class _TextWriter(object):
+
+    def __init__(self, target, columns):
+        self._columns = columns
+        self._owned = _is_path(target)
+        self._stream = open(target, 'w', encoding='utf-8', newline='') if self._owned else target
+
+    def close(self):
+        if self._owned:
+            self._stream.close()
+
+
+class JsonLinesWriter(_TextWriter):
+    """ 每行一个 JSON 对象。日期为 ISO 8601 字符串，地理位置为 `{latitude, longitude}`，引用为 objectId。 """
+
+    def write(self, rows):
+        columns = self._columns
+        self._stream.write(''.join(
+            json.dumps({column.name: column.value(row) for column in columns}, ensure_ascii=False) + '\n'
+            for row in rows
+        ))
+
+
+class CsvWriter(_TextWriter):
+    """
+    带表头的 CSV。地理位置拆分为 `<name>_latitude` 和 `<name>_longitude` 两列，
+    对象和数组以 JSON 字符串写入，空值为空字符串。
+    """
+
+    def __init__(self, target, columns):
+        super().__init__(target, columns)
+        self._writer = csv.writer(self._stream)
+        header = []
+        for column in columns:
+            if column.kind == 'geo':
+                header.extend(('{}_latitude'.format(column.name), '{}_longitude'.format(column.name)))
+            else:
+                header.append(column.name)
+        self._writer.writerow(header)
+
+    def _cells(self, row):
+        for column in self._columns:
+            value = column.value(row)
+            if column.kind == 'geo':
+                yield from ('', '') if value is None else (value['latitude'], value['longitude'])
+            elif value is None:
+                yield ''
+            elif isinstance(value, bool):
+                yield 'true' if value else 'false'
+            elif isinstance(value, (dict, list)):
+                yield json.dumps(value, ensure_ascii=False)
+            else:
+                yield value
+
+    def write(self, rows):
+        self._writer.writerows(list(self._cells(row)) for row in rows)
+
+
+class ParquetWriter(object):
+    """
+    Parquet 文件，每批结果写为一个 row group。
+
+    日期为 UTC 毫秒时间戳，`NumberField` 为 float64，`BooleanField` 为 bool，地理位置拆分为两列 float64，
+    其余字段为字符串，对象和数组以 JSON 字符串写入。需要安装 `pyarrow`。
+    """
+
+    def __init__(self, target, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('export to parquet requires pyarrow, install it with `pip install pyarrow`.')
+
+        self._pa = pyarrow
+        self._columns = columns
+        types = {
+            'date': pyarrow.timestamp('ms', tz='UTC'),
+            'number': pyarrow.float64(),
+            'bool': pyarrow.bool_(),
+        }
+        schema = []
+        for column in columns:
+            if column.kind == 'geo':
+                schema.append(('{}_latitude'.format(column.name), pyarrow.float64()))
+                schema.append(('{}_longitude'.format(column.name), pyarrow.float64()))
+            else:
+                schema.append((column.name, types.get(column.kind, pyarrow.string())))
+        self._schema = pyarrow.schema(schema)
+        self._writer = pyarrow.parquet.ParquetWriter(target, self._schema)
+
+    def _arrays(self, rows):
+        pa = self._pa
+        for column in self._columns:
+            values = [column.value(row) for row in rows]
+            if column.kind == 'date':
+                yield pa.array(values, pa.string()).cast(pa.timestamp('ms', tz='UTC'))
+            elif column.kind == 'geo':
+                yield pa.array([None if v is None else v['latitude'] for v in values], pa.float64())
+                yield pa.array([None if v is None else v['longitude'] for v in values], pa.float64())
+            elif column.kind == 'number':
+                yield pa.array(values, pa.float64())
+            elif column.kind == 'bool':
+                yield pa.array(values, pa.bool_())
+            elif column.kind == 'any':
+                yield pa.array([v if v is None or isinstance(v, str) else json.dumps(v, ensure_ascii=False)
+                                for v in values], pa.string())
+            else:
+                yield pa.array(values, pa.string())
+
+    def write(self, rows):
+        self._writer.write_table(self._pa.Table.from_arrays(list(self._arrays(rows)), schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+WRITERS = {
+    'jsonl': JsonLinesWriter,
+    'csv': CsvWriter,
+    'parquet': ParquetWriter,
+}
+
+
+def export(query, target, format='jsonl', batch_size=None, prefetch=2):
+    """
+    把 `query` 的所有结果流式写入 `target`，参考 `Query.export`。
+
+    :return: 导出的行数
+    """
+    try:
+        writer_cls = WRITERS[format]
+    except KeyError:
+        raise ValueError('unsupported export format {!r}, expect one of {}.'.format(format, ', '.join(WRITERS)))
+
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+    params = query._scan_params(batch_size)
+    writer = writer_cls(target, columns(query))
+    count = 0
+    try:
+        with Cursor(query._scan_raw(params), None, prefetch, batch_size) as cursor:
+            for batch in cursor.batches():
+                writer.write(batch)
+                count += len(batch)
+    finally:
+        writer.close()
+    return count
@@ -16,10 +16,12 @@ class DateTimeField(Field):
     def _after_model_created(self, model, name):
         super()._after_model_created(model, name)
 
-        def hook_fn(i):
-            return i.lc_object.set(self.field_name, self._now_fn())
+        def hook_fn(instances):
+            now = self._now_fn()  # whole batch shares one timestamp
+            for instance in instances:
+                instance.lc_object.set(self.field_name, now)
 
         if self._auto_now_add:
-            model.register_pre_create_hook(hook_fn)
+            model.register_pre_create_batch_hook(hook_fn)
         if self._auto_now:
-            model.register_pre_update_hook(hook_fn)
+            model.register_pre_update_batch_hook(hook_fn)
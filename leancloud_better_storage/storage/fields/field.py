@@ -1,3 +1,5 @@
+from leancloud import Object
+
 from .defaults import undefined
 from .meta import MetaField
 from .._util import deprecated
@@ -5,6 +7,22 @@ from ..order import OrderBy, ResultElementOrder
 from ..query import Condition, ConditionOperator
 
 
+def _same_value(a, b):
+    """
+    判断字段的新值与原值是否相同，引用按数据集和 objectId 比较。
+
+    list 和 dict 可能在赋值前被原地修改过，此时原值已经无从得知，所以总是视为已修改。
+    """
+    if isinstance(a, (list, dict)) or isinstance(b, (list, dict)):
+        return False
+    if a is b:
+        return True
+    if isinstance(a, Object) or isinstance(b, Object):
+        return (isinstance(a, Object) and isinstance(b, Object) and a.id is not None and
+                a._class_name == b._class_name and a.id == b.id)
+    return type(a) is type(b) and a == b
+
+
 class Field(object, metaclass=MetaField):
 
     @property
@@ -77,13 +95,27 @@ class Field(object, metaclass=MetaField):
 
     def __get__(self, instance, owner):
         if instance:
+            if instance._unloaded and self.field_name in instance._unloaded:
+                instance._load_unloaded()
             return instance.lc_object.get(self.field_name)
         return self
 
     def __set__(self, instance, value):
+        self._track(instance)
         if value is undefined:
-            instance.lc_object.unset(self.field_name, value)
-        instance.lc_object.set(self.field_name, value)
+            instance.lc_object.unset(self.field_name)
+        else:
+            instance.lc_object.set(self.field_name, value)
+
+    def _track(self, instance):
+        """ 在自上次保存以来第一次修改字段前，记录字段原值。 """
+        if instance._unloaded and self.field_name in instance._unloaded:
+            instance._unloaded = instance._unloaded - {self.field_name}  # original value unknown, always saved
+        lc_object = instance.lc_object
+        if self.field_name not in lc_object._changes:
+            if instance._original is None:
+                instance._original = {}
+            instance._original[self.field_name] = lc_object._attributes.get(self.field_name, undefined)
 
     def _after_model_created(self, model, name):
         self._cls_name = model.__lc_cls__
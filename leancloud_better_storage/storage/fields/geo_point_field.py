@@ -2,7 +2,7 @@ from leancloud import GeoPoint
 
 from .defaults import undefined
 from .field import Field
-from ..query import Condition, ConditionOperator
+from ..query import Condition, ConditionOperator, Param
 
 
 class GeoPointField(Field):
@@ -14,6 +14,11 @@ class GeoPointField(Field):
     def __init__(self, name=None, nullable=True, default=undefined):
         super().__init__(name, nullable, default)
 
+    def _fit(self, geo_point):
+        if isinstance(geo_point, Param):
+            return geo_point._fit(self._fit_fn)
+        return self._fit_fn[type(geo_point)](geo_point)
+
     def near(self, geo_point):
         """
         查询离靠近指定点的对象，按距离升序。
@@ -21,7 +26,7 @@ class GeoPointField(Field):
         :param geo_point: 指定地理点
         """
         try:
-            return Condition(self, ConditionOperator.Near, self._fit_fn[type(geo_point)](geo_point))
+            return Condition(self, ConditionOperator.Near, self._fit(geo_point))
         except (KeyError, IndexError):
             raise ValueError('param geo_point must be instance of GeoPoint or '
                              'tuple with two or more elements (only use first two).')
@@ -34,8 +39,7 @@ class GeoPointField(Field):
         :param kilometers: 距离，单位千米
         """
         try:
-            return Condition(self, ConditionOperator.WithinKilometers, (self._fit_fn[type(geo_point)](geo_point),
-                                                                        kilometers))
+            return Condition(self, ConditionOperator.WithinKilometers, (self._fit(geo_point), kilometers))
         except (KeyError, IndexError):
             raise ValueError('param geo_point must be instance of GeoPoint or '
                              'tuple with two or more elements (only use first two).')
@@ -1,9 +1,12 @@
-from leancloud import Object
+from leancloud import LeanCloudError, Object, Query
 
 from .defaults import undefined
 from .field import Field
+from ..err import LeanCloudErrorCode
 from ..objectid import ObjectId
-from ..query import Condition, ConditionOperator
+from ..query import Condition, ConditionOperator, Param
+
+RESOLVE_CHUNK_SIZE = 100
 
 
 class RefField(Field):
@@ -19,11 +22,16 @@ class RefField(Field):
         self._ref_cls = ref_cls
         self.lazy = lazy
 
+    def _fit(self, other):
+        if isinstance(other, Param):
+            return other._fit(self._fit_fn)
+        return self._fit_fn[type(other)](other)
+
     def __eq__(self, other):
-        return Condition(self, ConditionOperator.Equal, self._fit_fn[type(other)](other))
+        return Condition(self, ConditionOperator.Equal, self._fit(other))
 
     def __ne__(self, other):
-        return Condition(self, ConditionOperator.NotEqual, self._fit_fn[type(other)](other))
+        return Condition(self, ConditionOperator.NotEqual, self._fit(other))
 
     def __lt__(self, other):
         raise ValueError('RefField not support `<` comparison.')
@@ -35,6 +43,8 @@ class RefField(Field):
         if instance is None:
             return self
 
+        if instance._unloaded and self.field_name in instance._unloaded:
+            instance._load_unloaded()
         obj = instance.lc_object.get(self.field_name)
 
         if obj is None:
@@ -49,6 +59,7 @@ class RefField(Field):
         if value is undefined or value is None:
             super().__set__(instance, value)
         else:
+            self._track(instance)
             try:
                 instance.lc_object.set(self.field_name, self._fit_fn[type(value)](value))
             except KeyError:
@@ -60,6 +71,43 @@ class RefField(Field):
                 else:
                     raise ValueError('Unexpected ref field assignment: {}'.format(repr(value)))
 
+    def resolve(self, instances):
+        """
+        批量加载 `instances` 中这个字段引用的对象。
+
+        收集所有只有 objectId 的引用，对每个被引用的数据集按 `RESOLVE_CHUNK_SIZE` 分块发出 `contained_in` 查询，
+        再把取回的对象挂回各个实例。之后访问该字段不再产生请求。
+
+        :param instances: Model instances
+        :return: instances
+        """
+        pending = {}  # class name -> object id -> instances
+        for instance in instances:
+            if instance is None or instance.lc_object is None:
+                continue
+            obj = instance.lc_object.get(self.field_name)
+            if not isinstance(obj, Object) or obj.id is None or len(obj._attributes) != 1:
+                continue  # empty, unsaved or already loaded
+            pending.setdefault(obj._class_name, {}).setdefault(obj.id, []).append(instance)
+
+        for class_name, by_id in pending.items():
+            object_ids = list(by_id.keys())
+            for i in range(0, len(object_ids), RESOLVE_CHUNK_SIZE):
+                chunk = object_ids[i:i + RESOLVE_CHUNK_SIZE]
+                try:
+                    fetched = Query(class_name).contained_in('objectId', chunk).limit(len(chunk)).find()
+                except LeanCloudError as exc:
+                    if exc.code == LeanCloudErrorCode.ClassOrObjectNotExists.value:
+                        continue
+                    raise
+
+                for obj in fetched:
+                    for instance in by_id[obj.id]:
+                        # write attribute directly, the reference itself is not changed.
+                        instance.lc_object._attributes[self.field_name] = obj
+
+        return instances
+
     @property
     def ref_cls(self):
         if isinstance(self._ref_cls, str):
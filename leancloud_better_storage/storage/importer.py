@@ -0,0 +1,362 @@
+"""
+从 JSON Lines 或 CSV 文件批量导入数据，参考 `Model.bulk_import`。
+
+命令行用法： ::
+
+    python -m leancloud_better_storage.import myapp.models:Person people.jsonl --workers 8
+"""
+import argparse
+import csv
+import importlib
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import leancloud
+from leancloud import utils
+from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout
+from urllib3.exceptions import NewConnectionError
+
+from leancloud_better_storage.storage import batch
+from leancloud_better_storage.storage.fields import (ArrayField, BooleanField, DateTimeField, GeoPointField, NumberField,
+                                                     ObjectField, RefField)
+from leancloud_better_storage.storage.policy import RETRY_STATUSES
+
+DEFAULT_RETRIES = 3
+RETRY_BACKOFF = 0.5  # seconds before the first retry, doubled on each later retry
+FORMATS = ('jsonl', 'csv')
+_EXTENSIONS = {'.jsonl': 'jsonl', '.ndjson': 'jsonl', '.json': 'jsonl', '.csv': 'csv'}
+_METADATA_ATTRS = frozenset(('object_id', 'created_at', 'updated_at'))
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointedError(Exception):
+    """ 断点之前的运行中失败的行，从断点恢复时原来的异常只保留描述。 """
+
+
+class ImportResult(object):
+    """
+    批量导入的结果。
+
+    为了在导入大量数据时保持内存稳定，只记录数量和失败的行。`failed` 中是 `(行号, 错误)`，行号从 1 开始，
+    不含空行和表头。从断点恢复时，之前失败的行也会被恢复，错误为 `CheckpointedError`。
+    """
+
+    def __init__(self, position=0, imported=0):
+        self.position = position
+        self.imported = imported
+        self.failed = []
+        self._start_position = position
+        self._started = time.monotonic()
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self._started
+
+    @property
+    def rows_per_sec(self):
+        """ 本次运行（不含断点之前）每秒处理的行数。 """
+        elapsed = self.elapsed
+        return (self.position - self._start_position) / elapsed if elapsed else 0.0
+
+    def raise_for_errors(self):
+        for _, error in self.failed:
+            raise error
+
+    def __repr__(self):
+        return '<ImportResult position={} imported={} failed={}>'.format(self.position, self.imported,
+                                                                         len(self.failed))
+
+
+def _is_path(source):
+    return isinstance(source, (str, bytes)) or hasattr(source, '__fspath__')
+
+
+def _format_of(source, format):
+    if format is None:
+        if not _is_path(source):
+            return 'jsonl'
+        format = _EXTENSIONS.get(os.path.splitext(os.fsdecode(source))[1].lower())
+        if format is None:
+            raise ValueError('could not detect format of {!r}, specify format explicitly.'.format(source))
+    if format not in FORMATS:
+        raise ValueError('unsupported import format {!r}, expect one of {}.'.format(format, ', '.join(FORMATS)))
+    return format
+
+
+def _read(stream, format):
+    """ 逐行读取，JSON Lines 在转换时才解析，以便把格式错误记录为这一行的失败。 """
+    if format == 'csv':
+        return csv.DictReader(stream)
+    return (line for line in stream if line.strip())
+
+
+def _to_datetime(field_name):
+    def convert(value):
+        if isinstance(value, dict):
+            value = value.get('iso')
+        return utils.decode(field_name, {'__type': 'Date', 'iso': value}) if isinstance(value, str) else value
+
+    return convert
+
+
+def _to_geo_point(value):
+    if isinstance(value, dict):
+        return value['latitude'], value['longitude']
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def _to_ref(field):
+    def convert(value):
+        if isinstance(value, dict):
+            value = value.get('objectId')
+        if isinstance(value, str):
+            return field.ref_cls.__meta__.lc_object_class.create_without_data(value)
+        return value
+
+    return convert
+
+
+def _from_text(field, convert):
+    """ CSV 中的值都是字符串，先按字段类型解析。 """
+    if isinstance(field, NumberField):
+        return lambda value: float(value) if any(c in value for c in '.eE') else int(value)
+    if isinstance(field, BooleanField):
+        def to_bool(value):
+            try:
+                return {'true': True, '1': True, 'false': False, '0': False}[value.lower()]
+            except KeyError:
+                raise ValueError('invalid boolean value {!r}'.format(value))
+
+        return to_bool
+    if isinstance(field, (ObjectField, ArrayField)):
+        return lambda value: convert(json.loads(value)) if convert else json.loads(value)
+    return convert
+
+
+class _RowConverter(object):
+    """ 把一行输入转换为 `Model.create` 的关键字参数，格式与 `Query.export` 的输出一致。 """
+
+    def __init__(self, model, format):
+        self._text = format == 'csv'
+        self._json = format == 'jsonl'
+        self._converters = {}
+        self._geo_columns = {}  # csv column -> (attr name, index in pair)
+        for attr_name, field in model.__fields__.items():
+            convert = None
+            if isinstance(field, DateTimeField):
+                convert = _to_datetime(field.field_name)
+            elif isinstance(field, GeoPointField):
+                convert = _to_geo_point
+                self._geo_columns['{}_latitude'.format(attr_name)] = (attr_name, 0)
+                self._geo_columns['{}_longitude'.format(attr_name)] = (attr_name, 1)
+            elif isinstance(field, RefField):
+                convert = _to_ref(field)
+            if self._text:
+                convert = _from_text(field, convert)
+            if convert is not None:
+                self._converters[attr_name] = convert
+
+    def __call__(self, row):
+        if self._json:
+            row = json.loads(row)
+            if not isinstance(row, dict):
+                raise ValueError('row should be a JSON object.')
+
+        values = {}
+        geo_points = {}
+        for key, value in row.items():
+            if key in _METADATA_ATTRS or value is None or self._text and value == '':
+                continue
+            if self._text and key in self._geo_columns:
+                attr_name, index = self._geo_columns[key]
+                geo_points.setdefault(attr_name, [None, None])[index] = float(value)
+                continue
+            convert = self._converters.get(key)
+            values[key] = convert(value) if convert else value
+        for attr_name, pair in geo_points.items():
+            if None in pair:
+                raise ValueError('both latitude and longitude of {} are required.'.format(attr_name))
+            values[attr_name] = tuple(pair)
+        return values
+
+
+def _transient(error):
+    """
+    只有 429、5xx 或请求发出之前的连接错误值得重试。
+    对象本身的错误（如校验失败、唯一值冲突）重试也不会成功；读超时或连接中断时分块可能已被保存，重发会产生重复的对象。
+    """
+    if isinstance(error, batch.BatchRequestError):
+        return error.status in RETRY_STATUSES
+    if isinstance(error, ConnectTimeout):
+        return True
+    if isinstance(error, ConnectionError) and not isinstance(error, ReadTimeout):
+        return isinstance(getattr(error.args[0] if error.args else None, 'reason', None), NewConnectionError)
+    return False
+
+
+def _send(lc_objects, retries):
+    """ 保存一个分块，暂时性的失败（包括整个分块失败时）按指数退避重试，已保存的对象不会重复发送。 """
+
+    def guarded(objects):
+        try:
+            return batch._batch_request(objects, batch._save_request, lambda obj, content: obj._update_data(content))
+        except Exception as exc:
+            return [exc] * len(objects)
+
+    errors = guarded(lc_objects) if lc_objects else []
+    for attempt in range(retries):
+        pending = [i for i, error in enumerate(errors) if error is not None and _transient(error)]
+        if not pending:
+            break
+        time.sleep(RETRY_BACKOFF * 2 ** attempt)
+        for i, error in zip(pending, guarded([lc_objects[i] for i in pending])):
+            errors[i] = error
+    return errors
+
+
+def _save_checkpoint(path, result):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as fp:
+        json.dump({'position': result.position, 'imported': result.imported,
+                   'failed': [[row_number, repr(error)] for row_number, error in result.failed]}, fp)
+    os.replace(tmp, path)
+
+
+def bulk_import(model, source, format=None, chunk_size=None, workers=None, retries=DEFAULT_RETRIES, progress=None,
+                checkpoint=None):
+    """ 参考 `Model.bulk_import`。 """
+    chunk_size = chunk_size or batch.DEFAULT_CHUNK_SIZE
+    workers = workers or batch.DEFAULT_WORKERS
+
+    result = ImportResult()
+    state = batch._load_checkpoint(checkpoint) if checkpoint else None
+    if state:
+        logger.warning('resuming import from checkpoint %s after row %d', checkpoint, state['position'])
+        result = ImportResult(state['position'], state['imported'])
+        result.failed = [(row_number, CheckpointedError(message)) for row_number, message in state['failed']]
+
+    stream = None
+    if _is_path(source) or hasattr(source, 'read'):
+        format = _format_of(source, format)
+        stream = open(source, encoding='utf-8', newline='') if _is_path(source) else source
+        convert = _RowConverter(model, format)
+        rows = _read(stream, format)
+    else:
+        convert = _RowConverter(model, None)
+        rows = iter(source)
+
+    def finish(position, invalid, row_numbers, errors):
+        result.position = position
+        result.imported += errors.count(None)
+        failed = invalid + [(row_number, error) for row_number, error in zip(row_numbers, errors) if error is not None]
+        result.failed.extend(sorted(failed, key=lambda item: item[0]))
+        if checkpoint:
+            _save_checkpoint(checkpoint, result)
+        if progress:
+            progress(result)
+
+    pending = deque()  # chunks in input order, checkpoint only moves past finished prefix
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            numbered = islice(enumerate(rows, 1), result.position, None)
+            while True:
+                chunk = list(islice(numbered, chunk_size))
+                if chunk:
+                    instances, row_numbers, invalid = [], [], []
+                    for row_number, row in chunk:
+                        try:
+                            instances.append(model.create(**convert(row)))
+                            row_numbers.append(row_number)
+                        except (KeyError, ValueError, TypeError, AttributeError) as exc:
+                            invalid.append((row_number, exc))
+                    model._do_batch_life_cycle_hook('pre_create', instances)
+                    future = executor.submit(_send, [instance._lc_obj for instance in instances], retries)
+                    pending.append((chunk[-1][0], invalid, row_numbers, future))
+
+                # keep a bounded window of in-flight chunks
+                while pending and (len(pending) > workers * 2 or not chunk or pending[0][3].done()):
+                    position, invalid, row_numbers, future = pending.popleft()
+                    finish(position, invalid, row_numbers, future.result())
+
+                if not chunk:
+                    break
+    finally:
+        if stream is not None and stream is not source:
+            stream.close()
+
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return result
+
+
+def _load_model(path):
+    module_name, _, class_name = path.rpartition(':') if ':' in path else path.rpartition('.')
+    if not module_name:
+        raise ValueError('model should be given as `package.module:Model`.')
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def _reporter(stream, interval=1.0):
+    last = [0.0]
+
+    def report(result, final=False):
+        now = time.monotonic()
+        if not final and now - last[0] < interval:
+            return
+        last[0] = now
+        stream.write('\r{} rows, {} imported, {} failed, {:.0f} rows/s'.format(
+            result.position, result.imported, len(result.failed), result.rows_per_sec))
+        if final:
+            stream.write('\n')
+        stream.flush()
+
+    return report
+
+
+def main(argv=None, out=None):
+    parser = argparse.ArgumentParser(prog='python -m leancloud_better_storage.import',
+                                     description='bulk import rows from JSON Lines or CSV file into a Model.')
+    parser.add_argument('model', help='model class, e.g. myapp.models:Person')
+    parser.add_argument('file', help='input file, .jsonl or .csv')
+    parser.add_argument('--format', choices=FORMATS, help='input format, detect from file extension by default')
+    parser.add_argument('--chunk-size', type=int, default=batch.DEFAULT_CHUNK_SIZE, help='objects per /batch request')
+    parser.add_argument('--workers', type=int, default=batch.DEFAULT_WORKERS, help='concurrent /batch requests')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES, help='retries of failed objects')
+    parser.add_argument('--checkpoint', help='checkpoint file, default <file>.checkpoint, resume from it if it exists')
+    parser.add_argument('--app-id', default=os.environ.get('LEANCLOUD_APP_ID'))
+    parser.add_argument('--app-key', default=os.environ.get('LEANCLOUD_APP_KEY'))
+    parser.add_argument('--master-key', default=os.environ.get('LEANCLOUD_MASTER_KEY'))
+    args = parser.parse_args(argv)
+    out = out or sys.stderr
+
+    sys.path.insert(0, os.getcwd())
+    model = _load_model(args.model)
+    if args.app_id:
+        leancloud.init(args.app_id, app_key=args.app_key, master_key=args.master_key)
+
+    checkpoint = args.checkpoint or args.file + '.checkpoint'
+    if os.path.exists(checkpoint):
+        out.write('resuming from checkpoint {}\n'.format(checkpoint))
+
+    report = _reporter(out)
+    result = bulk_import(model, args.file, args.format, args.chunk_size, args.workers, args.retries, report,
+                         checkpoint)
+    report(result, final=True)
+    for row_number, error in result.failed[:20]:
+        out.write('row {}: {!r}\n'.format(row_number, error))
+    if len(result.failed) > 20:
+        out.write('... {} more failed rows\n'.format(len(result.failed) - 20))
+    return 0 if result.ok else 1
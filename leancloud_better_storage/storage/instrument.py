@@ -0,0 +1,220 @@
+"""
+存储操作的观测接口。
+
+`Query`、`Model`、`Cursor`、`Pages`、`ObjectId` 发出的每个网络操作结束后，都会以一个 `Event` 通知所有订阅者： ::
+
+    from leancloud_better_storage.storage import instrument
+
+    @instrument.subscribe
+    def on_event(event):
+        print(event.kind, event.model.__name__, event.duration, event.response_bytes, event.objects)
+
+没有订阅者时不会计时、不会序列化查询条件，也不会挂载 HTTP 响应钩子，开销只有一次判断。
+内置的导出器见 `metrics` 模块。
+"""
+import json
+import logging
+import threading
+import time
+
+import leancloud
+from leancloud import client
+
+logger = logging.getLogger(__name__)
+
+_observers = ()  # replaced as a whole on (un)subscribe, so it can be read without lock
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Event(object):
+    """
+    一个已完成的网络操作。
+
+    - `kind`：操作类型
+
+      - `find`、`first`、`count`、`scan`：查询，`paginate` 的每一页也是 `find`
+      - `resolve_refs`：批量加载引用对象，`model` 为被引用的 Model
+      - `update`、`delete`：`Query.update`、`Query.delete`
+      - `commit`、`commit_all`、`drop`、`drop_all`：Model 的保存和删除
+      - `fetch`：加载单个对象，即 `ObjectId.fetch` 或访问 `only`/`defer` 没有取回的字段
+    - `model`：Model 类
+    - `where`：序列化（JSON）后的查询条件，没有条件的操作为 None
+    - `order`、`skip`：查询的排序（字段名，降序以 `-` 开头）和跳过的记录数
+    - `duration`：耗时，秒
+    - `requests`、`response_bytes`：这个操作发出的 HTTP 请求数和收到的响应体字节数
+    - `objects`：取回或写入的对象数
+    - `error`：操作抛出的异常，成功时为 None
+    """
+    __slots__ = ('kind', 'model', 'where', 'duration', 'requests', 'response_bytes', 'objects', 'error', 'order',
+                 'skip')
+
+    def __init__(self, kind, model, where, duration, requests, response_bytes, objects, error, order=(), skip=0):
+        self.kind = kind
+        self.model = model
+        self.where = where
+        self.order = order
+        self.skip = skip
+        self.duration = duration
+        self.requests = requests
+        self.response_bytes = response_bytes
+        self.objects = objects
+        self.error = error
+
+    @property
+    def model_name(self):
+        return self.model.__name__ if self.model is not None else None
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'model': self.model_name,
+            'where': self.where,
+            'order': list(self.order),
+            'skip': self.skip,
+            'duration': self.duration,
+            'requests': self.requests,
+            'response_bytes': self.response_bytes,
+            'objects': self.objects,
+            'error': repr(self.error) if self.error is not None else None,
+        }
+
+    def __repr__(self):
+        return '<Event {} {} {:.3f}s>'.format(self.kind, self.model_name, self.duration)
+
+
+def _describe(where):
+    """ :return: (serialized where, order, skip) """
+    if where is None:
+        return None, (), 0
+    order, skip = (), 0
+    if isinstance(where, leancloud.Query):
+        where, order, skip = where._where, tuple(where._order), where._skip
+    return json.dumps(where, sort_keys=True, separators=(',', ':'), default=str), order, skip
+
+
+class _Operation(object):
+    """ 进行中的操作，同一线程内收到的 HTTP 响应都计入当前操作。 """
+    __slots__ = ('kind', 'model', 'where', 'objects', 'requests', 'response_bytes', '_started', '_parent', '_lock')
+
+    def __init__(self, kind, model, where):
+        self.kind = kind
+        self.model = model
+        self.where = where
+        self.objects = 0
+        self.requests = 0
+        self.response_bytes = 0
+        self._lock = threading.Lock()
+
+    def _add_response(self, size):
+        with self._lock:  # responses of batch operations arrive from worker threads
+            self.requests += 1
+            self.response_bytes += size
+
+    def __enter__(self):
+        self._parent = getattr(_local, 'operation', None)
+        _local.operation = self
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        duration = time.perf_counter() - self._started
+        _local.operation = self._parent
+        where, order, skip = _describe(self.where)
+        _emit(Event(self.kind, self.model, where, duration, self.requests, self.response_bytes, self.objects, exc_val,
+                    order, skip))
+        return False
+
+
+class _NullOperation(object):
+    """ 没有订阅者时使用的空操作。 """
+    __slots__ = ()
+
+    objects = property(lambda self: 0, lambda self, value: None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_OPERATION = _NullOperation()
+
+
+def enabled():
+    """ 是否有订阅者。 """
+    return bool(_observers)
+
+
+def operation(kind, model, where=None):
+    """
+    观测一个网络操作，用作 `with` 语句，可以在其中设置 `objects`： ::
+
+        with instrument.operation('find', self._model, q) as op:
+            results = q.find()
+            op.objects = len(results)
+
+    :param kind: operation kind
+    :param model: Model class
+    :param where: `leancloud.Query` or where dict, serialized only when someone subscribed
+    """
+    if not _observers:
+        return _NULL_OPERATION
+    return _Operation(kind, model, where)
+
+
+def propagate(fn):
+    """ 让 `fn` 在其他线程中运行时，收到的 HTTP 响应仍计入当前线程的操作。 """
+    current = getattr(_local, 'operation', None)
+    if current is None:
+        return fn
+
+    def wrapper(*args, **kwargs):
+        saved = getattr(_local, 'operation', None)
+        _local.operation = current
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.operation = saved
+
+    return wrapper
+
+
+def _on_response(response, *args, **kwargs):
+    current = getattr(_local, 'operation', None)
+    if current is not None:
+        current._add_response(len(response.content))
+
+
+def _emit(event):
+    for observer in _observers:
+        try:
+            observer(event)
+        except Exception:
+            logger.exception('storage event observer %r failed', observer)
+
+
+def subscribe(observer):
+    """
+    订阅事件，`observer` 以 `Event` 为参数，在完成操作的线程中同步调用。可以用作装饰器。
+
+    :return: observer
+    """
+    global _observers
+    with _lock:
+        if not _observers:
+            client.request_hooks.setdefault('response', []).append(_on_response)
+        _observers = _observers + (observer,)
+    return observer
+
+
+def unsubscribe(observer):
+    """ 取消订阅，最后一个订阅者取消后卸载 HTTP 响应钩子。 """
+    global _observers
+    with _lock:
+        observers = list(_observers)
+        observers.remove(observer)
+        _observers = tuple(observers)
+        if not _observers:
+            client.request_hooks['response'].remove(_on_response)
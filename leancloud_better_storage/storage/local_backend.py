@@ -0,0 +1,608 @@
+import base64
+import itertools
+import json
+import math
+import re
+import socket
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl, urlsplit
+
+import leancloud
+import requests
+from leancloud import client
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+from leancloud_better_storage.storage.err import LeanCloudErrorCode
+
+_missing = object()
+
+_DEFAULT_LIMIT = 100
+_MAX_LIMIT = 1000
+_METADATA_KEYS = ('objectId', 'createdAt', 'updatedAt')
+
+
+def _now_iso():
+    return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def _lookup(doc, key):
+    value = doc
+    for part in key.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return _missing
+        value = value[part]
+
+    if key in ('createdAt', 'updatedAt') and isinstance(value, str):
+        return {'__type': 'Date', 'iso': value}
+    return value
+
+
+def _sort_key(value):
+    """ 近似 MongoDB 的跨类型排序规则。 """
+    if value is _missing or value is None:
+        return 0, 0
+    if isinstance(value, bool):
+        return 5, value
+    if isinstance(value, (int, float)):
+        return 1, value
+    if isinstance(value, str):
+        return 2, value
+    if isinstance(value, dict):
+        value_type = value.get('__type')
+        if value_type == 'Date':
+            return 6, value['iso']
+        if value_type in ('Pointer', 'Object'):
+            return 3, value.get('objectId', '')
+        return 4, json.dumps(value, sort_keys=True)
+    if isinstance(value, list):
+        return 7, json.dumps(value, sort_keys=True)
+    return 8, repr(value)
+
+
+def _equal(value, expected):
+    if isinstance(value, list) and not isinstance(expected, list):
+        return any(_sort_key(item) == _sort_key(expected) for item in value)
+    return _sort_key(value) == _sort_key(expected)
+
+
+def _compare(op):
+    def compare(value, expected, _):
+        left, right = _sort_key(value), _sort_key(expected)
+        return left[0] == right[0] and op(left[1], right[1])
+
+    return compare
+
+
+def _haversine(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (a['latitude'], a['longitude'], b['latitude'], b['longitude']))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * math.asin(min(1.0, math.sqrt(h)))
+
+
+def _near(value, point, condition):
+    if not isinstance(value, dict) or value.get('__type') != 'GeoPoint':
+        return False
+    distance = _haversine(value, point)
+    if '$maxDistance' in condition and distance > condition['$maxDistance']:
+        return False
+    if '$minDistance' in condition and distance < condition['$minDistance']:
+        return False
+    return True
+
+
+def _regex(value, pattern, condition):
+    if not isinstance(value, str):
+        return False
+    flags = 0
+    for option in condition.get('$options', ''):
+        flags |= {'i': re.IGNORECASE, 'm': re.MULTILINE}.get(option, 0)
+    return re.search(pattern, value, flags) is not None
+
+
+_OPERATORS = {
+    '$ne': lambda v, e, _: not _equal(v, e),
+    '$lt': _compare(lambda l, r: l < r),
+    '$lte': _compare(lambda l, r: l <= r),
+    '$gt': _compare(lambda l, r: l > r),
+    '$gte': _compare(lambda l, r: l >= r),
+    '$in': lambda v, e, _: any(_equal(v, item) for item in e),
+    '$nin': lambda v, e, _: not any(_equal(v, item) for item in e),
+    '$all': lambda v, e, _: isinstance(v, list) and all(_equal(v, item) for item in e),
+    '$size': lambda v, e, _: isinstance(v, list) and len(v) == e,
+    '$exists': lambda v, e, _: (v is not _missing) == bool(e),
+    '$regex': _regex,
+    '$nearSphere': _near,
+    '$options': lambda v, e, _: True,
+    '$maxDistance': lambda v, e, _: True,
+    '$minDistance': lambda v, e, _: True,
+}
+
+
+def _apply_operation(doc, key, value):
+    if not (isinstance(value, dict) and '__op' in value):
+        doc[key] = value
+        return
+
+    op = value['__op']
+    old = doc.get(key)
+    if op == 'Delete':
+        doc.pop(key, None)
+    elif op == 'Increment':
+        doc[key] = (old or 0) + value['amount']
+    elif op == 'Add':
+        doc[key] = list(old or []) + value['objects']
+    elif op == 'AddUnique':
+        doc[key] = list(old or [])
+        doc[key].extend(item for item in value['objects'] if item not in doc[key])
+    elif op == 'Remove':
+        doc[key] = [item for item in (old or []) if item not in value['objects']]
+    elif op == 'BitAnd':
+        doc[key] = (old or 0) & value['value']
+    elif op == 'BitOr':
+        doc[key] = (old or 0) | value['value']
+    elif op == 'BitXor':
+        doc[key] = (old or 0) ^ value['value']
+    else:
+        raise _RequestError(1, 'Unsupported operation {}.'.format(op))
+
+
+class _RequestError(Exception):
+
+    def __init__(self, code, error):
+        super().__init__(code, error)
+        self.code = code
+        self.error = error
+
+
+class LocalBackend(object):
+    """
+    进程内的 LeanCloud 存储替身。
+
+    安装后所有经由 leancloud SDK 发出的存储请求（`Query.find`、`Query.scan`、`Model.commit_all` 等）
+    都会被路由到内存中的数据集，不产生任何网络请求。
+    SDK 的序列化和反序列化过程仍然完整执行，因此可用于离线测试，也可以把本库自身的开销与网络延迟分开测量。
+
+    in-process stand-in for LeanCloud storage service, it plugs in as the transport adapter of
+    `leancloud.client.session`, so everything above the HTTP layer runs unchanged.
+
+    例子:
+    ::
+
+        with LocalBackend(latency=0.01) as backend:
+            Person.commit_all(*persons)
+            assert backend.stats['batch'] == 1
+
+    :param latency: simulated round trip time of every request, in seconds.
+    :param batch_limit: maximum requests in one `/batch` call, `None` means unlimited.
+    """
+
+    def __init__(self, latency=0.0, batch_limit=None):
+        self.latency = latency
+        self.batch_limit = batch_limit
+        self.stats = Counter()
+        self._classes = {}
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self._adapter = LocalAdapter(self)
+        self._saved = None
+
+    # -- installation ---------------------------------------------------
+
+    def install(self):
+        """ 将替身挂载到 leancloud SDK 的 HTTP 会话上。 """
+        if self._saved is not None:
+            return self
+
+        self._saved = {
+            'adapters': OrderedDict(client.session.adapters),
+            'app_router': client.app_router,
+            'app_info': (client.APP_ID, client.APP_KEY, client.MASTER_KEY, client.HOOK_KEY),
+        }
+        client.session.mount('https://', self._adapter)
+        client.session.mount('http://', self._adapter)
+        client.app_router = _LocalAppRouter()
+        if client.APP_ID is None:
+            leancloud.init('local-app-id', 'local-app-key', 'local-master-key')
+        return self
+
+    def uninstall(self):
+        """ 恢复 leancloud SDK 原本的 HTTP 会话和初始化状态。 """
+        if self._saved is None:
+            return
+
+        client.session.adapters = self._saved['adapters']
+        client.app_router = self._saved['app_router']
+        client.APP_ID, client.APP_KEY, client.MASTER_KEY, client.HOOK_KEY = self._saved['app_info']
+        self._saved = None
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.uninstall()
+
+    # -- inspection -----------------------------------------------------
+
+    def reset(self):
+        """ 清空所有数据集和请求计数。 """
+        with self._lock:
+            self._classes.clear()
+            self.stats.clear()
+
+    def objects(self, class_name):
+        """ 返回数据集内所有对象的原始 JSON 数据（拷贝）。 """
+        with self._lock:
+            return json.loads(json.dumps(list(self._classes.get(class_name, {}).values())))
+
+    # -- request handling -----------------------------------------------
+
+    def handle(self, method, path, params, body):
+        """
+        处理一个 REST 请求。
+
+        :param method: HTTP method
+        :param path: path without api version, e.g. `/classes/Person`
+        :param params: decoded query string
+        :param body: decoded JSON body or None
+        :return: (status code, JSON content)
+        """
+        if self.latency:
+            time.sleep(self.latency)
+
+        try:
+            with self._lock:
+                return 200, self._dispatch(method, path, params, body)
+        except _RequestError as exc:
+            return 400, {'code': exc.code, 'error': exc.error}
+
+    def _dispatch(self, method, path, params, body):
+        parts = [part for part in path.split('/') if part]
+
+        if parts == ['batch'] and method == 'POST':
+            self.stats['batch'] += 1
+            return self._batch(body['requests'])
+        if len(parts) == 3 and parts[:2] == ['scan', 'classes'] and method == 'GET':
+            self.stats['scan'] += 1
+            return self._scan(parts[2], params)
+        if len(parts) == 2 and parts[0] == 'classes':
+            if method == 'GET':
+                self.stats['count' if params.get('count') == '1' else 'find'] += 1
+                return self._find(parts[1], params)
+            if method == 'POST':
+                self.stats['create'] += 1
+                return self._create(parts[1], params, body or {})
+        if len(parts) == 3 and parts[0] == 'classes':
+            if method == 'GET':
+                self.stats['get'] += 1
+                return self._get(parts[1], parts[2], params)
+            if method == 'PUT':
+                self.stats['update'] += 1
+                return self._update(parts[1], parts[2], params, body or {})
+            if method == 'DELETE':
+                self.stats['delete'] += 1
+                return self._delete(parts[1], parts[2], params)
+
+        raise _RequestError(1, 'Unsupported request {} {}.'.format(method, path))
+
+    def _batch(self, batch_requests):
+        if self.batch_limit is not None and len(batch_requests) > self.batch_limit:
+            raise _RequestError(1, 'Too many requests in one batch, limit is {}.'.format(self.batch_limit))
+
+        results = []
+        for request in batch_requests:
+            path = request['path'].split('/', 2)[-1]
+            path, _, query_string = path.partition('?')
+            params = dict(parse_qsl(query_string))
+            try:
+                results.append({'success': self._dispatch(request['method'], '/' + path, params, request.get('body'))})
+            except _RequestError as exc:
+                results.append({'error': {'code': exc.code, 'error': exc.error}})
+        return results
+
+    def _select(self, class_name, where):
+        docs = self._classes.get(class_name, {}).values()
+        if not where:
+            return list(docs)
+        return [doc for doc in docs if self._match(doc, where)]
+
+    def _match(self, doc, where):
+        for key, condition in where.items():
+            if key == '$and':
+                if not all(self._match(doc, sub) for sub in condition):
+                    return False
+            elif key == '$or':
+                if not any(self._match(doc, sub) for sub in condition):
+                    return False
+            elif isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition):
+                value = _lookup(doc, key)
+                for op, expected in condition.items():
+                    if op not in _OPERATORS:
+                        raise _RequestError(1, 'Unsupported query operator {}.'.format(op))
+                    if not _OPERATORS[op](value, expected, condition):
+                        return False
+            elif not _equal(_lookup(doc, key), condition):
+                return False
+        return True
+
+    @staticmethod
+    def _order(docs, order, where):
+        if order:
+            for key in reversed(order.split(',')):
+                descending = key.startswith('-')
+                key = key.lstrip('-')
+                docs.sort(key=lambda doc: _sort_key(_lookup(doc, key)), reverse=descending)
+        else:
+            near = [(key, cond['$nearSphere']) for key, cond in where.items()
+                    if isinstance(cond, dict) and '$nearSphere' in cond]
+            for key, point in near:
+                docs.sort(key=lambda doc: _haversine(_lookup(doc, key), point))
+        return docs
+
+    def _render(self, doc, params):
+        keys = params.get('keys')
+        if keys:
+            selected = set(keys.split(',')) | set(_METADATA_KEYS)
+            doc = {key: value for key, value in doc.items() if key in selected}
+        else:
+            doc = dict(doc)
+
+        for path in filter(None, params.get('include', '').split(',')):
+            self._include(doc, path.split('.'))
+        return doc
+
+    def _include(self, doc, path):
+        value = doc.get(path[0])
+        if not isinstance(value, dict) or value.get('__type') != 'Pointer':
+            return
+
+        target = self._classes.get(value['className'], {}).get(value['objectId'])
+        if target is None:
+            return
+
+        included = dict(target, __type='Pointer', className=value['className'])
+        if len(path) > 1:
+            self._include(included, path[1:])
+        doc[path[0]] = included
+
+    @staticmethod
+    def _where(params):
+        where = params.get('where') or '{}'
+        return json.loads(where) if isinstance(where, str) else where
+
+    @staticmethod
+    def _limit(params):
+        limit = int(params.get('limit', _DEFAULT_LIMIT))
+        if limit > _MAX_LIMIT:
+            raise _RequestError(1, 'limit should not greater than {}.'.format(_MAX_LIMIT))
+        return limit
+
+    def _find(self, class_name, params):
+        where = self._where(params)
+        docs = self._order(self._select(class_name, where), params.get('order'), where)
+        skip, limit = int(params.get('skip', 0)), self._limit(params)
+        content = {'results': [self._render(doc, params) for doc in docs[skip:skip + limit]]}
+        if params.get('count') == '1':
+            content['count'] = len(docs)
+        return content
+
+    def _scan(self, class_name, params):
+        where = self._where(params)
+        scan_key = params.get('scan_key', 'objectId')
+        limit = self._limit(params)
+
+        def key_of(doc):
+            return _sort_key(_lookup(doc, scan_key)), doc['objectId']
+
+        docs = sorted(self._select(class_name, where), key=key_of)
+        if params.get('cursor'):
+            last = tuple(json.loads(base64.urlsafe_b64decode(params['cursor'].encode()).decode()))
+            last = (tuple(last[0]), last[1])
+            docs = [doc for doc in docs if key_of(doc) > last]
+
+        content = {'results': [self._render(doc, params) for doc in docs[:limit]]}
+        if len(docs) > limit:
+            cursor = json.dumps(key_of(docs[limit - 1]))
+            content['cursor'] = base64.urlsafe_b64encode(cursor.encode()).decode()
+        return content
+
+    def _get(self, class_name, object_id, params):
+        doc = self._classes.get(class_name, {}).get(object_id)
+        return {} if doc is None else self._render(doc, params)
+
+    def _create(self, class_name, params, body):
+        now = _now_iso()
+        doc = {'objectId': '{:08x}{:016x}'.format(int(time.time()), next(self._ids)), 'createdAt': now,
+               'updatedAt': now}
+        for key, value in body.items():
+            if not key.startswith('__') and key not in _METADATA_KEYS:
+                _apply_operation(doc, key, value)
+
+        self._classes.setdefault(class_name, OrderedDict())[doc['objectId']] = doc
+        if params.get('fetchWhenSave') == 'true':
+            return dict(doc)
+        return {'objectId': doc['objectId'], 'createdAt': now}
+
+    def _update(self, class_name, object_id, params, body):
+        doc = self._classes.get(class_name, {}).get(object_id)
+        if doc is None:
+            raise _RequestError(LeanCloudErrorCode.ClassOrObjectNotExists.value, 'Object not found.')
+        if params.get('where') and not self._match(doc, self._where(params)):
+            raise _RequestError(305, 'No effect on updating/deleting a document.')
+
+        for key, value in body.items():
+            if not key.startswith('__') and key not in _METADATA_KEYS:
+                _apply_operation(doc, key, value)
+        doc['updatedAt'] = _now_iso()
+
+        if params.get('fetchWhenSave') == 'true':
+            return dict(doc)
+        return {'objectId': object_id, 'updatedAt': doc['updatedAt']}
+
+    def _delete(self, class_name, object_id, params):
+        collection = self._classes.get(class_name, {})
+        doc = collection.get(object_id)
+        if doc is not None and params.get('where') and not self._match(doc, self._where(params)):
+            raise _RequestError(305, 'No effect on updating/deleting a document.')
+        collection.pop(object_id, None)
+        return {}
+
+
+class LocalAdapter(BaseAdapter):
+    """ requests transport adapter that answers every request with a `LocalBackend`. """
+
+    def __init__(self, backend):
+        super().__init__()
+        self.backend = backend
+
+    def send(self, request, **kwargs):
+        status, content = self.backend.handle(request.method, *_parse_request(request.url, request.body))
+
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(content, separators=(',', ':')).encode('utf-8')
+        response.headers['Content-Type'] = 'application/json;charset=utf-8'
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+def _parse_request(url, body):
+    """ 把请求的 url 和 body 解析为 `LocalBackend.handle` 的 `path, params, body` 参数。 """
+    url = urlsplit(url)
+    path = url.path.split('/', 2)[-1]  # strip api version
+    params = dict(parse_qsl(url.query))
+    if isinstance(body, bytes):
+        body = body.decode('utf-8')
+    body = json.loads(body) if body and body != 'null' else None
+    return '/' + path, params, body
+
+
+class _LocalAppRouter(object):
+
+    def __init__(self, host='leancloud.local'):
+        self.host = host
+
+    def get(self, type_):
+        return self.host
+
+
+class _LocalRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep connections alive unless client asks to close
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # headers and body are sent separately
+        self.server.local_server._count_connection()
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+        status, content = self.server.local_server.backend.handle(self.command, *_parse_request(self.path, body))
+
+        data = json.dumps(content, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class LocalServer(object):
+    """
+    通过本机回环上真实的 HTTP 连接提供 `LocalBackend`。
+
+    `LocalBackend` 直接挂载为 SDK 的传输适配器，不经过 socket；`LocalServer` 在后台线程中启动一个多线程 HTTP 服务器，
+    让请求走完整的 HTTP 连接，用于测量连接池、keep-alive 和并发请求的效果。`connections` 记录服务器接受的连接数。
+
+    例子: ::
+
+        with LocalBackend(latency=0.005) as backend, LocalServer(backend) as server:
+            Person.commit_all(*persons, workers=16)
+            print(server.connections)
+
+    :param backend: the `LocalBackend` answers requests.
+    :param host: listen address.
+    :param port: listen port, 0 means any free port.
+    """
+
+    def __init__(self, backend, host='127.0.0.1', port=0):
+        self.backend = backend
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._address = (host, port)
+        self._server = None
+        self._saved = None
+
+    @property
+    def address(self):
+        host, port = self._server.server_address[:2] if self._server else self._address
+        return '{}:{}'.format(host, port)
+
+    def _count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def install(self):
+        """ 启动服务器，并让 leancloud SDK 通过 HTTP 访问它。 """
+        if self._saved is not None:
+            return self
+
+        self._server = _ThreadingHTTPServer(self._address, _LocalRequestHandler)
+        self._server.local_server = self
+        threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True).start()
+
+        self._saved = {
+            'adapters': OrderedDict(client.session.adapters),
+            'app_router': client.app_router,
+            'use_https': client.USE_HTTPS,
+            'app_info': (client.APP_ID, client.APP_KEY, client.MASTER_KEY, client.HOOK_KEY),
+        }
+        client.session.mount('http://', HTTPAdapter())
+        client.app_router = _LocalAppRouter(self.address)
+        client.USE_HTTPS = False
+        if client.APP_ID is None:
+            leancloud.init('local-app-id', 'local-app-key', 'local-master-key')
+        return self
+
+    def uninstall(self):
+        """ 关闭服务器，恢复 leancloud SDK 原本的设置。 """
+        if self._saved is None:
+            return
+
+        client.session.get_adapter('http://').close()
+        client.session.adapters = self._saved['adapters']
+        client.app_router = self._saved['app_router']
+        client.USE_HTTPS = self._saved['use_https']
+        client.APP_ID, client.APP_KEY, client.MASTER_KEY, client.HOOK_KEY = self._saved['app_info']
+        self._saved = None
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.uninstall()
@@ -1,9 +1,14 @@
 from copy import deepcopy
 
+import leancloud
+
 from leancloud_better_storage.storage._util import ThreadSafeDict
 from leancloud_better_storage.storage.fields import Field, undefined, auto_fill
 
 
+_metadata_field_names = frozenset(('objectId', 'createdAt', 'updatedAt', 'ACL'))
+
+
 class ModelMetaInfo:
 
     @property
@@ -26,6 +31,46 @@ class ModelMetaInfo:
     def leancloud_class(self):
         return self._leancloud_class
 
+    @property
+    def attr_names(self):
+        """ 所有字段的属性名。 """
+        return self._attr_names
+
+    @property
+    def required_attr_names(self):
+        """ 创建时必须提供的字段的属性名。 """
+        return self._required_attr_names
+
+    @property
+    def lc_object_class(self):
+        """ 对应的 `leancloud.Object` 子类。 """
+        if self._lc_object_class is None:
+            self._lc_object_class = leancloud.Object.extend(self._leancloud_class)
+        return self._lc_object_class
+
+    @property
+    def record_class(self):
+        """ 对应的只读记录类，参考 `leancloud_better_storage.storage.records.Record`。 """
+        if self._record_class is None:
+            from leancloud_better_storage.storage.records import record_class
+            self._record_class = record_class(self._model)
+        return self._record_class
+
+    @property
+    def direct_fields(self):
+        """
+        可以绕过描述符直接写入 `leancloud.Object` 的字段，`{属性名: 字段名}`。
+
+        只包括没有重写 `__set__` 的字段，不包括 objectId 等由 LeanCloud 维护的字段。
+        """
+        if self._direct_fields is None:
+            self._direct_fields = {
+                attr_name: field.field_name
+                for attr_name, field in self._fields.items()
+                if type(field).__set__ is Field.__set__ and field.field_name not in _metadata_field_names
+            }
+        return self._direct_fields
+
     def __init__(self, leancloud_class, fields, inherit_fields, required_fields, attributes_default):
         self._leancloud_class = leancloud_class
         self._fields = fields
@@ -33,6 +78,16 @@ class ModelMetaInfo:
         self._required_fields = required_fields
         self._default_attributes = attributes_default
 
+        # precomputed for Model.create
+        self._attr_names = frozenset(fields.keys())
+        self._required_attr_names = frozenset(
+            attr_name for attr_name, field in fields.items()
+            if field.nullable is False and field.default in (None, undefined))
+        self._lc_object_class = None
+        self._direct_fields = None  # field names are not ready until model created
+        self._record_class = None
+        self._model = None  # set by ModelMeta
+
 
 class ModelMeta(type):
     """
@@ -85,13 +140,22 @@ class ModelMeta(type):
                                          attributes_default)
         attr['__fields__'] = fields  # keep compatible with previous version
 
+        # instances only hold the leancloud.Object, unless extra attributes are allowed explicitly.
+        if '__slots__' not in attr and not attr.get('__allow_extra_attributes__', False):
+            attr['__slots__'] = ()
+
         # inject hook table
         attr['_pre_create_hook'] = []
         attr['_pre_update_hook'] = []
         attr['_pre_delete_hook'] = []
+        attr['_pre_create_batch_hook'] = []
+        attr['_pre_update_batch_hook'] = []
+        attr['_pre_delete_batch_hook'] = []
+        attr['_hook_chains'] = {}  # life cycle -> resolved hooks along MRO, see Model._hook_chain
 
         # Tag fields with created model class and its __lc_cls__.
         created = type.__new__(mcs, name, bases, attr)
+        created.__meta__._model = created
 
         for key, field in created.__fields__.items():
             field._after_model_created(created, key)
@@ -0,0 +1,236 @@
+"""
+`instrument` 事件的内置导出器。 ::
+
+    histogram = Histogram().install()
+    exporter = PrometheusExporter(histogram).serve(9100)   # GET http://host:9100/metrics
+    LoggingExporter().install()                           # 每个事件一行 JSON 日志
+"""
+import bisect
+import json
+import logging
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from leancloud_better_storage.storage import instrument
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_PREFIX = 'leancloud_storage'
+
+
+class _Subscriber(object):
+
+    def install(self):
+        """ 订阅 `instrument` 事件。 """
+        instrument.subscribe(self)
+        return self
+
+    def uninstall(self):
+        instrument.unsubscribe(self)
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.uninstall()
+
+
+class _Series(object):
+    __slots__ = ('buckets', 'count', 'duration', 'requests', 'response_bytes', 'objects', 'errors')
+
+    def __init__(self, size):
+        self.buckets = [0] * size
+        self.count = 0
+        self.duration = 0.0
+        self.requests = 0
+        self.response_bytes = 0
+        self.objects = 0
+        self.errors = 0
+
+
+class Histogram(_Subscriber):
+    """
+    内存中的耗时直方图，按 (操作类型, Model 名) 分组，同时累计请求数、响应字节数、对象数和失败数。线程安全。
+
+    :param buckets: 桶的上界（秒），升序
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        key = (event.kind, event.model_name)
+        index = bisect.bisect_left(self.buckets, event.duration)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(len(self.buckets) + 1)
+            series.buckets[index] += 1
+            series.count += 1
+            series.duration += event.duration
+            series.requests += event.requests
+            series.response_bytes += event.response_bytes
+            series.objects += event.objects
+            series.errors += event.error is not None
+
+    def snapshot(self):
+        """
+        :return: dict of (kind, model name) -> dict with count, sum, buckets (upper bound -> cumulative count),
+                 requests, response_bytes, objects and errors
+        """
+        with self._lock:
+            result = {}
+            for key, series in self._series.items():
+                cumulative, total = OrderedDict(), 0
+                for bound, n in zip(self.buckets + (float('inf'),), series.buckets):
+                    total += n
+                    cumulative[bound] = total
+                result[key] = {
+                    'count': series.count,
+                    'sum': series.duration,
+                    'buckets': cumulative,
+                    'requests': series.requests,
+                    'response_bytes': series.response_bytes,
+                    'objects': series.objects,
+                    'errors': series.errors,
+                }
+            return result
+
+    def quantile(self, kind, model, q):
+        """
+        按桶估计耗时的分位数，返回所在桶的上界，没有数据时返回 None。
+
+        :param model: Model 类或名称
+        :param q: 0 到 1 之间
+        """
+        key = (kind, model if isinstance(model, str) else model.__name__)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None or not series.count:
+                return None
+            rank, total = q * series.count, 0
+            for bound, n in zip(self.buckets + (float('inf'),), series.buckets):
+                total += n
+                if total >= rank:
+                    return bound
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_float(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class PrometheusExporter(object):
+    """
+    以 Prometheus 文本格式导出 `Histogram` 的数据。
+
+    指标（标签为 `kind` 和 `model`）：
+
+    - `leancloud_storage_operation_duration_seconds`：histogram
+    - `leancloud_storage_requests_total`、`leancloud_storage_response_bytes_total`、
+      `leancloud_storage_objects_total`、`leancloud_storage_errors_total`：counter
+
+    :param histogram: 数据来源，默认创建并订阅一个新的 `Histogram`
+    """
+
+    def __init__(self, histogram=None):
+        self.histogram = histogram if histogram is not None else Histogram().install()
+        self._server = None
+
+    def render(self):
+        """ :return: text exposition format """
+        snapshot = self.histogram.snapshot()
+        name = METRIC_PREFIX + '_operation_duration_seconds'
+        lines = ['# HELP {} Duration of storage operations.'.format(name), '# TYPE {} histogram'.format(name)]
+        series = sorted(snapshot.items(), key=lambda item: tuple(map(str, item[0])))
+        for (kind, model), data in series:
+            labels = 'kind="{}",model="{}"'.format(_escape(kind), _escape(model))
+            for bound, count in data['buckets'].items():
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, _format_float(bound), count))
+            lines.append('{}_sum{{{}}} {}'.format(name, labels, _format_float(data['sum'])))
+            lines.append('{}_count{{{}}} {}'.format(name, labels, data['count']))
+
+        for key, description in (('requests', 'HTTP requests sent by storage operations.'),
+                                 ('response_bytes', 'Bytes of HTTP response bodies received by storage operations.'),
+                                 ('objects', 'Objects fetched or written by storage operations.'),
+                                 ('errors', 'Storage operations failed with an exception.')):
+            counter = '{}_{}_total'.format(METRIC_PREFIX, key)
+            lines.append('# HELP {} {}'.format(counter, description))
+            lines.append('# TYPE {} counter'.format(counter))
+            for (kind, model), data in series:
+                lines.append('{}{{kind="{}",model="{}"}} {}'.format(counter, _escape(kind), _escape(model), data[key]))
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host=''):
+        """
+        在后台线程启动 HTTP 服务，以 `GET /metrics` 提供 `render()` 的内容。
+
+        :param port: 端口，0 表示随机端口，实际地址见 `address`
+        """
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = HTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def address(self):
+        return self._server.server_address if self._server is not None else None
+
+    def shutdown(self):
+        """ 停止 HTTP 服务。 """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class LoggingExporter(_Subscriber):
+    """
+    把每个事件记录为一行 JSON 日志，事件的各项同时以 `storage_event` 放入日志记录的 `extra`，便于结构化日志处理器使用。
+
+    :param logger: logging.Logger, 默认为 `leancloud_better_storage.storage.metrics`
+    :param level: 成功操作的日志级别，失败的操作总是以 WARNING 记录
+    :param min_duration: 只记录耗时不少于这么多秒的操作
+    """
+
+    def __init__(self, logger=None, level=logging.INFO, min_duration=0.0):
+        self.logger = logger or logging.getLogger(__name__)
+        self.level = level
+        self.min_duration = min_duration
+
+    def __call__(self, event):
+        if event.duration < self.min_duration:
+            return
+        level = self.level if event.error is None else logging.WARNING
+        if not self.logger.isEnabledFor(level):
+            return
+        data = event.to_dict()
+        self.logger.log(level, json.dumps(data, sort_keys=True), extra={'storage_event': data})
@@ -1,6 +1,12 @@
 import leancloud
-
-from leancloud_better_storage.storage.fields import Field, auto_fill
+from leancloud import utils
+from leancloud.operation import Set
+
+from leancloud_better_storage.storage import batch, importer, instrument
+from leancloud_better_storage.storage.aio import AsyncQuery, get_executor, run_in_executor
+from leancloud_better_storage.storage.batch import BatchResult
+from leancloud_better_storage.storage.fields import Field, auto_fill, undefined
+from leancloud_better_storage.storage.fields.field import _same_value
 from leancloud_better_storage.storage.meta import ModelMeta
 from leancloud_better_storage.storage.query import Query
 
@@ -30,7 +36,11 @@ class Model(object, metaclass=ModelMeta):
     通常不应在创建时指定。
 
     关于可以使用的字段类，请参考 :ref:`leancloud_better_storage.storage.fields`。
+
+    为了减少内存占用，Model 及其子类都使用 `__slots__`，实例上不能设置字段以外的属性。
+    需要在实例上保存额外属性时，在类中声明 `__allow_extra_attributes__ = True`，或者自行声明 `__slots__`。
     """
+    __slots__ = ('_lc_obj', '_original', '_unloaded')
     __lc_cls__ = ''
     __fields__ = {}
 
@@ -42,25 +52,77 @@ class Model(object, metaclass=ModelMeta):
     def register_pre_create_hook(cls, fn):
         """ 注册新对象保存时的钩子函数。对于 object_id 为空的对象将被视为新对象。 """
         cls._pre_create_hook.append(fn)
+        cls._invalidate_hook_chains()
 
     @classmethod
     def register_pre_update_hook(cls, fn):
         """ 注册对象更新时的钩子函数。 """
         cls._pre_update_hook.append(fn)
+        cls._invalidate_hook_chains()
 
     @classmethod
     def register_pre_delete_hook(cls, fn):
         """ 注册删除对象时调用的钩子函数。 """
         cls._pre_delete_hook.append(fn)
+        cls._invalidate_hook_chains()
 
-    def _do_life_cycle_hook(self, life_cycle):
-        hook_fn_attr_name = '_{}_hook'.format(life_cycle)
-        hook_fn = getattr(self, hook_fn_attr_name, [])
-        for cls in self.__class__.mro():
-            hook_fn.extend(getattr(cls, hook_fn_attr_name, []))
+    @classmethod
+    def register_pre_create_batch_hook(cls, fn):
+        """
+        注册新对象保存时的批量钩子函数。
 
-        for fn in hook_fn:
-            fn(self)
+        与 `register_pre_create_hook` 不同，钩子函数每批只被调用一次，参数是这一批中属于本类（及子类）的实例列表。
+        `commit` 单个对象时，参数是只有一个实例的列表。批量钩子在逐个实例的钩子之前执行。
+        """
+        cls._pre_create_batch_hook.append(fn)
+        cls._invalidate_hook_chains()
+
+    @classmethod
+    def register_pre_update_batch_hook(cls, fn):
+        """ 注册对象更新时的批量钩子函数，参考 `register_pre_create_batch_hook`。 """
+        cls._pre_update_batch_hook.append(fn)
+        cls._invalidate_hook_chains()
+
+    @classmethod
+    def register_pre_delete_batch_hook(cls, fn):
+        """ 注册删除对象时调用的批量钩子函数，参考 `register_pre_create_batch_hook`。 """
+        cls._pre_delete_batch_hook.append(fn)
+        cls._invalidate_hook_chains()
+
+    @classmethod
+    def _invalidate_hook_chains(cls):
+        cls._hook_chains.clear()
+        for subclass in cls.__subclasses__():
+            subclass._invalidate_hook_chains()
+
+    @classmethod
+    def _hook_chain(cls, life_cycle):
+        """ 按 MRO 顺序收集的钩子函数，每个类只在第一次使用时（或注册新钩子后）计算一次。 """
+        chain = cls._hook_chains.get(life_cycle)
+        if chain is None:
+            hook_fn_attr_name = '_{}_hook'.format(life_cycle)
+            chain = tuple(fn for klass in cls.__mro__ for fn in klass.__dict__.get(hook_fn_attr_name, ()))
+            cls._hook_chains[life_cycle] = chain
+        return chain
+
+    def _do_life_cycle_hook(self, life_cycle):
+        self._do_batch_life_cycle_hook(life_cycle, [self])
+
+    @staticmethod
+    def _do_batch_life_cycle_hook(life_cycle, instances):
+        """ 按实例的类分组，每组先执行一次批量钩子，再对每个实例执行钩子。 """
+        groups = {}
+        for instance in instances:
+            groups.setdefault(type(instance), []).append(instance)
+
+        for cls, group in groups.items():
+            for fn in cls._hook_chain(life_cycle + '_batch'):
+                fn(group)
+            chain = cls._hook_chain(life_cycle)
+            if chain:
+                for instance in group:
+                    for fn in chain:
+                        fn(instance)
 
     @property
     def lc_object(self):
@@ -68,6 +130,60 @@ class Model(object, metaclass=ModelMeta):
 
     def __init__(self, lc_obj=None):
         self._lc_obj = lc_obj
+        self._original = None  # field name -> value before first change since last save, created on demand
+        self._unloaded = None  # field names not loaded by a projected query
+
+    @property
+    def unloaded_fields(self):
+        """ 由 `Query.only` / `Query.defer` 查询时没有取回的字段（属性名）。访问这些字段时会自动补齐。 """
+        if not self._unloaded:
+            return set()
+        return {attr_name for attr_name, field in self.__fields__.items() if field.field_name in self._unloaded}
+
+    def _load_unloaded(self):
+        """ 取回所有未加载的字段，保留本地未保存的修改。 """
+        unloaded, self._unloaded = self._unloaded, None
+        if not unloaded or self.object_id is None:
+            return
+
+        changes = self._lc_obj._changes
+        with instrument.operation('fetch', type(self)) as op:
+            self._lc_obj.fetch(select=sorted(unloaded))
+            op.objects = 1
+        self._lc_obj._changes = changes
+
+    @property
+    def dirty_fields(self):
+        """
+        自上次保存（或查询取回）以来被修改的字段。
+
+        赋回原值的字段不算修改。绕过字段直接修改 `lc_object` 的键无法得知原值，原值记为 `undefined`。
+
+        :return: dict, `{属性名: (原值, 新值)}`
+        """
+        attributes = self._lc_obj._attributes
+        originals = self._original or {}
+        names = {field.field_name: attr_name for attr_name, field in self.__fields__.items()}
+        dirty = {}
+        for field_name in self._lc_obj._changes:
+            original = originals.get(field_name, undefined)
+            current = attributes.get(field_name, undefined)
+            if field_name not in originals or not _same_value(original, current):
+                dirty[names.get(field_name, field_name)] = (original, current)
+        return dirty
+
+    def _prune_changes(self):
+        """
+        从待保存的修改中去掉赋回原值的字段。
+
+        :return: 是否还需要保存
+        """
+        changes = self._lc_obj._changes
+        attributes = self._lc_obj._attributes
+        for field_name, original in (self._original or {}).items():
+            if field_name in changes and _same_value(original, attributes.get(field_name, undefined)):
+                del changes[field_name]
+        return self.object_id is None or bool(changes)
 
     @classmethod
     def create(cls, **kwargs):
@@ -97,29 +213,98 @@ class Model(object, metaclass=ModelMeta):
         :param kwargs: 初始化字段
         :return:
         """
-        # check does given keyword arguments matches model schema
-        input_keys = set(kwargs.keys())
-        required_keys = set(cls.__meta__.required_fields.keys())
-        all_keys = set(cls.__meta__.fields.keys())
+        meta = cls.__meta__
+        if not (kwargs.keys() <= meta.attr_names and kwargs.keys() >= meta.required_attr_names):
+            cls._check_keys(kwargs.keys())
+
+        # fill fields and DO NOT BREAK field restriction
+        obj = cls(meta.lc_object_class())
+        for attr_name, value in meta.attributes_default.items():
+            if attr_name not in kwargs:
+                setattr(obj, attr_name, value() if callable(value) else value)
+        for attr_name, value in kwargs.items():
+            setattr(obj, attr_name, value() if callable(value) else value)
+
+        return obj
+
+    @classmethod
+    def _check_keys(cls, keys):
+        """ check does given keyword arguments matches model schema """
+        input_keys = set(keys)
+        required_keys = cls.__meta__.required_attr_names
+        all_keys = cls.__meta__.attr_names
 
         if not input_keys.issubset(all_keys):
             raise KeyError("Unknown field name {}".format(input_keys - all_keys))
         elif not required_keys.issubset(input_keys):
-            raise KeyError("Missing required field {}".format(required_keys - input_keys))
+            raise KeyError("Missing required field {}".format(set(required_keys - input_keys)))
 
-        # fill fields and DO NOT BREAK field restriction
-        lc_obj = leancloud.Object.create(cls.__lc_cls__)
-        obj = cls(lc_obj)
-        for attr_name, value in dict(cls.__meta__.attributes_default, **kwargs).items():
-            setattr(obj, attr_name, value() if callable(value) else value)
+    @classmethod
+    def create_many(cls, rows):
+        """
+        批量创建 Model 实例，同样不会立即保存。
 
-        return obj
+        `rows` 可以是字典的列表，也可以是“属性名 -> 值的列表”形式的按列数据： ::
+
+            people = Person.create_many([{'name': 'remilia', 'age': 549}, {'name': 'flandre', 'age': 494}])
+            people = Person.create_many({'name': ['remilia', 'flandre'], 'age': [549, 494]})
+
+        字段规则与 `create` 相同，但每一种字段组合只检查一次；没有重写赋值逻辑的字段直接写入 `leancloud.Object`，
+        不经过字段描述符。
+
+        :param rows: list of dict, or dict of columns
+        :return: list of instances
+        """
+        if isinstance(rows, dict):
+            keys = tuple(rows.keys())
+            columns = [list(column) for column in rows.values()]
+            if len({len(column) for column in columns}) > 1:
+                raise ValueError('Columns should have same length.')
+            items = ((keys, values) for values in zip(*columns))
+        else:
+            items = ((tuple(row.keys()), row.values()) for row in rows)
+
+        meta = cls.__meta__
+        object_class = meta.lc_object_class
+        plans = {}
+        instances = []
+        for keys, values in items:
+            plan = plans.get(keys)
+            if plan is None:
+                cls._check_keys(keys)
+                direct = meta.direct_fields
+                plan = plans[keys] = (
+                    [(attr_name, direct.get(attr_name)) for attr_name in keys],
+                    [(attr_name, direct.get(attr_name), value)
+                     for attr_name, value in meta.attributes_default.items() if attr_name not in keys],
+                )
+
+            instance = cls(object_class())
+            key_plan, default_plan = plan
+            for attr_name, field_name, value in default_plan:
+                instance._set_initial(attr_name, field_name, value() if callable(value) else value)
+            for (attr_name, field_name), value in zip(key_plan, values):
+                instance._set_initial(attr_name, field_name, value() if callable(value) else value)
+            instances.append(instance)
+
+        return instances
+
+    def _set_initial(self, attr_name, field_name, value):
+        if field_name is None or value is undefined:
+            setattr(self, attr_name, value)
+            return
+
+        if isinstance(value, (dict, list, tuple)):
+            value = utils.decode(field_name, value)
+        self._lc_obj._attributes[field_name] = value
+        self._lc_obj._changes[field_name] = Set(value)
 
     def commit(self, where=None, fetch_when_save=None):
         """
         保存这个对象到 LeanCloud。
 
-        使用 LeanCloud SDK 的 `save` 实现。
+        使用 LeanCloud SDK 的 `save` 实现。只发送被修改的字段，已保存过且没有修改的对象不会发出请求
+        （除非指定了 `fetch_when_save`），也不会触发回调。
 
         会触发 `pre_create` 回调。
 
@@ -131,26 +316,44 @@ class Model(object, metaclass=ModelMeta):
             if isinstance(where, Query):
                 where = where.leancloud_query
 
+        if not self._prune_changes() and not fetch_when_save:
+            return self
+
         self._do_life_cycle_hook('pre_create' if self.object_id is None else 'pre_update')
-        self._lc_obj.save(where, fetch_when_save)
+        self._prune_changes()
+        with instrument.operation('commit', type(self), where) as op:
+            self._lc_obj.save(where, fetch_when_save)
+            op.objects = 1
         return self
 
     @classmethod
-    def commit_all(cls, *models):
+    def commit_all(cls, *models, chunk_size=None, workers=None, executor=None):
         """
-        保存多个对象到 LeanCloud。所有传入的对象必须是同一个 Model 类的实例。
+        保存多个对象到 LeanCloud。
 
-        使用 LeanCloud SDK 的 `save_all` 实现。
+        对象会被切分成多个 `/batch` 请求（每个最多 `chunk_size` 个对象），由 `workers` 个线程并发发送。
+        单个对象或单个分块失败不会中断整个调用，每个对象的结果记录在返回的 `BatchResult` 中。
+        与 `commit` 一样只发送被修改的字段，没有修改的对象不会被发送，在结果中记为成功。
 
         保存会触发 `pre_create` 回调。
 
         :param models:
-        :return:
+        :param chunk_size: 每个批量请求包含的对象数，默认 `batch.DEFAULT_CHUNK_SIZE`
+        :param workers: 并发请求数，默认 `batch.DEFAULT_WORKERS`
+        :param executor: 在这个线程池中发送请求，不再创建新的线程池，调用线程也参与发送
+        :return: BatchResult
         """
-        for instance in models:
-            instance._do_life_cycle_hook('pre_create' if instance.object_id is None else 'pre_update')
-
-        leancloud.Object.extend(cls.__lc_cls__).save_all([instance._lc_obj for instance in models])
+        changed = [instance for instance in models if instance._prune_changes()]
+        cls._do_batch_life_cycle_hook('pre_create', [instance for instance in changed if instance.object_id is None])
+        cls._do_batch_life_cycle_hook('pre_update', [instance for instance in changed if instance.object_id is not None])
+        for instance in changed:
+            instance._prune_changes()
+
+        with instrument.operation('commit_all', cls) as op:
+            errors = dict(zip(map(id, changed), batch.save_all([instance._lc_obj for instance in changed],
+                                                               chunk_size, workers, executor)))
+            op.objects = len(changed)
+        return BatchResult(models, [errors.get(id(instance)) for instance in models])
 
     def drop(self):
         """
@@ -162,28 +365,118 @@ class Model(object, metaclass=ModelMeta):
         """
         self._do_life_cycle_hook('pre_delete')
 
-        self._lc_obj.destroy()
+        with instrument.operation('drop', type(self)) as op:
+            self._lc_obj.destroy()
+            op.objects = 1
         self._lc_obj = None
 
     @classmethod
-    def drop_all(cls, *models):
+    def drop_all(cls, *models, chunk_size=None, workers=None, executor=None):
         """
-        从 LeanCloud 删除多个对象，所有传入的对象必须是同一个 Model 的实例。
+        从 LeanCloud 删除多个对象。
 
-        删除使用 LeanCloud SDK 提供的 `destroy_all` 实现。
+        与 `commit_all` 一样分块并发发送，返回每个对象的结果。删除成功的对象进入不可用状态。
 
         删除会触发在 Model 类注册的 `pre_delete` 回调。
 
         :param models: 一个或多个 Model 类实例
-        :return: None
+        :param chunk_size: 每个批量请求包含的对象数，默认 `batch.DEFAULT_CHUNK_SIZE`
+        :param workers: 并发请求数，默认 `batch.DEFAULT_WORKERS`
+        :param executor: 参考 `commit_all`
+        :return: BatchResult
         """
-        for instance in models:
-            instance._do_life_cycle_hook('pre_delete')
+        cls._do_batch_life_cycle_hook('pre_delete', models)
 
-        leancloud.Object.extend(cls.__lc_cls__).destroy_all([instance._lc_obj for instance in models])
-        for model in models:
-            model._lc_obj = None
+        with instrument.operation('drop_all', cls) as op:
+            errors = batch.destroy_all([instance._lc_obj for instance in models], chunk_size, workers, executor)
+            op.objects = len(models)
+        for model, error in zip(models, errors):
+            if error is None:
+                model._lc_obj = None
+        return BatchResult(models, errors)
+
+    @classmethod
+    def bulk_import(cls, source, format=None, chunk_size=None, workers=None, retries=importer.DEFAULT_RETRIES,
+                    progress=None, checkpoint=None):
+        """
+        从 JSON Lines 或 CSV 文件流式导入数据。
+
+        逐行读取并用 `create` 校验、创建实例，攒够 `chunk_size` 个对象就作为一个 `/batch` 请求交给 `workers` 个线程发送，
+        同时在途的分块最多 `workers * 2` 个，内存占用与文件大小无关。分块中失败的对象按指数退避重试 `retries` 次。
+        输入格式与 `Query.export` 的输出一致，`object_id`、`created_at`、`updated_at` 列会被忽略。
+
+        传入 `checkpoint` 文件路径时，每完成一个分块就记录已处理的行数；中断后以同一文件再次调用会跳过已处理的行，
+        全部完成后删除断点文件。中断时仍在发送的分块可能已经保存，续传时会被再次导入。
+
+        :param source: 文件路径、已打开的文本文件或字典的可迭代对象
+        :param format: jsonl 或 csv，默认按扩展名判断，文件对象默认为 jsonl
+        :param chunk_size: 每个批量请求包含的对象数，默认 `batch.DEFAULT_CHUNK_SIZE`
+        :param workers: 并发请求数，默认 `batch.DEFAULT_WORKERS`
+        :param retries: 失败对象的重试次数
+        :param progress: 每完成一个分块时以 `ImportResult` 调用
+        :param checkpoint: 断点文件路径
+        :return: importer.ImportResult
+        """
+        return importer.bulk_import(cls, source, format, chunk_size, workers, retries, progress, checkpoint)
 
     @classmethod
     def query(cls):
         return Query(cls)
+
+    @classmethod
+    def resolve_refs(cls, instances, *fields):
+        """
+        批量加载多个实例引用的对象，避免逐个访问 `RefField` 时每次都发出请求。
+
+        例子： ::
+
+            boys = Person.query().find()
+            Person.resolve_refs(boys, Person.sweet_heart)
+
+        :param instances: Model 实例列表
+        :param fields: RefField 或其属性名
+        :return: instances
+        """
+        for field in cls._ref_fields(*fields):
+            field.resolve(instances)
+        return instances
+
+    @classmethod
+    def _ref_fields(cls, *fields):
+        from leancloud_better_storage.storage.fields import RefField
+
+        resolved = []
+        for field in fields:
+            if isinstance(field, str):
+                if field not in cls.__fields__:
+                    raise KeyError('Unknown field {}'.format(field))
+                field = cls.__fields__[field]
+            if not isinstance(field, RefField):
+                raise ValueError('Unexpected argument {}, only RefField can be resolved.'.format(repr(field)))
+            resolved.append(field)
+        return resolved
+
+    @classmethod
+    def async_query(cls):
+        """ 返回 asyncio 版本的查询对象，参考 `leancloud_better_storage.storage.aio.AsyncQuery`。 """
+        return AsyncQuery(cls)
+
+    async def commit_async(self, where=None, fetch_when_save=None):
+        """ `commit` 的 asyncio 版本，请求在共享线程池中执行，不阻塞事件循环。 """
+        return await run_in_executor(self.commit, where, fetch_when_save)
+
+    @classmethod
+    async def commit_all_async(cls, *models, chunk_size=None, workers=None):
+        """ `commit_all` 的 asyncio 版本，分块直接在共享线程池中发送，不再嵌套新的线程池。 """
+        return await run_in_executor(cls.commit_all, *models, chunk_size=chunk_size, workers=workers,
+                                     executor=get_executor())
+
+    async def drop_async(self):
+        """ `drop` 的 asyncio 版本。 """
+        return await run_in_executor(self.drop)
+
+    @classmethod
+    async def drop_all_async(cls, *models, chunk_size=None, workers=None):
+        """ `drop_all` 的 asyncio 版本，分块直接在共享线程池中发送。 """
+        return await run_in_executor(cls.drop_all, *models, chunk_size=chunk_size, workers=workers,
+                                     executor=get_executor())
@@ -1,9 +1,9 @@
-import leancloud
-
+from leancloud_better_storage.storage import instrument
 from leancloud_better_storage.storage._util import cache_result
 
 
 class ObjectId:
+    __slots__ = ('_model_cls', '_id', '_leancloud_object')
 
     def __init__(self, object_id, model_cls):
         self._model_cls = model_cls
@@ -16,10 +16,15 @@ class ObjectId:
     @property
     @cache_result('self._leancloud_object')
     def lc_object(self):
-        return leancloud.Object.create_without_data(self.id)
+        return self._model_cls.__meta__.lc_object_class.create_without_data(self.id)
 
     def fetch(self):
-        return self._model_cls(self.lc_object.fetch())
+        """ 取回这个对象，返回 Model 实例。 """
+        lc_object = self._model_cls.__meta__.lc_object_class.create_without_data(self.id)
+        with instrument.operation('fetch', self._model_cls) as op:
+            lc_object.fetch()  # fills lc_object in place and returns None
+            op.objects = 1
+        return self._model_cls(lc_object)
 
     def __eq__(self, other):
         assert isinstance(other, ObjectId)
@@ -7,6 +7,7 @@ class ResultElementOrder(Enum):
 
 
 class OrderBy:
+    __slots__ = ('_order', '_field')
 
     def __init__(self, order, field):
         self._order = order
@@ -1,10 +1,40 @@
-from copy import deepcopy
+import base64
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import leancloud
+from leancloud import client, utils
+
+from leancloud_better_storage.storage._util import TTLCache
+
+COUNT_CACHE_TTL = 0  # disabled by default, counts would be stale after writes
+PREFETCH_WORKERS = 8
+
+count_cache = TTLCache(COUNT_CACHE_TTL)
+"""
+`Query.count` 结果的共享缓存，以 (应用, 数据集, 序列化后的 where 条件) 为键。
+默认不缓存，可以通过 `count_cache.ttl` 设置过期时间来启用；缓存不会因写入而失效，写入数据后可调用 `count_cache.clear()`。
+"""
+
+_executor = None
+_executor_lock = Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS)
+        return _executor
 
 
 class Pages(object):
     """ pages iterator """
+    __slots__ = ('_query', '_page', '_size', '_prefetch', '_pending', '_content_cache', '_total')
 
-    def __init__(self, query, page, size):
+    def __init__(self, query, page, size, prefetch=0):
         """
         constructor of Pages class
 
@@ -14,10 +44,14 @@ class Pages(object):
         :type page: int
         :param size: elements size per page
         :type size: int
+        :param prefetch: pages read ahead concurrently when iterating, 0 to disable.
+        :type prefetch: int
         """
-        self._query = deepcopy(query)
+        self._query = query._snapshot()
         self._page = page
         self._size = size
+        self._prefetch = prefetch
+        self._pending = {}
         self._content_cache = []
         self._total = None
 
@@ -26,19 +60,45 @@ class Pages(object):
         """ get element offset. """
         return (self._page - 1) * self._size
 
+    def _fetch(self, page):
+        return self._query.find((page - 1) * self._size, self._size)
+
     @property
     def items(self):
         """ get all element of current page. """
         if len(self._content_cache) == 0:
-            self._content_cache = self._query.find(self.element_offset, self._size)
+            future = self._pending.pop(self._page, None)
+            if future is not None:
+                self._content_cache = future.result()
+            else:
+                self._content_cache = self._fetch(self._page)
         return self._content_cache
 
     @property
     def total_pages(self):
+        """ total page count, the count is shared through `count_cache` when it is enabled. """
         if self._total is None:
-            self._total = self._query.count() / self._size
+            lc_query = self._query.leancloud_query
+            key = (client.APP_ID, lc_query._query_class._class_name,
+                   json.dumps(lc_query.dump()['where'], sort_keys=True, separators=(',', ':')))
+            count = count_cache.get(key)
+            if count is None:
+                count = self._query.count()
+                count_cache.set(key, count)
+            self._total = int(math.ceil(count / self._size))
         return self._total
 
+    def _read_ahead(self):
+        executor = _get_executor()
+        for page in range(max(self._page, 1), self._page + self._prefetch + 1):
+            if page not in self._pending:
+                self._pending[page] = executor.submit(self._fetch, page)
+
+    def _cancel_pending(self):
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+
     def __iter__(self):
         """ get iterator """
         return self
@@ -48,6 +108,119 @@ class Pages(object):
         self._page += 1
         self._content_cache = []
 
+        if self._prefetch:
+            self._read_ahead()
+
+        if len(self.items) == 0:
+            self._cancel_pending()
+            raise StopIteration()
+
+        return self
+
+
+def encode_token(values, object_id):
+    """ 把最后一个对象的排序字段值与 objectId 编码为不透明的续页令牌。 """
+    payload = json.dumps([values, object_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_token(token):
+    try:
+        values, object_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid continuation token {}.'.format(repr(token)))
+    return values, object_id
+
+
+class KeysetPages(Pages):
+    """
+    keyset（seek）分页。
+
+    按查询的 `order_by` 字段加上 objectId 排序，下一页以“排在上一页最后一个对象之后”为条件查询，
+    不使用 skip，因此翻到第 N 页的开销与第 1 页相同。
+
+    每一页的 `next_token` 是不透明的续页令牌，可以交给客户端，之后用 `Query.paginate(..., keyset=True, token=token)`
+    从该位置继续。
+
+    keyset 分页只能顺序翻页，`page` 仅作为页码计数；排序字段不应包含空值。
+    """
+    __slots__ = ('_token', '_order')
+
+    def __init__(self, query, page, size, token=None):
+        super().__init__(query, page, size)
+        self._token = token
+        self._order = list(self._query.leancloud_query._order)
+        if 'objectId' not in self._order and '-objectId' not in self._order:
+            self._order.append('objectId')
+
+    @property
+    def token(self):
+        """ 当前页的起始令牌，None 表示从头开始。 """
+        return self._token
+
+    @property
+    def next_token(self):
+        """ 当前页之后的续页令牌，当前页为空时为 None。 """
+        if not self.items:
+            return None
+
+        last = self.items[-1].lc_object
+        values = [utils.encode(self._value_of(last, key.lstrip('-'))) for key in self._order]
+        return encode_token(values, last.id)
+
+    @staticmethod
+    def _value_of(lc_object, key):
+        if key == 'objectId':
+            return lc_object.id
+        return lc_object.get(key)
+
+    def _seek_query(self):
+        base = self._query.leancloud_query
+        class_name = base._query_class._class_name
+
+        query = leancloud.Query(class_name)
+        query._where = base._where
+        if self._token is not None:
+            values, _ = decode_token(self._token)
+            branches = []
+            for i, key in enumerate(self._order):
+                branch = leancloud.Query(class_name)
+                for prev_key, prev_value in zip(self._order[:i], values[:i]):
+                    branch.equal_to(prev_key.lstrip('-'), prev_value)
+                if key.startswith('-'):
+                    branch.less_than(key[1:], values[i])
+                else:
+                    branch.greater_than(key, values[i])
+                branches.append(branch)
+
+            seek = branches[0] if len(branches) == 1 else leancloud.Query.or_(*branches)
+            query = leancloud.Query.and_(query, seek)
+
+        query._include = list(base._include)
+        query._select = list(base._select)
+        if query._select:  # values of order keys are needed for the next token
+            query._select += [key.lstrip('-') for key in self._order if key.lstrip('-') not in query._select]
+        query._order = list(self._order)
+        query.limit(self._size)
+        return query
+
+    @property
+    def items(self):
+        """ get all element of current page. """
+        if len(self._content_cache) == 0:
+            self._content_cache = self._query._find(self._seek_query())
+        return self._content_cache
+
+    def __next__(self):
+        """ go next page """
+        if self._page >= 1:
+            if len(self.items) < self._size:  # last page
+                raise StopIteration()
+            self._token = self.next_token
+
+        self._page += 1
+        self._content_cache = []
+
         if len(self.items) == 0:
             raise StopIteration()
 
@@ -0,0 +1,227 @@
+import functools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from leancloud import client
+from requests.exceptions import ConnectionError, ConnectTimeout, Timeout
+
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.2
+DEFAULT_MAX_BACKOFF = 10.0
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+_IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'PUT', 'DELETE'))
+
+
+class TokenBucket(object):
+    """
+    令牌桶限流器，线程安全。
+
+    每秒补充 `rate` 个令牌，最多积累 `burst` 个。令牌不足时预支令牌并等待到可用的时刻，
+    并发的调用者因此按到达顺序依次放行，不会同时醒来。
+
+    :param rate: tokens per second
+    :param burst: bucket capacity, default `max(1, rate)`
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError('rate should be positive.')
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        取得一个令牌，必要时阻塞。
+
+        :return: seconds waited
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate) - 1
+            self._updated = now
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After', 0))
+    except ValueError:
+        return 0.0
+
+
+class RequestPolicy(object):
+    """
+    对 leancloud SDK 发出的每个请求应用重试、退避和限流。
+
+    安装后包装 `leancloud.client.session` 的 `send`，`Query.find`、`Model.commit`、`commit_all` 等所有存储请求都会经过它：
+
+    - 遇到 429、5xx 或超时，按带随机抖动的指数退避重试，最多 `retries` 次；429 响应带有 `Retry-After` 时至少等待这么久。
+      POST 请求（创建对象和 `/batch`）不是幂等的，默认只在 429 和连接超时时重试，`retry_post=True` 时与其他请求相同；
+    - 按应用（`rate`，或 `limit_app`）和按数据集（`limit`）的令牌桶限流，`/batch` 请求从其中每个数据集的桶各取一个令牌。
+
+    `stats` 是一个 `Counter`，记录 `requests`、`retries`（及按原因的 `retry_429`、`retry_5xx`、`retry_timeout`、
+    `retry_connection`）、`gave_up`（重试用尽或不能重试）、`throttled`（被限流的请求数）和 `throttle_seconds`（限流等待的总秒数）。
+
+    例子： ::
+
+        policy = RequestPolicy(retries=5, rate=30).install()
+        policy.limit(Person, 10)
+        ...
+        print(policy.stats)
+
+    :param retries: 最多重试次数
+    :param backoff: 第一次重试前的最长等待秒数，之后每次加倍
+    :param max_backoff: 单次等待的上限
+    :param rate: 每个应用每秒的请求数上限，None 表示不限制
+    :param burst: 应用令牌桶的容量
+    :param retry_post: 是否在 5xx 和读超时时也重试 POST 请求
+    """
+
+    def __init__(self, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF, rate=None,
+                 burst=None, retry_post=False):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_post = retry_post
+        self.stats = Counter()
+        self._rate = (rate, burst) if rate else None
+        self._app_buckets = {}
+        self._class_buckets = {}
+        self._lock = threading.Lock()
+        self._saved = None
+
+    # -- configuration --------------------------------------------------
+
+    def limit(self, model, rate, burst=None):
+        """
+        限制某个数据集每秒的请求数，与应用的限制同时生效。
+
+        :param model: Model 类或 LeanCloud 数据集名
+        """
+        class_name = model if isinstance(model, str) else model.__lc_cls__
+        self._class_buckets[class_name] = TokenBucket(rate, burst)
+        return self
+
+    def limit_app(self, app_id, rate, burst=None):
+        """ 为指定应用设置与默认 `rate` 不同的限制。 """
+        self._app_buckets[app_id] = TokenBucket(rate, burst)
+        return self
+
+    # -- installation ---------------------------------------------------
+
+    def install(self):
+        """ 挂载到 leancloud SDK 的 HTTP 会话上。 """
+        if self._saved is not None:
+            return self
+
+        self._saved = (client.session.__dict__.get('send'),)
+        client.session.send = functools.partial(self._send, client.session.send)
+        return self
+
+    def uninstall(self):
+        """ 恢复 leancloud SDK 原本的 HTTP 会话。 """
+        if self._saved is None:
+            return
+
+        send, = self._saved
+        if send is None:
+            del client.session.send
+        else:
+            client.session.send = send
+        self._saved = None
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.uninstall()
+
+    # -- request handling -----------------------------------------------
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self.stats[key] += value
+
+    def _app_bucket(self, request):
+        app_id = request.headers.get('X-LC-Id')
+        bucket = self._app_buckets.get(app_id)
+        if bucket is None and self._rate is not None:
+            with self._lock:
+                bucket = self._app_buckets.get(app_id)
+                if bucket is None:
+                    bucket = self._app_buckets[app_id] = TokenBucket(*self._rate)
+        return bucket
+
+    @staticmethod
+    def _class_names(request):
+        path = urlsplit(request.url).path
+        if path.endswith('/batch') and request.body:
+            paths = [sub['path'] for sub in json.loads(request.body).get('requests', ())]
+        else:
+            paths = [path]
+
+        names = set()
+        for path in paths:
+            parts = [part for part in path.split('?')[0].split('/') if part]
+            if 'classes' in parts[:-1]:
+                names.add(parts[parts.index('classes') + 1])
+        return names
+
+    def _buckets(self, request):
+        buckets = []
+        app_bucket = self._app_bucket(request)
+        if app_bucket is not None:
+            buckets.append(app_bucket)
+        if self._class_buckets:
+            buckets.extend(self._class_buckets[name] for name in sorted(self._class_names(request))
+                           if name in self._class_buckets)
+        return buckets
+
+    def _delay(self, attempt):
+        """ full jitter: 在 [0, min(max_backoff, backoff * 2^attempt)] 中随机取值，避免重试的请求同时到达。 """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _send(self, send, request, **kwargs):
+        buckets = self._buckets(request)
+        idempotent = self.retry_post or request.method in _IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            waited = sum(bucket.acquire() for bucket in buckets)
+            if waited:
+                self._count('throttled')
+                self._count('throttle_seconds', waited)
+            self._count('requests')
+
+            try:
+                response = send(request, **kwargs)
+            except (Timeout, ConnectionError) as exc:
+                reason = 'timeout' if isinstance(exc, Timeout) else 'connection'
+                if attempt >= self.retries or not (idempotent or isinstance(exc, ConnectTimeout)):
+                    self._count('gave_up')
+                    raise
+                delay = self._delay(attempt)
+            else:
+                status = response.status_code
+                if status not in RETRY_STATUSES:
+                    return response
+                if attempt >= self.retries or not (idempotent or status == 429):
+                    self._count('gave_up')
+                    return response
+                reason = '429' if status == 429 else '5xx'
+                delay = max(self._delay(attempt), _retry_after(response))
+                response.close()
+
+            self._count('retries')
+            self._count('retry_' + reason)
+            attempt += 1
+            time.sleep(delay)
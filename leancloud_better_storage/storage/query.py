@@ -2,11 +2,16 @@ from copy import copy, deepcopy
 from enum import Enum
 
 import leancloud
+from leancloud import client, utils
 
+from leancloud_better_storage.storage import batch, instrument
 from leancloud_better_storage.storage.cursor import Cursor
 from leancloud_better_storage.storage.err import LeanCloudErrorCode
 from leancloud_better_storage.storage.order import ResultElementOrder
-from leancloud_better_storage.storage.pages import Pages
+from leancloud_better_storage.storage.pages import KeysetPages, Pages
+
+
+_METADATA_KEYS = frozenset(('objectId', 'createdAt', 'updatedAt'))
 
 
 class ConditionOperator(Enum):
@@ -24,7 +29,115 @@ class ConditionOperator(Enum):
     WithinKilometers = 'within_kilometers'  # query.within_kilometers
 
 
+class Param(object):
+    """
+    预编译查询的参数占位符，用在条件的右侧，执行前由 `PreparedQuery.bind` 代入值。 ::
+
+        Person.query().filter(Person.age >= Param('age'))
+
+    :param name: 参数名
+    """
+    __slots__ = ('name', '_convert')
+
+    def __init__(self, name, convert=None):
+        self.name = name
+        self._convert = convert
+
+    def _fit(self, fit_fn):
+        """ 由会转换条件值的字段（如 `RefField`、`GeoPointField`）调用，代入值时先按字段的规则转换。 """
+        return Param(self.name, lambda value: fit_fn[type(value)](value))
+
+    def __repr__(self):
+        return 'Param({!r})'.format(self.name)
+
+
+class _Slot(object):
+    """ where 模板中参数所在的位置，`convert` 把参数值转换为 where 中的值。 """
+    __slots__ = ('name', 'convert')
+
+    def __init__(self, name, convert):
+        self.name = name
+        self.convert = convert
+
+
+_PLAIN_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+def _encode(value):
+    """ `utils.encode` with a fast path for plain JSON values. """
+    return value if type(value) in _PLAIN_TYPES else utils.encode(value)
+
+
+def _has_param(value):
+    """ 条件值中是否有 `Param`，包括 `in_` 等条件的 list/tuple 中的元素。 """
+    if isinstance(value, Param):
+        return True
+    return isinstance(value, (list, tuple)) and any(_has_param(item) for item in value)
+
+
+def _slot(param, convert=_encode):
+    if not isinstance(param, Param):
+        if isinstance(param, (list, tuple)) and _has_param(param):
+            return [_slot(item, convert) for item in param]
+        return convert(param)
+    if param._convert is None:
+        return _Slot(param.name, convert)
+    fit = param._convert
+    return _Slot(param.name, lambda value: convert(fit(value)))
+
+
+def _as_regex(value):
+    if not isinstance(value, str):
+        raise TypeError('matched only accept str or unicode')
+    return value
+
+
+def _as_prefix(value):
+    return '^' + (value if isinstance(value, str) else value.decode('utf-8'))
+
+
+def _compile(node):
+    """
+    把 where 模板编译为函数，以参数值为参数，返回新的 where。
+    容器总是重新创建，以免修改绑定后的查询时影响模板。
+    """
+    if isinstance(node, dict):
+        items = [(key, _compile(value)) for key, value in node.items()]
+        return lambda params: {key: build(params) for key, build in items}
+    if isinstance(node, list):
+        builds = [_compile(value) for value in node]
+        return lambda params: [build(params) for build in builds]
+    if isinstance(node, _Slot):
+        name, convert = node.name, node.convert
+        return lambda params: convert(params[name])
+    return lambda params: node
+
+
+def _clone(obj):
+    """ 比 `copy.copy` 快的浅复制 """
+    clone = object.__new__(type(obj))
+    clone.__dict__.update(obj.__dict__)
+    return clone
+
+
+def _collect_params(value, names):
+    if isinstance(value, Param):
+        names.add(value.name)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _collect_params(item, names)
+
+
+def _param_names(conditions):
+    names = set()
+    for cond in conditions:
+        _collect_params(cond.operand_right, names)
+    return names
+
+
 class Condition(object):
+    __slots__ = ('_operand_left', '_operand_right', '_operator')
+
     operator_mapping = {
         ConditionOperator.Equal: lambda q, l, r: q.equal_to(l, r),
         ConditionOperator.GreaterThan: lambda q, l, r: q.greater_than(l, r),
@@ -40,6 +153,20 @@ class Condition(object):
         ConditionOperator.WithinKilometers: lambda q, l, r: q.within_kilometers(l, *r),
     }
 
+    # operator -> (where key, value conversion), for conditions with `Param` operand
+    param_mapping = {
+        ConditionOperator.NotEqual: ('$ne', _encode),
+        ConditionOperator.GreaterThan: ('$gt', _encode),
+        ConditionOperator.GreaterThanOrEqualTo: ('$gte', _encode),
+        ConditionOperator.LessThan: ('$lt', _encode),
+        ConditionOperator.LessThanOrEqualTo: ('$lte', _encode),
+        ConditionOperator.ContainedIn: ('$in', _encode),
+        ConditionOperator.Contains: ('$regex', _as_regex),
+        ConditionOperator.Regex: ('$regex', _as_regex),
+        ConditionOperator.StartsWith: ('$regex', _as_prefix),
+        ConditionOperator.Near: ('$nearSphere', _encode),
+    }
+
     def __init__(self, operand_left, operator, operand_right):
         self._operand_left = operand_left
         self._operand_right = operand_right
@@ -58,14 +185,77 @@ class Condition(object):
         return self._operator
 
     def apply(self, query):
+        if _has_param(self._operand_right):
+            return self._apply_param(query)
         self.operator_mapping[self.operator](query, self.operand_left.field_name, self.operand_right)
         return query
 
+    def _apply_param(self, query):
+        """ 与 `operator_mapping` 生成相同的 where，参数值的位置放置 `_Slot`。 """
+        key = self.operand_left.field_name
+        if self._operator is ConditionOperator.Equal:
+            query._where[key] = _slot(self._operand_right)
+        elif self._operator is ConditionOperator.WithinKilometers:
+            point, kilometers = self._operand_right
+            query._add_condition(key, '$nearSphere', _slot(point))
+            query._add_condition(key, '$maxDistance', _slot(kilometers, lambda value: value / 6371.0))
+        else:
+            condition, convert = self.param_mapping[self._operator]
+            query._add_condition(key, condition, _slot(self._operand_right, convert))
+        return query
+
 
 class QueryLogicalError(Exception):
     pass
 
 
+class PreparedQuery(object):
+    """
+    预编译的查询，由 `Query.prepare` 创建。
+
+    条件只在预编译时构造一次，成为带有占位符的 where 模板；`bind` 只代入参数值，
+    不再构造 `leancloud.Query`、检查字段名或连接条件。线程安全，可以在多个线程中同时 `bind`。 ::
+
+        by_age = Person.query().filter(Person.age >= Param('min_age')).filter_by(city=Param('city')).prepare()
+        people = by_age.bind(min_age=18, city='Shanghai').find()
+    """
+    __slots__ = ('_query', '_build_where', '_params')
+
+    def __init__(self, query):
+        self._query = query._snapshot()
+        self._build_where = _compile(query._query._where)
+        self._params = query._params
+
+    @property
+    def params(self):
+        """ 参数名 """
+        return self._params
+
+    def bind(self, **params):
+        """
+        代入参数值。
+
+        :param params: 参数名与值，必须与查询中的参数一一对应
+        :return: 可以执行的 Query，对它的修改不会影响预编译的查询
+        """
+        if params.keys() != self._params:
+            missing, unknown = self._params - params.keys(), params.keys() - self._params
+            raise KeyError('Missing params {0}'.format(missing) if missing else 'Unknown params {0}'.format(unknown))
+
+        query = _clone(self._query)
+        q = query._query = _clone(self._query._query)
+        q._where = self._build_where(params)
+        q._include = list(q._include)
+        q._order = list(q._order)
+        q._select = list(q._select)
+        q._extra = dict(q._extra)
+        query._params = frozenset()
+        return query
+
+    def __repr__(self):
+        return '<PreparedQuery {} params={}>'.format(self._query._model.__name__, sorted(self._params))
+
+
 class Query(object):
     """ query class """
 
@@ -80,6 +270,10 @@ class Query(object):
         self._state = kwargs.get('_state', self.State.BEGIN)
         self._query = leancloud.Query(self._model.__lc_cls__)
         self._last_logical_op = None
+        self._refs = ()
+        self._session = None
+        self._unloaded = None  # field names not selected by only/defer
+        self._params = frozenset()  # names of unbound `Param`
 
     def _merge_conditions(self, *conditions):
         if len(conditions) >= 2:
@@ -96,12 +290,25 @@ class Query(object):
         else:
             return leancloud.Query.or_
 
+    def _combine(self, query):
+        """ 用当前的逻辑运算连接条件，保留 include、keys、order、skip、limit 等设置。 """
+        combined = self._logical_fn(self._query, query)
+        for attr in ('_include', '_select', '_order'):
+            setattr(combined, attr, list(getattr(self._query, attr)))
+        combined._extra = dict(self._query._extra)
+        combined._skip = self._query._skip
+        combined._limit = self._query._limit
+        return combined
+
     def filter(self, *conditions):
         """ select data with custom conditions. """
         self._state = self.State.COND
         query = self._merge_conditions(*conditions)
-        self._query = self._logical_fn(self._query, query)
+        self._query = self._combine(query)
         self._last_logical_op = None
+        names = _param_names(conditions)
+        if names:
+            self._params = self._params | names
 
         return self
 
@@ -116,8 +323,11 @@ class Query(object):
             raise KeyError('Unknown fields {0}'.format(input_key_set - fields_key_set))
 
         conditions = [self._model.__fields__[key] == val for key, val in kwargs.items()]
-        self._query = self._logical_fn(self._query, self._merge_conditions(*conditions))
+        self._query = self._combine(self._merge_conditions(*conditions))
         self._last_logical_op = None
+        names = _param_names(conditions)
+        if names:
+            self._params = self._params | names
 
         return self
 
@@ -146,6 +356,72 @@ class Query(object):
             self._query.include(*(field.field_name for field in args))
         return self
 
+    def _field_names(self, fields, fn_name):
+        from leancloud_better_storage.storage.fields import Field
+        for field in fields:
+            if not isinstance(field, Field):
+                raise ValueError('Unexpected argument {}, '.format(repr(field)) +
+                                 '{}(...) only take Field instance as argument.'.format(fn_name))
+        return {field.field_name for field in fields}
+
+    def _project(self, selected):
+        all_names = {field.field_name for field in self._model.__fields__.values()} - _METADATA_KEYS
+        self._query._select = sorted(selected)
+        self._unloaded = frozenset(all_names - selected)
+        return self
+
+    def only(self, *fields):
+        """
+        只取回指定的字段，对应 LeanCloud 查询的 `keys` 参数。再次调用会替换之前的选择。
+
+        objectId、createdAt、updatedAt 总是会被取回。访问没有取回的字段时，会发出一次请求补齐这个实例所有未取回的字段。
+        对 `find`、`first`、`scan` 和 `paginate` 都有效。
+
+        例子： ::
+
+            for person in Person.query().only(Person.name).scan():
+                print(person.name)
+
+        :param fields: Field instances
+        """
+        return self._project(self._field_names(fields, 'only') - _METADATA_KEYS)
+
+    def defer(self, *fields):
+        """
+        不取回指定的字段，其他字段的行为与 `only` 相同。
+
+        :param fields: Field instances
+        """
+        deferred = self._field_names(fields, 'defer')
+        all_names = {field.field_name for field in self._model.__fields__.values()} - _METADATA_KEYS
+        return self._project(all_names - deferred)
+
+    def prefetch(self, *args):
+        """
+        查询后批量加载指定 `RefField` 引用的对象。
+
+        与 `includes` 由服务端展开不同，每个被引用的数据集只额外发出一次（按批分块的）`contained_in` 查询，
+        对 `find`、`first`、`scan` 和 `paginate` 都有效。参考 `Model.resolve_refs`。
+
+        :param args: RefField instances
+        """
+        self._refs = self._refs + tuple(self._model._ref_fields(*args))
+        return self
+
+    def _instance(self, lc_object):
+        instance = self._model(lc_object)
+        if self._unloaded:
+            instance._unloaded = self._unloaded
+        if self._session is not None:
+            instance = self._session.merge(instance)
+        return instance
+
+    def _resolve_refs(self, instances):
+        for field in self._refs:
+            with instrument.operation('resolve_refs', field.ref_cls):
+                field.resolve(instances)
+        return instances
+
     def skip(self, n):
         self._query.skip(n)
         return self
@@ -171,7 +447,48 @@ class Query(object):
     def leancloud_query(self):
         return self._query
 
-    def find(self, skip=None, limit=None):
+    def prepare(self):
+        """
+        预编译查询，条件中可以用 `Param` 作为参数的占位符。
+
+        同一形状的查询需要大量执行时，预编译一次，之后每次只需 `bind` 代入参数值，
+        省去每次调用 `filter`、`filter_by` 构造和连接 `leancloud.Query` 的开销。
+        include、keys、order、skip、limit 等设置也会被保留。 ::
+
+            query = Person.query().filter_by(name=Param('name')).order_by(Person.age.desc).prepare()
+            query.bind(name='Reimu').find()
+
+        :return: PreparedQuery
+        """
+        return PreparedQuery(self)
+
+    def _check_bound(self):
+        if self._params:
+            raise QueryLogicalError('Query has unbound params {0}, use prepare().bind(...) to execute it.'.format(
+                set(self._params)))
+
+    def _snapshot(self):
+        """ 廉价的查询快照，之后对本查询的修改不会影响快照。 """
+        snapshot = copy(self)
+        q = copy(self._query)
+        q._where = dict(q._where)
+        q._include = list(q._include)
+        q._order = list(q._order)
+        q._select = list(q._select)
+        q._extra = dict(q._extra)
+        snapshot._query = q
+        return snapshot
+
+    def find(self, skip=None, limit=None, raw=False):
+        """
+        执行查询。
+
+        :param skip: 跳过的记录数
+        :param limit: 最多返回的记录数
+        :param raw: 为 True 时返回只读的 `Record`，不创建 `leancloud.Object` 和 Model 实例
+        :return: tuple of Model instances or records
+        """
+        self._check_bound()
         # don't change the origin query object
         q = copy(self._query)
 
@@ -180,31 +497,210 @@ class Query(object):
         if limit:
             q.limit(limit)
 
+        if raw:
+            return tuple(map(self._model.__meta__.record_class, self._find_raw(q)))
+        return self._find(q)
+
+    def _find_raw(self, q):
+        """ 单次查询，返回原始 JSON 数据。 """
         try:
-            return tuple(map(self._model, q.find()))
+            with instrument.operation('find', self._model, q) as op:
+                results = client.get('/classes/{}'.format(q._query_class._class_name), q.dump()).json()['results']
+                op.objects = len(results)
+            return results
         except leancloud.LeanCloudError as exc:
             if exc.code == LeanCloudErrorCode.ClassOrObjectNotExists.value:
                 return []
             raise
 
-    def scan(self, batch_size=None, scan_key=None):
-        return Cursor(self._query.scan(batch_size, scan_key), self._model)
+    def iter_records(self, batch_size=None, scan_key=None):
+        """
+        以只读 `Record` 的形式遍历所有符合条件的对象，参数与 `scan` 相同。
+
+        :return: generator of records
+        """
+        return map(self._model.__meta__.record_class, self._scan_raw(self._scan_params(batch_size, scan_key)))
+
+    def export(self, target, format='jsonl', batch_size=None, prefetch=2):
+        """
+        把所有符合条件的对象流式导出到文件。
+
+        按批遍历 scan 接口，后台线程预取之后的批次，与写入重叠；内存中最多只有 `prefetch + 1` 批结果。
+        每列的编码由字段类型决定，参考 `export` 模块。
+
+        :param target: 文件路径，或已打开的文件对象（jsonl、csv 为文本流，parquet 为二进制流）
+        :param format: jsonl、csv 或 parquet，parquet 需要安装 pyarrow
+        :param batch_size: 每次请求取回的对象数，默认 1000
+        :param prefetch: 后台预取的批数
+        :return: 导出的行数
+        """
+        from leancloud_better_storage.storage import export  # fields module imports query
+        return export.export(self, target, format, batch_size, prefetch)
+
+    def to_columns(self, chunk_size=None, prefetch=0):
+        """
+        以按列的 numpy 数组取回所有符合条件的对象，不创建 `leancloud.Object` 和模型实例。
+
+        列与 `export` 相同，以属性名为键，数组类型由字段类型决定，参考 `columnar.arrays`。
+        设置了 `limit` 或 `skip` 时只发出一次查询，否则使用 scan 接口遍历所有结果。需要安装 numpy。
+
+        :param chunk_size: 指定时返回生成器，通过 scan 每次取回 `chunk_size` 个对象并生成一组列
+        :param prefetch: 后台预取的批数，参考 `Cursor`
+        :return: OrderedDict of numpy arrays, or generator of them
+        """
+        from leancloud_better_storage.storage import columnar
+        return columnar.to_columns(self, chunk_size, prefetch)
+
+    def to_dataframe(self, chunk_size=None, prefetch=0):
+        """
+        以 `pandas.DataFrame` 取回所有符合条件的对象，参数与 `to_columns` 相同。需要安装 pandas。
+
+        :return: DataFrame, or generator of DataFrames when chunk_size is given
+        """
+        from leancloud_better_storage.storage import columnar
+        return columnar.to_dataframe(self, chunk_size, prefetch)
+
+    def _scan_params(self, batch_size=None, scan_key=None):
+        self._check_bound()
+        params = self._query.dump()
+        if 'skip' in params or 'limit' in params:
+            raise leancloud.LeanCloudError(1, 'scan dose not support skip or limit option')
+        if batch_size is not None:
+            params['limit'] = batch_size
+        if scan_key is not None:
+            params['scan_key'] = scan_key
+        return params
+
+    def _scan_raw(self, params):
+        """ 遍历 scan 接口返回的原始 JSON 数据。 """
+        path = '/scan/classes/{}'.format(self._query._query_class._class_name)
+        while True:
+            with instrument.operation('scan', self._model, self._query) as op:
+                content = client.get(path, params).json()
+                op.objects = len(content['results'])
+            yield from content['results']
+
+            if not content.get('cursor'):
+                break
+            params['cursor'] = content['cursor']
+
+    def _find(self, q):
+        try:
+            with instrument.operation('find', self._model, q) as op:
+                instances = tuple(map(self._instance, q.find()))
+                op.objects = len(instances)
+            return self._resolve_refs(instances)
+        except leancloud.LeanCloudError as exc:
+            if exc.code == LeanCloudErrorCode.ClassOrObjectNotExists.value:
+                return []
+            raise
+
+    def scan(self, batch_size=None, scan_key=None, prefetch=0):
+        """
+        遍历所有符合条件的对象。
+
+        :param batch_size: 每次请求取回的对象数
+        :param scan_key: 遍历所依据的字段，默认为 objectId
+        :param prefetch: 后台预取的批数，0 表示不预取，参考 `Cursor`
+        :return: Cursor
+        """
+        self._check_bound()
+        return Cursor(self._query.scan(batch_size, scan_key), self._instance, prefetch, batch_size, self._refs, self)
 
     def first(self):
+        self._check_bound()
         try:
-            return self._model(self._query.first())
+            with instrument.operation('first', self._model, self._query) as op:
+                instance = self._instance(self._query.first())
+                op.objects = 1
+            self._resolve_refs((instance,))
+            return instance
         except leancloud.LeanCloudError as exc:
             if exc.code == LeanCloudErrorCode.ClassOrObjectNotExists.ClassOrObjectNotExists.value:
                 return None
             raise
 
     def count(self):
+        self._check_bound()
         try:
-            return self._query.count()
+            with instrument.operation('count', self._model, self._query):
+                return self._query.count()
         except leancloud.LeanCloudError as exc:
             if exc.code == LeanCloudErrorCode.ClassOrObjectNotExists.value:
                 return 0
             raise
 
-    def paginate(self, page, size):
-        return Pages(self, page, size)
+    def paginate(self, page, size, keyset=False, token=None, prefetch=0):
+        """
+        分页查询。
+
+        :param page: 页码，从 1 开始
+        :param size: 每页对象数
+        :param keyset: 使用 keyset 分页，参考 `KeysetPages`
+        :param token: keyset 分页的续页令牌，从该令牌之后开始翻页
+        :param prefetch: 遍历时并发预读的页数，仅支持普通分页
+        :return: Pages
+        """
+        self._check_bound()
+        if keyset:
+            if prefetch:
+                raise ValueError('keyset pagination fetch pages one by one, prefetch is not supported.')
+            return KeysetPages(self, page, size, token)
+        if token is not None:
+            raise ValueError('token is only supported by keyset pagination.')
+        return Pages(self, page, size, prefetch)
+
+    def delete(self, chunk_size=None, workers=None, progress=None, checkpoint=None):
+        """
+        删除所有符合查询条件的对象。
+
+        以只取 objectId 的 scan 遍历匹配的对象，边扫描边把删除请求分块、并发地发送。
+        不会创建 Model 实例，也不会触发 `pre_delete` 回调。
+
+        :param chunk_size: 每个批量请求包含的对象数
+        :param workers: 并发请求数
+        :param progress: 每完成一个分块调用一次，参数为当前的 `BulkResult`
+        :param checkpoint: 断点文件路径，中断后以同一路径再次调用会从断点继续
+        :return: BulkResult
+        """
+        self._check_bound()
+        with instrument.operation('delete', self._model, self._query) as op:
+            result = batch.destroy_where(self._query, chunk_size=chunk_size, workers=workers, progress=progress,
+                                         checkpoint=checkpoint)
+            op.objects = result.processed
+        return result
+
+    def update(self, values, chunk_size=None, workers=None, progress=None, checkpoint=None):
+        """
+        把所有符合查询条件的对象的字段更新为指定值。
+
+        值的写入规则与给 Model 实例的字段赋值相同，请求的发送方式与 `delete` 相同。
+        不会触发 `pre_update` 回调。
+
+        例子： ::
+
+            People.query().filter(People.age < 18).update({'invited': False})
+
+        :param values: 字段名与新值的 dict，与其余参数分开传入，因此任何字段名都不会与参数冲突
+        :param chunk_size: 每个批量请求包含的对象数
+        :param workers: 并发请求数
+        :param progress: 每完成一个分块调用一次，参数为当前的 `BulkResult`
+        :param checkpoint: 断点文件路径，中断后以同一路径再次调用会从断点继续
+        :return: BulkResult
+        """
+        self._check_bound()
+        input_key_set = set(values.keys())
+        fields_key_set = set(self._model.__fields__.keys())
+
+        if not input_key_set.issubset(fields_key_set):
+            raise KeyError('Unknown fields {0}'.format(input_key_set - fields_key_set))
+
+        template = self._model(leancloud.Object.create(self._model.__lc_cls__))
+        for key, value in values.items():
+            setattr(template, key, value)
+
+        with instrument.operation('update', self._model, self._query) as op:
+            result = batch.update_where(self._query, template.lc_object._dump_save(), chunk_size=chunk_size,
+                                        workers=workers, progress=progress, checkpoint=checkpoint)
+            op.objects = result.processed
+        return result
@@ -0,0 +1,422 @@
+"""
+慢查询日志、查询形状统计和索引建议，基于 `instrument` 事件。 ::
+
+    querylog = QueryLog(slow_threshold=0.5).install()
+    querylog.start(600)                     # 每 10 分钟把报告写入日志
+    ...
+    print(querylog.format_report())
+    for recommendation in querylog.recommend_indexes():
+        print(recommendation)
+"""
+import itertools
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from leancloud_better_storage.storage.metrics import _Subscriber
+from leancloud_better_storage.storage.query import ConditionOperator
+
+DEFAULT_SLOW_THRESHOLD = 1.0
+DEFAULT_KINDS = ('find', 'first', 'count', 'scan')
+DEFAULT_MAX_SHAPES = 1000
+SKIP_BUCKETS = (100, 1000, 10000)
+DEEP_SKIP = 1000  # skip 达到这个深度时建议改用 keyset 分页
+_MAX_BRANCHES = 16
+
+_OPERATORS = {
+    '$ne': ConditionOperator.NotEqual,
+    '$gt': ConditionOperator.GreaterThan,
+    '$gte': ConditionOperator.GreaterThanOrEqualTo,
+    '$lt': ConditionOperator.LessThan,
+    '$lte': ConditionOperator.LessThanOrEqualTo,
+    '$in': ConditionOperator.ContainedIn,
+}
+_EQUALITY = frozenset((ConditionOperator.Equal.value, ConditionOperator.ContainedIn.value))
+_RANGE = frozenset((ConditionOperator.GreaterThan.value, ConditionOperator.GreaterThanOrEqualTo.value,
+                    ConditionOperator.LessThan.value, ConditionOperator.LessThanOrEqualTo.value,
+                    ConditionOperator.StartsWith.value))
+_GEO = frozenset((ConditionOperator.Near.value, ConditionOperator.WithinKilometers.value))
+
+logger = logging.getLogger(__name__)
+
+
+def _operators(value):
+    """ 一个字段条件用到的运算符，丢弃字面值。 """
+    if not isinstance(value, dict) or '__type' in value or not any(key.startswith('$') for key in value):
+        return [ConditionOperator.Equal.value]
+    if '$nearSphere' in value:
+        geo = ConditionOperator.WithinKilometers if '$maxDistance' in value else ConditionOperator.Near
+        return [geo.value]
+
+    operators = []
+    for key, operand in value.items():
+        if key == '$regex':
+            regex = ConditionOperator.StartsWith if str(operand).startswith('^') else ConditionOperator.Regex
+            operators.append(regex.value)
+        elif key in _OPERATORS:
+            operators.append(_OPERATORS[key].value)
+        elif key != '$options':
+            operators.append(key)  # operators not produced by Condition, e.g. $exists
+    return operators
+
+
+def _branches(where):
+    """ 把查询条件展开为若干个 `OR` 分支，每个分支是 (字段, 运算符) 的集合。 """
+    branches = [frozenset()]
+    for key, value in where.items():
+        if key == '$and':
+            alternatives = [_branches(sub) for sub in value]
+        elif key == '$or':
+            alternatives = [[branch for sub in value for branch in _branches(sub)]]
+        else:
+            alternatives = [[frozenset((key, operator) for operator in _operators(value))]]
+        for options in alternatives:
+            branches = [branch | option for branch, option in itertools.product(branches, options)]
+            branches = list(OrderedDict.fromkeys(branches))[:_MAX_BRANCHES]
+    return branches
+
+
+def _redact(value):
+    """ 把查询条件中的字面值替换为 `?`，只保留字段名、运算符和 `$and`/`$or` 结构。 """
+    if isinstance(value, dict):
+        if '__type' in value:  # Date, Pointer, GeoPoint ...
+            return '?'
+        return {key: _redact(operand) for key, operand in value.items()}
+    if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        return [_redact(item) for item in value]
+    return '?'
+
+
+def _skip_bucket(skip):
+    if not skip:
+        return 0
+    for bound in SKIP_BUCKETS:
+        if skip < bound:
+            return bound
+    return SKIP_BUCKETS[-1] + 1
+
+
+class QueryShape(object):
+    """
+    去掉字面值的查询形状：数据集、条件用到的字段和运算符（`ConditionOperator` 的值）、排序字段和 skip 的深度。
+
+    形状相同的查询只有条件中的值不同，可以使用同一个索引。
+
+    :param branches: tuple of `OR` branches, each a sorted tuple of (field name, operator)
+    :param skip: skip 深度所在的区间上界，0 表示没有 skip，`SKIP_BUCKETS[-1] + 1` 表示更深
+    """
+    __slots__ = ('kind', 'class_name', 'branches', 'order', 'skip', '_key')
+
+    def __init__(self, kind, class_name, branches, order=(), skip=0):
+        self.kind = kind
+        self.class_name = class_name
+        self.branches = branches
+        self.order = tuple(order)
+        self.skip = skip
+        self._key = (kind, class_name, branches, self.order, skip)
+
+    @classmethod
+    def from_event(cls, event):
+        where = json.loads(event.where) if event.where else {}
+        branches = tuple(sorted(tuple(sorted(branch)) for branch in _branches(where) if branch))
+        class_name = event.model.__lc_cls__ if event.model is not None else None
+        return cls(event.kind, class_name, branches, event.order, _skip_bucket(event.skip))
+
+    @property
+    def key(self):
+        return self._key
+
+    def __eq__(self, other):
+        return isinstance(other, QueryShape) and self._key == other._key
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __str__(self):
+        where = ' OR '.join('({})'.format(' AND '.join('{} {}'.format(*cond) for cond in branch))
+                            for branch in self.branches) or '*'
+        text = '{} {} WHERE {}'.format(self.kind, self.class_name, where)
+        if self.order:
+            text += ' ORDER BY {}'.format(', '.join(self.order))
+        if self.skip > SKIP_BUCKETS[-1]:
+            text += ' SKIP >={}'.format(SKIP_BUCKETS[-1])
+        elif self.skip:
+            text += ' SKIP <{}'.format(self.skip)
+        return text
+
+    def __repr__(self):
+        return '<QueryShape {}>'.format(self)
+
+
+class ShapeStats(object):
+    """
+    一种查询形状的统计。`example` 是最慢一次查询的条件，可以提供给 LeanCloud 技术支持；
+    除非 `QueryLog` 指定了 `capture_values`，其中的值都已替换为 `?`。
+    """
+    __slots__ = ('shape', 'count', 'total_duration', 'max_duration', 'slow', 'objects', 'errors', 'example')
+
+    def __init__(self, shape):
+        self.shape = shape
+        self.count = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.slow = 0
+        self.objects = 0
+        self.errors = 0
+        self.example = None
+
+    @property
+    def mean_duration(self):
+        return self.total_duration / self.count if self.count else 0.0
+
+    def to_dict(self):
+        return {
+            'shape': str(self.shape),
+            'count': self.count,
+            'total_duration': self.total_duration,
+            'mean_duration': self.mean_duration,
+            'max_duration': self.max_duration,
+            'slow': self.slow,
+            'objects': self.objects,
+            'errors': self.errors,
+            'example': self.example,
+        }
+
+
+class IndexRecommendation(object):
+    """
+    建议建立的索引。
+
+    :param class_name: 数据集名
+    :param fields: list of (field name, 1 or -1)，-1 为降序
+    :param kind: `composite` 或 `geo`（地理位置索引）
+    :param shapes: 可以使用这个索引的 `ShapeStats`
+    :param notes: 其他说明，如无法使用索引的条件、过深的 skip
+    """
+
+    def __init__(self, class_name, fields, kind='composite', shapes=None, notes=None):
+        self.class_name = class_name
+        self.fields = fields
+        self.kind = kind
+        self.shapes = shapes or []
+        self.notes = notes or []
+
+    @property
+    def count(self):
+        return sum(stats.count for stats in self.shapes)
+
+    @property
+    def total_duration(self):
+        return sum(stats.total_duration for stats in self.shapes)
+
+    def to_dict(self):
+        return {
+            'class_name': self.class_name,
+            'kind': self.kind,
+            'fields': [list(field) for field in self.fields],
+            'count': self.count,
+            'total_duration': self.total_duration,
+            'shapes': [str(stats.shape) for stats in self.shapes],
+            'notes': list(self.notes),
+        }
+
+    def __str__(self):
+        fields = ', '.join('{} {}'.format(name, 'DESC' if direction < 0 else 'ASC') for name, direction in self.fields)
+        text = '{} index on {} ({}): {} queries, {:.3f}s in total'.format(self.kind, self.class_name, fields,
+                                                                         self.count, self.total_duration)
+        for note in self.notes:
+            text += '\n  - {}'.format(note)
+        return text
+
+    def __repr__(self):
+        return '<IndexRecommendation {} {}>'.format(self.class_name, self.fields)
+
+
+def _index_for(branch, order):
+    """ 按 等值、排序、范围 的顺序排列索引字段，返回 (kind, fields, notes)。 """
+    equality = sorted({field for field, operator in branch if operator in _EQUALITY})
+    ranges = sorted({field for field, operator in branch if operator in _RANGE} - set(equality))
+    geo = sorted({field for field, operator in branch if operator in _GEO})
+    others = sorted({'{} {}'.format(field, operator) for field, operator in branch
+                     if operator not in _EQUALITY and operator not in _RANGE and operator not in _GEO})
+
+    notes = []
+    if others:
+        notes.append('conditions can not use an index: {}'.format(', '.join(others)))
+    if geo:
+        return 'geo', [(field, 1) for field in geo], notes
+
+    fields = [(field, 1) for field in equality]
+    for key in order:
+        name, direction = (key[1:], -1) if key.startswith('-') else (key, 1)
+        if name not in equality and name not in [field for field, _ in fields]:
+            fields.append((name, direction))
+    fields.extend((field, 1) for field in ranges if field not in [name for name, _ in fields])
+    return 'composite', fields, notes
+
+
+class QueryLog(_Subscriber):
+    """
+    记录慢查询，并按查询形状统计次数和耗时，据此给出索引建议。线程安全。
+
+    耗时不少于 `slow_threshold` 秒的查询以 WARNING 级别写入日志（一行 JSON，含形状和条件），
+    同时以 `slow_query` 放入日志记录的 `extra`。
+
+    条件中的值可能包含个人信息，默认在写入日志和 `example` 之前替换为 `?`，`capture_values` 为 True 时保留原值。
+
+    :param slow_threshold: 慢查询阈值，秒
+    :param kinds: 统计的操作类型，参考 `instrument.Event`
+    :param logger: 慢查询和定期报告使用的 logger
+    :param max_shapes: 最多统计的形状数，超出后新的形状只计入 `dropped`
+    :param capture_values: 在日志和 `example` 中保留条件的原值
+    """
+
+    def __init__(self, slow_threshold=DEFAULT_SLOW_THRESHOLD, kinds=DEFAULT_KINDS, logger=None,
+                 max_shapes=DEFAULT_MAX_SHAPES, capture_values=False):
+        self.slow_threshold = slow_threshold
+        self.capture_values = capture_values
+        self.kinds = frozenset(kinds)
+        self.logger = logger or logging.getLogger(__name__)
+        self.max_shapes = max_shapes
+        self.dropped = 0
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._stopped = None
+
+    def __call__(self, event):
+        if event.kind not in self.kinds or event.model is None:
+            return
+        shape = QueryShape.from_event(event)
+        slow = event.duration >= self.slow_threshold
+        with self._lock:
+            stats = self._stats.get(shape)
+            if stats is None:
+                if len(self._stats) >= self.max_shapes:
+                    self.dropped += 1
+                    stats = None
+                else:
+                    stats = self._stats[shape] = ShapeStats(shape)
+            if stats is not None:
+                stats.count += 1
+                stats.total_duration += event.duration
+                stats.objects += event.objects
+                stats.errors += event.error is not None
+                stats.slow += slow
+                if event.duration >= stats.max_duration:
+                    stats.max_duration = event.duration
+                    stats.example = self._where_of(event)
+
+        if slow:
+            data = {'shape': str(shape), 'duration': event.duration, 'where': self._where_of(event),
+                    'order': list(event.order), 'skip': event.skip, 'objects': event.objects}
+            self.logger.warning('slow query %s', json.dumps(data, sort_keys=True), extra={'slow_query': data})
+
+    def _where_of(self, event):
+        if self.capture_values or not event.where:
+            return event.where
+        return json.dumps(_redact(json.loads(event.where)), sort_keys=True, separators=(',', ':'))
+
+    def stats(self, top=None, key='total_duration'):
+        """
+        :param top: 只返回前几项
+        :param key: 排序依据，`ShapeStats` 的属性名，如 `count`、`total_duration`、`max_duration`、`slow`
+        :return: list of ShapeStats, descending
+        """
+        with self._lock:
+            result = sorted(self._stats.values(), key=lambda stats: getattr(stats, key), reverse=True)
+        return result[:top] if top else result
+
+    def recommend_indexes(self, top=10):
+        """
+        为总耗时最多的 `top` 种查询形状建议索引。
+
+        等值条件（`==`、`in_`）的字段在前，其次是排序字段，最后是范围条件（`>`、`<`、`startswith` 等）的字段。
+        `OR` 的每个分支分别建议；字段是另一个建议的前缀时合并到那个建议中。
+
+        :return: list of IndexRecommendation, descending by total duration
+        """
+        recommendations = OrderedDict()
+        for stats in self.stats(top):
+            shape = stats.shape
+            for branch in shape.branches or ((),):
+                kind, fields, notes = _index_for(branch, shape.order)
+                if shape.skip > DEEP_SKIP:
+                    notes.append('skip deeper than {}, consider paginate(keyset=True)'.format(DEEP_SKIP))
+                if not fields:
+                    continue
+                key = (shape.class_name, kind, tuple(fields))
+                recommendation = recommendations.get(key)
+                if recommendation is None:
+                    recommendation = recommendations[key] = IndexRecommendation(shape.class_name, fields, kind)
+                if stats not in recommendation.shapes:
+                    recommendation.shapes.append(stats)
+                recommendation.notes.extend(note for note in notes if note not in recommendation.notes)
+
+        result = list(recommendations.values())
+        for covered in list(result):
+            for other in result:
+                if (other is not covered and other.class_name == covered.class_name and other.kind == covered.kind
+                        and other.fields[:len(covered.fields)] == covered.fields):
+                    other.shapes.extend(stats for stats in covered.shapes if stats not in other.shapes)
+                    other.notes.extend(note for note in covered.notes if note not in other.notes)
+                    result.remove(covered)
+                    break
+        return sorted(result, key=lambda recommendation: recommendation.total_duration, reverse=True)
+
+    def report(self, top=10):
+        """ :return: dict with shape statistics and index recommendations, JSON serializable """
+        return {
+            'shapes': [stats.to_dict() for stats in self.stats(top)],
+            'slowest': [stats.to_dict() for stats in self.stats(top, 'max_duration')],
+            'indexes': [recommendation.to_dict() for recommendation in self.recommend_indexes(top)],
+            'dropped': self.dropped,
+        }
+
+    def format_report(self, top=10):
+        """ :return: 文本格式的报告 """
+        lines = ['{:>8} {:>10} {:>10} {:>6}  shape'.format('count', 'total(s)', 'max(s)', 'slow')]
+        for stats in self.stats(top):
+            lines.append('{:>8} {:>10.3f} {:>10.3f} {:>6}  {}'.format(stats.count, stats.total_duration,
+                                                                     stats.max_duration, stats.slow, stats.shape))
+        recommendations = self.recommend_indexes(top)
+        if recommendations:
+            lines.append('')
+            lines.append('index recommendations:')
+            lines.extend(str(recommendation) for recommendation in recommendations)
+        return '\n'.join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.dropped = 0
+
+    def start(self, interval, callback=None):
+        """
+        在后台线程中每隔 `interval` 秒汇总一次。
+
+        :param callback: 以本对象为参数调用，默认把 `format_report()` 以 INFO 级别写入日志
+        """
+        self.stop()
+        stopped = self._stopped = threading.Event()
+        callback = callback or (lambda querylog: querylog.logger.info('query report\n%s', querylog.format_report()))
+
+        def run():
+            while not stopped.wait(interval):
+                try:
+                    callback(self)
+                except Exception:
+                    logger.exception('query report callback failed')
+
+        threading.Thread(target=run, daemon=True).start()
+        return self
+
+    def stop(self):
+        """ 停止定期汇总。 """
+        if self._stopped is not None:
+            self._stopped.set()
+            self._stopped = None
+
+    def uninstall(self):
+        self.stop()
+        super().uninstall()
@@ -0,0 +1,92 @@
+from leancloud import utils
+
+_METADATA_DATES = ('createdAt', 'updatedAt')
+_PLAIN_TYPES = (str, int, float, bool)
+
+
+class Record(object):
+    """
+    只读的查询结果记录，由 `Query.find(raw=True)` 和 `Query.iter_records()` 返回。
+
+    记录直接持有服务端返回的 JSON 数据，不创建 `leancloud.Object`，也没有修改记录。
+    可以像 Model 实例一样按属性名读取字段，嵌套的值（日期、引用、地理位置等）在第一次读取时才解码并缓存。
+    引用字段返回被引用 Model 的记录，未被 include 时只有 `object_id`。
+
+    需要修改时，可以用 `to_model()` 转换为 Model 实例。
+    """
+    __slots__ = ('_data', '_decoded')
+    __model__ = None
+
+    def __init__(self, data):
+        object.__setattr__(self, '_data', data)
+        object.__setattr__(self, '_decoded', None)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('Record is read-only.')
+
+    def __delattr__(self, item):
+        raise AttributeError('Record is read-only.')
+
+    @property
+    def raw(self):
+        """ 服务端返回的原始数据，请不要修改。 """
+        return self._data
+
+    def _get(self, key, ref_model=None):
+        decoded = self._decoded
+        if decoded is None:
+            decoded = {}
+            object.__setattr__(self, '_decoded', decoded)
+        elif key in decoded:
+            return decoded[key]
+
+        value = self._data.get(key)
+        if value is None or isinstance(value, _PLAIN_TYPES) and key not in _METADATA_DATES:
+            return value
+
+        if key in _METADATA_DATES and isinstance(value, str):
+            value = utils.decode(key, {'__type': 'Date', 'iso': value})
+        elif ref_model is not None and isinstance(value, dict) and value.get('__type') in ('Pointer', 'Object'):
+            value = ref_model.__meta__.record_class(value)
+        else:
+            value = utils.decode(key, value)
+        decoded[key] = value
+        return value
+
+    def to_dict(self):
+        """ 以属性名为键，返回所有字段解码后的值。 """
+        return {attr_name: getattr(self, attr_name) for attr_name in self.__model__.__fields__}
+
+    def to_model(self):
+        """ 转换为可以修改和保存的 Model 实例。 """
+        lc_object = self.__model__.__meta__.lc_object_class()
+        lc_object._update_data(dict(self._data))
+        return self.__model__(lc_object)
+
+    def __repr__(self):
+        return '<{} {}>'.format(type(self).__name__, self._data.get('objectId'))
+
+
+class _RecordField(object):
+    """ `Record` 上对应 Model 字段的只读描述符。 """
+    __slots__ = ('_field', '_field_name')
+
+    def __init__(self, field):
+        self._field = field
+        self._field_name = field.field_name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self._field
+        return instance._get(self._field_name, getattr(self._field, 'ref_cls', None))
+
+    def __set__(self, instance, value):
+        raise AttributeError('Record is read-only.')
+
+
+def record_class(model):
+    """ 生成 `model` 对应的 `Record` 子类。 """
+    attributes = {'__slots__': (), '__model__': model}
+    for attr_name, field in model.__fields__.items():
+        attributes[attr_name] = _RecordField(field)
+    return type('{}Record'.format(model.__name__), (Record,), attributes)
@@ -0,0 +1,187 @@
+import leancloud
+
+from leancloud_better_storage.storage import batch
+from leancloud_better_storage.storage.batch import BatchResult
+from leancloud_better_storage.storage.models import Model
+
+
+class Session(object):
+    """
+    identity map 与 unit of work。
+
+    在会话的生命周期内，通过 `Session.query` 或 `Session.get` 取得的同一条记录（相同数据集和 objectId）
+    总是同一个 Model 实例。新建、修改和删除的实例都不会立即发出请求，而是在 `flush()` 时
+    合并成尽可能少的 `/batch` 请求一起发送，可以跨越不同的 Model 类。
+
+    例子： ::
+
+        with Session() as session:
+            person = session.get(Person, object_id)
+            person.age += 1                                  # dirty
+            session.add(Pet.create(owner=person))            # new
+            session.delete(session.query(Pet).filter_by(name='cat').first())
+        # 正常退出 with 语句时自动 flush，有失败时抛出第一个错误
+
+    新对象引用了同一会话中的其他新对象时，被引用的对象会在更早的一轮请求中保存。
+    """
+
+    def __init__(self, chunk_size=None, workers=None):
+        """
+        :param chunk_size: 每个批量请求包含的对象数，默认 `batch.DEFAULT_CHUNK_SIZE`
+        :param workers: 并发请求数，默认 `batch.DEFAULT_WORKERS`
+        """
+        self._chunk_size = chunk_size
+        self._workers = workers
+        self._identity_map = {}
+        self._new = {}  # id(instance) -> instance, dict keeps insertion order
+        self._deleted = {}
+
+    @staticmethod
+    def _key(instance):
+        return instance.__lc_cls__, instance.object_id
+
+    @property
+    def new(self):
+        """ 等待创建的实例。 """
+        return list(self._new.values())
+
+    @property
+    def dirty(self):
+        """ identity map 中有未保存修改的实例，赋回原值的修改不算在内。 """
+        return [instance for instance in self._identity_map.values()
+                if id(instance) not in self._deleted and instance._prune_changes()]
+
+    @property
+    def deleted(self):
+        """ 等待删除的实例。 """
+        return list(self._deleted.values())
+
+    def __contains__(self, instance):
+        if id(instance) in self._new:
+            return True
+        return instance.lc_object is not None and self._identity_map.get(self._key(instance)) is instance
+
+    def merge(self, instance):
+        """
+        把已保存的实例放入 identity map。
+
+        :return: identity map 中相同记录的实例，之前不存在时即为 `instance` 本身
+        """
+        return self._identity_map.setdefault(self._key(instance), instance)
+
+    def add(self, *instances):
+        """ 把实例加入会话，没有 objectId 的实例会在 `flush` 时创建，其他实例被修改后会在 `flush` 时保存。 """
+        for instance in instances:
+            if instance.object_id is None:
+                self._new[id(instance)] = instance
+            elif self.merge(instance) is not instance:
+                raise ValueError('Another instance with objectId {} is already in session.'.format(
+                    instance.object_id))
+
+    def delete(self, *instances):
+        """ 标记实例在 `flush` 时删除。尚未创建的实例只是从会话中移除。 """
+        for instance in instances:
+            if instance.object_id is None:
+                self._new.pop(id(instance), None)
+                continue
+            if self.merge(instance) is not instance:
+                raise ValueError('Another instance with objectId {} is already in session.'.format(
+                    instance.object_id))
+            self._deleted[id(instance)] = instance
+
+    def expunge(self, instance):
+        """ 把实例移出会话，之后对它的修改不会被 `flush` 保存。 """
+        self._new.pop(id(instance), None)
+        self._deleted.pop(id(instance), None)
+        if instance.lc_object is not None and self._identity_map.get(self._key(instance)) is instance:
+            del self._identity_map[self._key(instance)]
+
+    def clear(self):
+        """ 清空会话，丢弃所有未 flush 的修改记录。 """
+        self._identity_map.clear()
+        self._new.clear()
+        self._deleted.clear()
+
+    def query(self, model):
+        """ 返回绑定到本会话的查询，查询结果经过 identity map。 """
+        query = model.query()
+        query._session = self
+        return query
+
+    def get(self, model, object_id):
+        """ 按 objectId 取得实例，identity map 中已存在时不发出请求。不存在时返回 None。 """
+        instance = self._identity_map.get((model.__lc_cls__, object_id))
+        if instance is None:
+            instance = self.query(model).filter(model.object_id == object_id).first()
+        return instance
+
+    @staticmethod
+    def _unsaved_refs(lc_object):
+        values = list(lc_object._attributes.values())
+        refs = []
+        while values:
+            value = values.pop()
+            if isinstance(value, (list, tuple)):
+                values.extend(value)
+            elif isinstance(value, leancloud.Object) and value is not lc_object and value.id is None:
+                refs.append(value)
+        return refs
+
+    def flush(self):
+        """
+        把所有新建、修改和删除一起发送。
+
+        第一轮请求包含所有删除、修改，以及不引用其他未保存对象的新对象，之后每一轮保存引用已保存对象的新对象。
+        会触发 `pre_create`、`pre_update` 和 `pre_delete` 回调。失败的实例仍留在会话中，可以再次 flush。
+
+        :return: BatchResult
+        """
+        deleted = self.deleted
+        dirty = self.dirty
+        pending = self.new
+
+        Model._do_batch_life_cycle_hook('pre_delete', deleted)
+        Model._do_batch_life_cycle_hook('pre_update', dirty)
+        Model._do_batch_life_cycle_hook('pre_create', pending)
+
+        instances, errors = [], []
+        saves, destroys = dirty, deleted
+        while True:
+            ready = [instance for instance in pending if not self._unsaved_refs(instance.lc_object)]
+            saves = saves + ready
+            if not saves and not destroys:
+                break
+
+            round_errors = batch.save_and_destroy_all([instance.lc_object for instance in saves],
+                                                      [instance.lc_object for instance in destroys],
+                                                      self._chunk_size, self._workers)
+            instances.extend(saves + destroys)
+            errors.extend(round_errors)
+
+            ready_ids = set(map(id, ready))
+            pending = [instance for instance in pending if id(instance) not in ready_ids]
+            saves, destroys = [], []
+
+        for instance in pending:  # references unsaved, failed or cyclic objects
+            instances.append(instance)
+            errors.append(ValueError('Could not save object which references unsaved objects.'))
+
+        for instance, error in zip(instances, errors):
+            if error is not None:
+                continue
+            if id(instance) in self._deleted:
+                del self._deleted[id(instance)]
+                self._identity_map.pop(self._key(instance), None)
+                instance._lc_obj = None
+            elif id(instance) in self._new:
+                del self._new[id(instance)]
+                self.merge(instance)
+
+        return BatchResult(instances, errors)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush().raise_for_errors()
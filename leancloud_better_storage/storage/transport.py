@@ -0,0 +1,111 @@
+import socket
+from collections import OrderedDict
+
+from leancloud import client
+from requests.adapters import DEFAULT_POOLBLOCK, DEFAULT_POOLSIZE, HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+DEFAULT_TIMEOUT = 15  # same as leancloud SDK
+
+
+class _PoolAdapter(HTTPAdapter):
+    """ 可以设置 socket 选项的 `HTTPAdapter`。 """
+
+    def __init__(self, socket_options=None, **kwargs):
+        self._socket_options = socket_options
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self._socket_options is not None:
+            kwargs['socket_options'] = self._socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+
+class Transport(object):
+    """
+    leancloud SDK HTTP 会话的连接池和超时设置。
+
+    SDK 的所有请求都经由同一个全局的 `leancloud.client.session`，安装后 `Query`、`Cursor`、`Pages`、`commit_all`
+    以及它们的工作线程共享同一组连接池。requests 默认每个主机只保留 10 个空闲连接，
+    并发线程多于 `pool_maxsize` 时，多出的连接用完即被关闭，下一次请求需要重新建立连接（和 TLS 握手）。
+
+    线程安全：连接池（urllib3）是线程安全的，安装之后可以被任意多个线程同时使用；
+    `install`、`uninstall` 会修改全局会话，应当在发出请求之前、没有其他线程使用 SDK 时调用。
+
+    例子: ::
+
+        Transport(pool_maxsize=32, connect_timeout=3, read_timeout=10).install()
+        Person.commit_all(*persons, workers=32)
+
+    :param pool_connections: 缓存连接池的主机数
+    :param pool_maxsize: 每个主机保留的最大连接数，应不小于并发线程数
+    :param pool_block: 为 True 时，连接数达到 `pool_maxsize` 后等待空闲连接，而不是新建临时连接，即每个主机的最大连接数
+    :param connect_timeout: 建立连接的超时秒数，None 表示与 `read_timeout` 相同
+    :param read_timeout: 等待响应的超时秒数
+    :param keep_alive: 为 False 时每个请求后关闭连接
+    :param tcp_keepalive: 开启 TCP keepalive，防止空闲连接被中间设备断开
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOLSIZE, pool_maxsize=DEFAULT_POOLSIZE, pool_block=DEFAULT_POOLBLOCK,
+                 connect_timeout=None, read_timeout=DEFAULT_TIMEOUT, keep_alive=True, tcp_keepalive=False):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keep_alive = keep_alive
+        self.tcp_keepalive = tcp_keepalive
+        self._adapter = None
+        self._saved = None
+
+    @property
+    def timeout(self):
+        """ 传给 requests 的 `timeout` 参数。 """
+        if self.connect_timeout is None:
+            return self.read_timeout
+        return self.connect_timeout, self.read_timeout
+
+    def _make_adapter(self):
+        socket_options = None
+        if self.tcp_keepalive:
+            socket_options = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        return _PoolAdapter(socket_options, pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+                            pool_block=self.pool_block, max_retries=0)
+
+    def install(self):
+        """ 应用到 leancloud SDK 的 HTTP 会话上。 """
+        if self._saved is not None:
+            return self
+
+        self._saved = {
+            'adapters': OrderedDict(client.session.adapters),
+            'timeout': client.TIMEOUT_SECONDS,
+            'connection': client.session.headers.get('Connection'),
+        }
+        self._adapter = self._make_adapter()
+        client.session.mount('https://', self._adapter)
+        client.session.mount('http://', self._adapter)
+        client.TIMEOUT_SECONDS = self.timeout
+        client.session.headers['Connection'] = 'keep-alive' if self.keep_alive else 'close'
+        return self
+
+    def uninstall(self):
+        """ 恢复 leancloud SDK 原本的设置，并关闭连接池。 """
+        if self._saved is None:
+            return
+
+        client.session.adapters = self._saved['adapters']
+        client.TIMEOUT_SECONDS = self._saved['timeout']
+        if self._saved['connection'] is None:
+            client.session.headers.pop('Connection', None)
+        else:
+            client.session.headers['Connection'] = self._saved['connection']
+        self._adapter.close()
+        self._adapter = None
+        self._saved = None
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.uninstall()
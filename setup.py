@@ -4,7 +4,7 @@ from setuptools import find_packages
 with open("README.md", "r", encoding='utf-8') as fh:
     long_description = fh.read()
 
-packages = find_packages(exclude=('tests',))
+packages = find_packages(exclude=('tests', 'benchmarks'))
 
 setuptools.setup(
     name="leancloud-better-storage",
@@ -17,6 +17,7 @@ setuptools.setup(
     url="https://github.com/nnnewb/leancloud-better-storage-python",
     packages=packages,
     install_requires=['leancloud==2.1.8', ],
+    extras_require={'parquet': ['pyarrow'], 'numpy': ['numpy'], 'pandas': ['pandas']},
     license='LGPL',
     classifiers=[
         "Development Status :: 3 - Alpha",
@@ -0,0 +1,70 @@
+import leancloud
+import pytest
+
+from leancloud_better_storage.storage.fields import Field, StringField
+from leancloud_better_storage.storage.local_backend import LocalBackend
+from leancloud_better_storage.storage.models import Model
+
+
+@pytest.fixture()
+def model_cls(backend):
+    class Person(Model):
+        name = StringField()
+        age = Field()
+        tags = Field()
+
+    Person.commit_all(*[Person.create(name='p{}'.format(i), age=i, tags=['even' if i % 2 == 0 else 'odd'])
+                        for i in range(30)])
+    return Person
+
+
+def test_where_semantics(model_cls):
+    assert model_cls.query().filter(model_cls.age >= 10, model_cls.age < 20).count() == 10
+    assert model_cls.query().filter(model_cls.age < 2).or_().filter(model_cls.age > 27).count() == 4
+    assert model_cls.query().filter(model_cls.age.in_([1, 2, 100])).count() == 2
+    assert model_cls.query().filter(model_cls.name.startswith('p2')).count() == 11
+    assert model_cls.query().filter_by(tags='even').count() == 15
+
+
+def test_order_skip_limit(model_cls):
+    results = model_cls.query().order_by(model_cls.age.desc).find(skip=5, limit=3)
+    assert [r.age for r in results] == [24, 23, 22]
+    assert len(model_cls.query().find()) == 30
+
+
+def test_scan_batches(backend, model_cls):
+    backend.stats.clear()
+    results = list(model_cls.query().scan(batch_size=7))
+    assert sorted(r.age for r in results) == list(range(30))
+    assert backend.stats['scan'] == 5
+
+
+def test_batch_requests(backend, model_cls):
+    assert backend.stats['batch'] == 1
+    assert len(backend.objects(model_cls.__lc_cls__)) == 30
+
+    backend.batch_limit = 10
+    result = model_cls.drop_all(*model_cls.query().find(), chunk_size=20)
+    assert len(result.failed) == 20
+    assert all(isinstance(error, leancloud.LeanCloudError) for _, error in result.failed)
+
+
+def test_conditional_update(model_cls):
+    person = model_cls.query().filter_by(age=3).first()
+    person.name = 'changed'
+    with pytest.raises(leancloud.LeanCloudError) as exc:
+        person.commit(where=model_cls.query().filter_by(age=4))
+    assert exc.value.code == 305
+
+
+def test_uninstall_restores_session():
+    class Unrelated(Model):
+        value = Field()
+
+    with LocalBackend() as outer:
+        with LocalBackend() as inner:
+            Unrelated.create(value=1).commit()
+        Unrelated.create(value=2).commit()
+
+    assert [o['value'] for o in inner.objects('Unrelated')] == [1]
+    assert [o['value'] for o in outer.objects('Unrelated')] == [2]
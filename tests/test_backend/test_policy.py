@@ -0,0 +1,143 @@
+import time
+
+import leancloud
+import pytest
+from requests.exceptions import ConnectTimeout, ReadTimeout
+
+from leancloud_better_storage.storage.fields import Field
+from leancloud_better_storage.storage.models import Model
+from leancloud_better_storage.storage.policy import RequestPolicy, TokenBucket
+
+
+@pytest.fixture()
+def policy(backend):
+    with RequestPolicy(backoff=0.001) as installed:
+        yield installed
+
+
+@pytest.fixture()
+def model_cls(backend):
+    class PolicyPerson(Model):
+        name = Field()
+
+    PolicyPerson.commit_all(*[PolicyPerson.create(name=str(i)) for i in range(5)])
+    return PolicyPerson
+
+
+def failing(backend, monkeypatch, failures, path=''):
+    """ the next `failures` requests to `path` return or raise the given failure. """
+    handle = backend.handle
+    failures = list(failures)
+
+    def flaky(method, request_path, params, body):
+        if failures and request_path.startswith(path):
+            failure = failures.pop(0)
+            if isinstance(failure, Exception):
+                raise failure
+            return failure, {'code': 1, 'error': 'failure {}'.format(failure)}
+        return handle(method, request_path, params, body)
+
+    monkeypatch.setattr(backend, 'handle', flaky)
+
+
+def test_retry_transient_errors(backend, model_cls, policy, monkeypatch):
+    failing(backend, monkeypatch, [503, 429, ReadTimeout()])
+    assert model_cls.query().count() == 5
+    assert policy.stats['retries'] == 3
+    assert (policy.stats['retry_5xx'], policy.stats['retry_429'], policy.stats['retry_timeout']) == (1, 1, 1)
+    assert policy.stats['requests'] == 4
+
+
+def test_give_up(backend, model_cls, policy, monkeypatch):
+    failing(backend, monkeypatch, [500] * 4)
+    with pytest.raises(leancloud.LeanCloudError):
+        model_cls.query().find()
+    assert policy.stats['retries'] == 3
+    assert policy.stats['gave_up'] == 1
+
+    failing(backend, monkeypatch, [400])
+    with pytest.raises(leancloud.LeanCloudError):
+        model_cls.query().find()
+    assert policy.stats['retries'] == 3
+
+
+def test_post_retried_only_when_safe(backend, model_cls, policy, monkeypatch):
+    failing(backend, monkeypatch, [503], '/batch')
+    assert not model_cls.commit_all(model_cls.create(name='x')).ok
+    assert policy.stats['retries'] == 0 and policy.stats['gave_up'] == 1
+
+    failing(backend, monkeypatch, [429, ConnectTimeout()], '/batch')
+    assert model_cls.commit_all(model_cls.create(name='y')).ok
+    assert policy.stats['retries'] == 2
+
+    policy.retry_post = True
+    failing(backend, monkeypatch, [503], '/batch')
+    assert model_cls.commit_all(model_cls.create(name='z')).ok
+
+
+def test_retry_after(backend, model_cls, policy, monkeypatch):
+    handle = backend.handle
+    calls = []
+
+    def limited(method, path, params, body):
+        calls.append(time.monotonic())
+        return (429, {'code': 155, 'error': 'too many requests'}) if len(calls) == 1 else handle(method, path, params,
+                                                                                                 body)
+
+    monkeypatch.setattr(backend, 'handle', limited)
+    monkeypatch.setattr(backend._adapter, 'send', _with_header(backend._adapter.send, 'Retry-After', '0.05'))
+    model_cls.query().count()
+    assert calls[1] - calls[0] >= 0.05
+
+
+def _with_header(send, name, value):
+    def wrapper(request, **kwargs):
+        response = send(request, **kwargs)
+        if response.status_code == 429:
+            response.headers[name] = value
+        return response
+
+    return wrapper
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=100, burst=2)
+    start = time.monotonic()
+    waits = [bucket.acquire() for _ in range(7)]
+    assert waits[:2] == [0.0, 0.0]
+    assert all(wait > 0 for wait in waits[2:])
+    assert time.monotonic() - start >= 0.045
+
+
+def test_rate_limit(backend, model_cls):
+    with RequestPolicy(rate=200, burst=1) as policy:
+        start = time.monotonic()
+        for _ in range(6):
+            model_cls.query().count()
+        assert time.monotonic() - start >= 0.02
+        assert policy.stats['throttled'] >= 4
+        assert policy.stats['throttle_seconds'] > 0
+
+
+def test_model_rate_limit(backend, model_cls):
+    class PolicyOther(Model):
+        name = Field()
+
+    with RequestPolicy() as policy:
+        policy.limit(model_cls, 100, burst=1)
+        for _ in range(3):
+            PolicyOther.query().count()
+        assert policy.stats['throttled'] == 0
+
+        for _ in range(3):
+            model_cls.query().count()
+        model_cls.commit_all(*[model_cls.create(name='new') for _ in range(3)])
+        assert policy.stats['throttled'] == 3
+
+
+def test_uninstall(backend):
+    from leancloud import client
+    policy = RequestPolicy().install()
+    assert 'send' in client.session.__dict__
+    policy.uninstall()
+    assert 'send' not in client.session.__dict__
@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from leancloud import client
+
+from leancloud_better_storage.storage.fields import Field
+from leancloud_better_storage.storage.local_backend import LocalServer
+from leancloud_better_storage.storage.models import Model
+from leancloud_better_storage.storage.transport import Transport
+
+
+@pytest.fixture()
+def server(backend):
+    with LocalServer(backend) as local:
+        yield local
+
+
+@pytest.fixture()
+def model_cls(backend):
+    class TransportPerson(Model):
+        name = Field()
+
+    return TransportPerson
+
+
+def test_local_server(backend, server, model_cls):
+    model_cls.commit_all(*[model_cls.create(name=str(i)) for i in range(10)], chunk_size=3).raise_for_errors()
+    assert model_cls.query().count() == 10
+    assert sorted(person.name for person in model_cls.query().scan(batch_size=4)) == sorted(map(str, range(10)))
+    assert backend.stats['batch'] == 4
+    assert server.connections >= 1
+
+
+def test_install(server):
+    adapters = dict(client.session.adapters)
+    headers = dict(client.session.headers)
+    with Transport(pool_maxsize=32, connect_timeout=1, read_timeout=5) as transport:
+        adapter = client.session.get_adapter('https://api.example.com')
+        assert adapter is client.session.get_adapter('http://' + server.address)
+        assert adapter._pool_maxsize == 32
+        assert client.TIMEOUT_SECONDS == (1, 5) == transport.timeout
+    assert dict(client.session.adapters) == adapters
+    assert client.TIMEOUT_SECONDS == 15
+    assert dict(client.session.headers) == headers
+
+
+def test_keep_alive(server, model_cls):
+    with Transport(tcp_keepalive=True):
+        for _ in range(10):
+            model_cls.query().count()
+    assert server.connections == 1
+
+    with Transport(keep_alive=False):
+        for _ in range(10):
+            model_cls.query().count()
+    assert server.connections == 11
+
+
+def test_pool_shared_by_threads(backend, server, model_cls):
+    backend.latency = 0.01
+    with Transport(pool_maxsize=8, pool_block=True):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: model_cls.query().count(), range(64)))
+    assert server.connections <= 8
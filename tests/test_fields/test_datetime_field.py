@@ -1,8 +1,9 @@
+from datetime import datetime
 from unittest import TestCase
 
 import leancloud
 
-from leancloud_better_storage.storage.fields import DateTimeField
+from leancloud_better_storage.storage.fields import DateTimeField, Field
 from leancloud_better_storage.storage.models import Model
 
 
@@ -41,10 +42,31 @@ class TestDateTimeField(TestCase):
         class M(Model):
             __lc_cls__ = self.cls_name
 
+            name = Field()
             birthday = DateTimeField(auto_now=True)
 
         instance = M.create()
         instance.commit()
         self.assertIsNone(instance.birthday)
+        instance.commit()  # nothing changed, not saved
+        self.assertIsNone(instance.birthday)
+        instance.name = 'changed'
         instance.commit()
-        self.assertIsNotNone(instance.birthday)
\ No newline at end of file
+        self.assertIsNotNone(instance.birthday)
+
+    def test_auto_now_add_shares_timestamp_in_batch(self):
+        calls = []
+
+        def now():
+            calls.append(1)
+            return datetime(2020, 1, len(calls))
+
+        class M(Model):
+            __lc_cls__ = self.cls_name
+
+            birthday = DateTimeField(auto_now_add=True, now_fn=now)
+
+        instances = [M.create() for _ in range(10)]
+        M.commit_all(*instances).raise_for_errors()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual({instance.birthday.day for instance in instances}, {1})
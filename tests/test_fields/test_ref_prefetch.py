@@ -0,0 +1,102 @@
+import pytest
+
+from leancloud_better_storage.storage.fields import Field, RefField
+from leancloud_better_storage.storage.fields import ref_field
+from leancloud_better_storage.storage.models import Model
+
+
+@pytest.fixture()
+def models(backend):
+    class RefCompany(Model):
+        name = Field()
+
+    class RefEmployee(Model):
+        name = Field()
+        company = RefField(ref_cls=RefCompany)
+        mentor = RefField(ref_cls='RefEmployee')
+
+    companies = [RefCompany.create(name='company-{}'.format(i)) for i in range(5)]
+    RefCompany.commit_all(*companies).raise_for_errors()
+    mentor = RefEmployee.create(name='mentor')
+    mentor.commit()
+    employees = [RefEmployee.create(name='employee-{}'.format(i), company=companies[i % 5], mentor=mentor)
+                 for i in range(30)]
+    employees.append(RefEmployee.create(name='freelancer'))
+    RefEmployee.commit_all(*employees).raise_for_errors()
+
+    backend.stats.clear()
+    return RefCompany, RefEmployee
+
+
+def test_query_prefetch_avoids_n_plus_one(backend, models):
+    company_cls, employee_cls = models
+    employees = employee_cls.query().filter(employee_cls.name.startswith('employee')) \
+        .prefetch(employee_cls.company).find()
+    assert backend.stats['find'] == 2
+
+    names = {employee.company.name for employee in employees}
+    assert names == {'company-{}'.format(i) for i in range(5)}
+    assert backend.stats['get'] == 0
+    assert backend.stats['find'] == 2
+
+
+def test_prefetched_refs_are_not_dirty(backend, models):
+    _, employee_cls = models
+    employee = employee_cls.query().filter_by(name='employee-0').prefetch(employee_cls.company).first()
+    assert employee.company.name == 'company-0'
+    assert 'company' not in employee.lc_object._dump_save()
+
+
+def test_resolve_refs_multiple_fields(backend, models):
+    _, employee_cls = models
+    employees = employee_cls.query().find()
+    backend.stats.clear()
+
+    assert employee_cls.resolve_refs(employees, employee_cls.company, 'mentor') is employees
+    # one query per referenced class and field, none for the employee without refs.
+    assert backend.stats['find'] == 2
+
+    for employee in employees:
+        if employee.name.startswith('employee'):
+            assert employee.mentor.name == 'mentor'
+            assert employee.company.name.startswith('company')
+        else:
+            assert employee.company is None
+    assert backend.stats['get'] == 0
+
+
+def test_resolve_refs_in_chunks(backend, models, monkeypatch):
+    _, employee_cls = models
+    monkeypatch.setattr(ref_field, 'RESOLVE_CHUNK_SIZE', 2)
+    employees = employee_cls.query().prefetch(employee_cls.company).find()
+    assert backend.stats['find'] == 1 + 3
+    assert all(employee.company.name for employee in employees if employee.name.startswith('employee'))
+    assert backend.stats['get'] == 0
+
+
+def test_scan_resolves_refs_per_batch(backend, models):
+    _, employee_cls = models
+    for prefetch in (0, 2):
+        backend.stats.clear()
+        cursor = employee_cls.query().prefetch(employee_cls.company).scan(batch_size=10, prefetch=prefetch)
+        companies = [employee.company for employee in cursor]
+        assert len(companies) == 32
+        assert backend.stats['find'] == 4
+        assert backend.stats['get'] == 0
+
+
+def test_paginate_resolves_refs(backend, models):
+    _, employee_cls = models
+    names = []
+    for page in employee_cls.query().prefetch(employee_cls.company).paginate(0, 10):
+        names.extend(employee.company.name for employee in page.items if employee.company is not None)
+    assert len(names) == 30
+    assert backend.stats['get'] == 0
+
+
+def test_prefetch_rejects_non_ref_fields(models):
+    _, employee_cls = models
+    with pytest.raises(ValueError):
+        employee_cls.query().prefetch(employee_cls.name)
+    with pytest.raises(KeyError):
+        employee_cls.resolve_refs([], 'unknown')
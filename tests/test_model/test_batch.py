@@ -0,0 +1,85 @@
+import pytest
+
+from leancloud_better_storage.storage.batch import BatchRequestError, BatchResult
+from leancloud_better_storage.storage.fields import Field
+from leancloud_better_storage.storage.local_backend import LocalBackend
+from leancloud_better_storage.storage.models import Model
+
+
+@pytest.fixture()
+def backend():
+    with LocalBackend(batch_limit=10) as local:
+        yield local
+
+
+@pytest.fixture()
+def model_cls(backend):
+    class BatchPerson(Model):
+        name = Field()
+
+    return BatchPerson
+
+
+def test_commit_all_in_chunks(backend, model_cls):
+    people = [model_cls.create(name='p{}'.format(i)) for i in range(95)]
+    result = model_cls.commit_all(*people, chunk_size=10, workers=4)
+
+    assert isinstance(result, BatchResult)
+    assert result.ok
+    assert len(result.succeeded) == 95
+    assert backend.stats['batch'] == 10
+    assert all(person.object_id is not None for person in people)
+    assert model_cls.query().count() == 95
+
+
+def test_commit_all_reports_failed_chunk(backend, model_cls):
+    people = [model_cls.create(name='p{}'.format(i)) for i in range(25)]
+    result = model_cls.commit_all(*people, chunk_size=20)
+
+    assert not result.ok
+    assert len(result.failed) == 20
+    assert result.succeeded == people[20:]
+    assert all(person.object_id is None for person in people[:20])
+    with pytest.raises(Exception):
+        result.raise_for_errors()
+
+
+def test_commit_all_reports_failed_object(backend, model_cls):
+    people = [model_cls.create(name='p{}'.format(i)) for i in range(3)]
+    model_cls.commit_all(*people)
+    model_cls.query().filter_by(name='p1').first().drop()
+
+    for person in people:
+        person.name = 'renamed'
+    result = model_cls.commit_all(*people)
+
+    assert [instance for instance, _ in result.failed] == [people[1]]
+    assert result.failed[0][1].code == 101
+
+
+def test_commit_all_rejects_short_response(backend, model_cls, monkeypatch):
+    handle = backend.handle
+
+    def drop_last_result(method, path, params, body):
+        status, content = handle(method, path, params, body)
+        return status, content[:-1] if path.endswith('/batch') else content
+
+    monkeypatch.setattr(backend, 'handle', drop_last_result)
+    result = model_cls.commit_all(*[model_cls.create(name='p{}'.format(i)) for i in range(3)])
+
+    assert len(result.failed) == 3
+    assert all(isinstance(error, BatchRequestError) for _, error in result.failed)
+
+
+def test_drop_all_in_chunks(backend, model_cls):
+    people = [model_cls.create(name='p{}'.format(i)) for i in range(30)]
+    model_cls.commit_all(*people, chunk_size=10)
+    unsaved = model_cls.create(name='unsaved')
+
+    result = model_cls.drop_all(*people, unsaved, chunk_size=10, workers=2)
+
+    assert [instance for instance, _ in result.failed] == [unsaved]
+    assert isinstance(result.failed[0][1], ValueError)
+    assert all(person.lc_object is None for person in people)
+    assert unsaved.lc_object is not None
+    assert model_cls.query().count() == 0
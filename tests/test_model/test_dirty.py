@@ -0,0 +1,110 @@
+import pytest
+
+from leancloud_better_storage.storage.fields import ArrayField, Field, RefField, undefined
+from leancloud_better_storage.storage.models import Model
+
+
+@pytest.fixture()
+def model_cls(backend):
+    class DirtyPerson(Model):
+        name = Field('displayName')
+        age = Field()
+        tags = ArrayField()
+        friend = RefField(ref_cls='DirtyPerson')
+
+    return DirtyPerson
+
+
+def test_dirty_fields(model_cls):
+    person = model_cls.create(name='alice', age=1, tags=['a'])
+    person.commit()
+    assert person.dirty_fields == {}
+
+    person.age = 2
+    person.age = 3
+    person.name = 'alice'
+    assert person.dirty_fields == {'age': (1, 3)}
+
+    person.age = 1
+    assert person.dirty_fields == {}
+
+    # list may be modified in place, always treated as changed
+    person.tags.append('b')
+    person.tags = person.tags
+    assert list(person.dirty_fields) == ['tags']
+
+
+def stored(backend, model_cls, object_id):
+    return next(obj for obj in backend.objects(model_cls.__lc_cls__) if obj['objectId'] == object_id)
+
+
+def test_fresh_query_result_is_clean(model_cls):
+    model_cls.create(name='alice', age=1).commit()
+    person = model_cls.query().first()
+    assert person.dirty_fields == {}
+    person.age = 5
+    assert person.dirty_fields == {'age': (1, 5)}
+
+
+def test_commit_skips_unchanged(backend, model_cls):
+    friend = model_cls.create(name='bob')
+    friend.commit()
+    person = model_cls.create(name='alice', age=1, friend=friend)
+    person.commit()
+
+    backend.stats.clear()
+    person.name = 'alice'
+    person.friend = model_cls.query().filter_by(name='bob').first()
+    person.commit()
+    assert backend.stats['update'] == 0
+
+    person.age = 2
+    person.name = 'alice'
+    assert person.lc_object._dump_save().keys() >= {'age', 'displayName'}
+    person.commit()
+    assert backend.stats['update'] == 1
+    assert stored(backend, model_cls, person.object_id)['age'] == 2
+
+
+def test_commit_sends_only_changed_keys(backend, model_cls, monkeypatch):
+    person = model_cls.create(name='alice', age=1)
+    person.commit()
+
+    bodies = []
+    handle = backend.handle
+
+    def spy(method, path, params, body):
+        bodies.append(body)
+        return handle(method, path, params, body)
+
+    monkeypatch.setattr(backend, 'handle', spy)
+    person.age = 2
+    person.name = 'alice'
+    person.commit()
+    assert set(bodies[0].keys()) == {'age'}
+
+
+def test_commit_all_skips_unchanged(backend, model_cls):
+    people = [model_cls.create(name=str(i), age=i) for i in range(4)]
+    model_cls.commit_all(*people).raise_for_errors()
+
+    people[1].age = 10
+    people[2].age = 2
+    backend.stats.clear()
+    result = model_cls.commit_all(*people)
+    assert result.ok and len(result) == 4
+    assert backend.stats['batch'] == 1
+    assert backend.stats['update'] == 1
+
+    backend.stats.clear()
+    assert model_cls.commit_all(*people).ok
+    assert backend.stats['batch'] == 0
+
+
+def test_unset_field(backend, model_cls):
+    person = model_cls.create(name='alice', age=1)
+    person.commit()
+    person.age = undefined
+    assert person.dirty_fields == {'age': (1, undefined)}
+    person.commit()
+    assert 'age' not in stored(backend, model_cls, person.object_id)
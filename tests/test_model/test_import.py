@@ -0,0 +1,228 @@
+import io
+import json
+import os
+from datetime import datetime, timezone
+
+import pytest
+from requests.exceptions import ConnectTimeout, ReadTimeout
+
+from leancloud_better_storage.storage import importer
+from leancloud_better_storage.storage.fields import (BooleanField, DateTimeField, Field, GeoPointField, NumberField,
+                                                     ObjectField, RefField, StringField)
+from leancloud_better_storage.storage.models import Model
+
+
+class ImportCompany(Model):
+    name = Field()
+
+
+class ImportPerson(Model):
+    name = StringField('Name', nullable=False, max_length=16)
+    age = NumberField()
+    active = BooleanField()
+    birthday = DateTimeField()
+    location = GeoPointField()
+    profile = ObjectField()
+    company = RefField(ref_cls=ImportCompany)
+
+
+@pytest.fixture()
+def company(backend):
+    company = ImportCompany.create(name='acme')
+    company.commit()
+    return company
+
+
+def stored(backend):
+    return sorted(backend.objects(ImportPerson.__lc_cls__), key=lambda obj: obj['Name'])
+
+
+def jsonl(rows):
+    return io.StringIO(''.join(json.dumps(row) + '\n' for row in rows))
+
+
+def test_import_jsonl(backend, company):
+    rows = [{'name': 'person {:02}'.format(i), 'age': i, 'active': True, 'birthday': '2000-01-02T03:04:05.000Z',
+             'location': {'latitude': 1.0, 'longitude': 2.0}, 'profile': {'tags': [i]}, 'company': company.object_id}
+            for i in range(25)]
+    result = ImportPerson.bulk_import(jsonl(rows), chunk_size=10)
+    assert result.ok and (result.position, result.imported) == (25, 25)
+    assert backend.stats['batch'] == 3
+
+    people = stored(backend)
+    assert len(people) == 25
+    assert people[3]['age'] == 3 and people[3]['profile'] == {'tags': [3]}
+    assert people[3]['company']['objectId'] == company.object_id
+    assert people[3]['birthday']['iso'] == '2000-01-02T03:04:05.000Z'
+    assert people[3]['location']['latitude'] == 1.0
+
+
+def test_import_csv(backend, company, tmp_path):
+    path = str(tmp_path / 'people.csv')
+    with open(path, 'w', encoding='utf-8', newline='') as fp:
+        fp.write('object_id,name,age,active,birthday,location_latitude,location_longitude,profile,company\n'
+                 'x1,alice,1,true,2000-01-02T03:04:05.000Z,1.5,2.5,"{""a"": 1}",' + company.object_id + '\n'
+                 'x2,bob,2.5,false,,,,,\n')
+    assert ImportPerson.bulk_import(path).imported == 2
+
+    alice, bob = stored(backend)
+    assert (alice['age'], alice['active'], alice['profile']) == (1, True, {'a': 1})
+    assert (alice['location']['latitude'], alice['location']['longitude']) == (1.5, 2.5)
+    assert alice['company']['objectId'] == company.object_id
+    assert alice['objectId'] != 'x1'
+    assert (bob['age'], bob['active']) == (2.5, False)
+    assert 'birthday' not in bob and 'location' not in bob
+
+
+def test_invalid_rows(backend):
+    source = io.StringIO('{"name": "alice"}\n'
+                         'not json\n'
+                         '\n'
+                         '{"name": "this name is too long"}\n'
+                         '{"age": 1}\n'
+                         '{"name": "bob", "unknown": 1}\n'
+                         '{"name": "carol"}\n')
+    result = ImportPerson.bulk_import(source, chunk_size=2)
+    assert (result.position, result.imported) == (6, 2)
+    assert [row_number for row_number, _ in result.failed] == [2, 3, 4, 5]
+    assert isinstance(result.failed[0][1], ValueError)
+    assert isinstance(result.failed[2][1], KeyError)
+    assert [obj['Name'] for obj in stored(backend)] == ['alice', 'carol']
+
+
+def test_iterable_rows(backend):
+    rows = ({'name': str(i), 'birthday': datetime(2000, 1, 1, tzinfo=timezone.utc)} for i in range(5))
+    assert ImportPerson.bulk_import(rows).imported == 5
+    assert stored(backend)[0]['birthday']['iso'] == '2000-01-01T00:00:00.000Z'
+
+
+def test_retry_failed_chunks(backend, monkeypatch):
+    monkeypatch.setattr(importer, 'RETRY_BACKOFF', 0)
+    handle = backend.handle
+    failures = [2]
+
+    def flaky(method, path, params, body):
+        if path.endswith('/batch') and failures[0]:
+            failures[0] -= 1
+            return 503, {'code': 1, 'error': 'service unavailable'}
+        return handle(method, path, params, body)
+
+    monkeypatch.setattr(backend, 'handle', flaky)
+    result = ImportPerson.bulk_import(jsonl({'name': str(i)} for i in range(5)), workers=1)
+    assert result.ok and result.imported == 5
+    assert len(stored(backend)) == 5
+
+    failures[0] = 3
+    result = ImportPerson.bulk_import(jsonl({'name': str(i)} for i in range(5)), workers=1, retries=2)
+    assert result.imported == 0 and len(result.failed) == 5
+
+
+def test_retry_connect_errors_only(backend, monkeypatch):
+    monkeypatch.setattr(importer, 'RETRY_BACKOFF', 0)
+    handle = backend.handle
+    failures = [ConnectTimeout('connect timeout'), ReadTimeout('read timeout')]
+
+    def flaky(method, path, params, body):
+        if path.endswith('/batch') and failures:
+            raise failures.pop(0)
+        return handle(method, path, params, body)
+
+    monkeypatch.setattr(backend, 'handle', flaky)
+    result = ImportPerson.bulk_import(jsonl({'name': str(i)} for i in range(5)), workers=1)
+    # retried after the connect timeout, but the chunk may have been saved before the read timeout
+    assert result.imported == 0 and isinstance(result.failed[0][1], ReadTimeout)
+    assert not failures
+
+
+def test_permanent_errors_not_retried(backend, monkeypatch):
+    monkeypatch.setattr(importer, 'RETRY_BACKOFF', 10)  # would hang the test if retried
+    handle = backend.handle
+    batches = []
+
+    def duplicated(method, path, params, body):
+        if path.endswith('/batch'):
+            batches.append(len(body['requests']))
+            status, content = handle(method, path, params, {'requests': body['requests'][1:]})
+            return status, [{'error': {'code': 137, 'error': 'duplicate value'}}] + content
+        return handle(method, path, params, body)
+
+    monkeypatch.setattr(backend, 'handle', duplicated)
+    result = ImportPerson.bulk_import(jsonl({'name': str(i)} for i in range(5)), workers=1)
+    assert batches == [5]
+    assert result.imported == 4
+    (row_number, error), = result.failed
+    assert row_number == 1 and error.code == 137
+
+
+def test_checkpoint(backend, tmp_path):
+    checkpoint = str(tmp_path / 'import.checkpoint')
+    positions = []
+
+    def progress(result):
+        with open(checkpoint, encoding='utf-8') as fp:
+            positions.append(json.load(fp)['position'])
+
+    source = [{'name': str(i)} for i in range(30)]
+    result = ImportPerson.bulk_import(source, chunk_size=10, progress=progress, checkpoint=checkpoint)
+    assert positions == [10, 20, 30]
+    assert result.imported == 30
+    assert not os.path.exists(checkpoint)
+
+    # resume an interrupted import
+    with open(checkpoint, 'w', encoding='utf-8') as fp:
+        json.dump({'position': 25, 'imported': 25, 'failed': []}, fp)
+    result = ImportPerson.bulk_import(source, chunk_size=10, checkpoint=checkpoint)
+    assert (result.position, result.imported) == (30, 30)
+    names = [obj['Name'] for obj in stored(backend)]
+    assert len(names) == 35
+    assert {name for name in names if names.count(name) == 2} == {str(i) for i in range(25, 30)}
+
+
+def test_resume_after_partial_failure(backend, tmp_path):
+    checkpoint = str(tmp_path / 'import.checkpoint')
+    source = [{'name': str(i)} if i % 7 else {'age': i} for i in range(30)]  # rows 1, 8, 15, 22, 29 are invalid
+
+    def interrupt(result):
+        if result.position == 10:
+            raise KeyboardInterrupt()
+
+    with pytest.raises(KeyboardInterrupt):
+        ImportPerson.bulk_import(source, chunk_size=10, workers=1, progress=interrupt, checkpoint=checkpoint)
+
+    result = ImportPerson.bulk_import(source, chunk_size=10, workers=1, checkpoint=checkpoint)
+    assert (result.position, result.imported) == (30, 25)
+    assert [row_number for row_number, _ in result.failed] == [1, 8, 15, 22, 29]
+    assert isinstance(result.failed[0][1], importer.CheckpointedError)
+    assert 'KeyError' in str(result.failed[0][1])
+
+
+def test_round_trip_export(backend, company):
+    ImportPerson.commit_all(*[ImportPerson.create(name=str(i), age=i, location=(i, i), company=company,
+                                                  birthday=datetime(2000, 1, 1, tzinfo=timezone.utc))
+                              for i in range(5)]).raise_for_errors()
+    for format in ('jsonl', 'csv'):
+        stream = io.StringIO()
+        exported = ImportPerson.query().export(stream, format=format)
+        before = len(stored(backend))
+        assert ImportPerson.bulk_import(io.StringIO(stream.getvalue()), format=format).imported == exported
+        people = stored(backend)
+        assert len(people) == before * 2
+        copies = [obj for obj in people if obj['Name'] == '3']
+        assert len({obj['birthday']['iso'] for obj in copies}) == 1
+        assert len({obj['company']['objectId'] for obj in copies}) == 1
+        assert {obj['age'] for obj in copies} == {3}
+
+
+def test_cli(backend, tmp_path):
+    path = str(tmp_path / 'people.jsonl')
+    with open(path, 'w', encoding='utf-8') as fp:
+        fp.write(''.join(json.dumps({'name': str(i)}) + '\n' for i in range(12)))
+        fp.write('{"age": 1}\n')
+
+    out = io.StringIO()
+    assert importer.main(['tests.test_model.test_import:ImportPerson', path, '--chunk-size', '5'], out) == 1
+    assert len(stored(backend)) == 12
+    assert '13 rows, 12 imported, 1 failed' in out.getvalue()
+    assert 'rows/s' in out.getvalue()
+    assert 'row 13: KeyError' in out.getvalue()
+    assert not os.path.exists(path + '.checkpoint')
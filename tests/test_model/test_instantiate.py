@@ -3,7 +3,7 @@ from unittest import TestCase
 import leancloud
 
 from leancloud_better_storage.storage import models
-from leancloud_better_storage.storage.fields import Field
+from leancloud_better_storage.storage.fields import Field, StringField
 
 
 class TestInstantiate(TestCase):
@@ -137,3 +137,76 @@ class TestInstantiate(TestCase):
         m2.commit()
         assert 'none_initialized_field' in m2.lc_object._attributes
         assert m2.none_initialized_field is None
+
+    def test_create_required_field(self):
+        class Person(models.Model):
+            __lc_cls__ = self.cls_name
+            name = Field(nullable=False)
+            alias = Field('Alias', nullable=False)
+
+        person = Person.create(name='remilia', alias='scarlet')
+        self.assertEqual(person.lc_object.get('Alias'), 'scarlet')
+        with self.assertRaises(KeyError):
+            Person.create(name='remilia')
+
+    def test_create_many(self):
+        class Person(models.Model):
+            __lc_cls__ = self.cls_name
+            name = StringField(max_length=8, nullable=False)
+            age = Field('Age')
+            tags = Field(default=list)
+            invited = Field(default=False)
+
+        rows = [{'name': 'remilia', 'age': 549}, {'name': 'flandre', 'age': 494, 'invited': True}, {'name': 'sakuya'}]
+        people = Person.create_many(rows)
+        expected = [Person.create(**row) for row in rows]
+        self.assertEqual([p.lc_object._dump_save() for p in people], [p.lc_object._dump_save() for p in expected])
+        self.assertIsNot(people[0].tags, people[1].tags)
+
+        columns = Person.create_many({'name': ['remilia', 'flandre'], 'age': [549, 494]})
+        self.assertEqual([(p.name, p.age, p.invited) for p in columns], [('remilia', 549, False), ('flandre', 494, False)])
+
+        Person.commit_all(*people).raise_for_errors()
+        stored = Person.query().filter_by(name='flandre').first()
+        self.assertEqual((stored.age, stored.invited, stored.tags), (494, True, []))
+
+    def test_create_many_validates(self):
+        class Person(models.Model):
+            __lc_cls__ = self.cls_name
+            name = StringField(max_length=8, nullable=False)
+
+        with self.assertRaises(KeyError):
+            Person.create_many([{'name': 'remilia'}, {}])
+        with self.assertRaises(KeyError):
+            Person.create_many([{'name': 'remilia', 'age': 1}])
+        with self.assertRaises(ValueError):
+            Person.create_many([{'name': 'remilia scarlet'}])
+        with self.assertRaises(ValueError):
+            Person.create_many({'name': ['a', 'b'], 'age': [1]})
+
+    def test_compact_instances(self):
+        class Person(models.Model):
+            __lc_cls__ = self.cls_name
+            name = Field()
+
+        person = Person.create(name='remilia')
+        self.assertFalse(hasattr(person, '__dict__'))
+        with self.assertRaises(AttributeError):
+            person.nickname = 'remi'
+
+        for obj in (Person.name == 'remilia', Person.name.desc, Person.query().scan()):
+            self.assertFalse(hasattr(obj, '__dict__'))
+
+    def test_allow_extra_attributes(self):
+        class Person(models.Model):
+            __lc_cls__ = self.cls_name
+            __allow_extra_attributes__ = True
+            name = Field()
+
+        class Student(Person):
+            pass
+
+        for cls in (Person, Student):
+            person = cls.create(name='remilia')
+            person.nickname = 'remi'
+            self.assertEqual(person.nickname, 'remi')
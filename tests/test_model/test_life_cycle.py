@@ -47,6 +47,7 @@ class TestLifeCycleHook(TestCase):
         M.register_pre_update_hook(fn)
         instance = M.create()
         instance.commit()
+        instance.field = 1
         with self.assertRaises(Updated):
             instance.commit()
 
@@ -117,6 +118,7 @@ class TestLifeCycleHook(TestCase):
 
         instance = M.create()
         instance.commit()
+        instance.field = 1
         with self.assertRaises(Updated):
             instance.commit()
 
@@ -139,3 +141,65 @@ class TestLifeCycleHook(TestCase):
         instance.commit()
         with self.assertRaises(Deleted):
             instance.drop()
+
+    def test_hooks_run_once_per_commit(self):
+        calls = []
+
+        class Base(Model):
+            pass
+
+        Base.register_pre_create_hook(lambda instance: calls.append('base'))
+
+        class M(Base):
+            field = Field()
+
+        M.register_pre_create_hook(lambda instance: calls.append('m'))
+
+        for _ in range(3):
+            M.create()._do_life_cycle_hook('pre_create')
+        self.assertEqual(calls, ['m', 'base'] * 3)
+        self.assertEqual(len(M._pre_create_hook), 1)
+        self.assertEqual(len(Base._pre_create_hook), 1)
+
+    def test_register_hook_after_first_use(self):
+        calls = []
+
+        class Base(Model):
+            pass
+
+        class M(Base):
+            field = Field()
+
+        M.create()._do_life_cycle_hook('pre_update')
+        Base.register_pre_update_hook(lambda instance: calls.append('base'))
+        M.create()._do_life_cycle_hook('pre_update')
+        self.assertEqual(calls, ['base'])
+
+    def test_batch_hooks(self):
+        calls = []
+
+        class Base(Model):
+            field = Field()
+
+        class M(Base):
+            pass
+
+        Base.register_pre_create_batch_hook(lambda instances: calls.append(('create', len(instances))))
+        M.register_pre_update_batch_hook(lambda instances: calls.append(('update', len(instances))))
+        M.register_pre_delete_batch_hook(lambda instances: calls.append(('delete', len(instances))))
+
+        instances = [M.create(field=i) for i in range(5)] + [Base.create(field=5)]
+        M.commit_all(*instances)
+        self.assertEqual(calls, [('create', 5), ('create', 1)])
+
+        calls.clear()
+        for instance in instances:
+            instance.field = -1
+        M.commit_all(*instances)
+        instances[0].field = -2
+        instances[0].commit()
+        self.assertEqual(calls, [('update', 5), ('update', 1)])
+
+        calls.clear()
+        M.drop_all(*instances)
+        self.assertEqual(calls, [('delete', 5)])
@@ -0,0 +1,120 @@
+import pytest
+
+from leancloud_better_storage.storage.fields import Field, RefField
+from leancloud_better_storage.storage.models import Model
+from leancloud_better_storage.storage.session import Session
+
+
+@pytest.fixture()
+def models(backend):
+    class SessionOwner(Model):
+        name = Field()
+        age = Field()
+
+    class SessionPet(Model):
+        name = Field()
+        owner = RefField(ref_cls=SessionOwner)
+
+    return SessionOwner, SessionPet
+
+
+def test_identity_map(backend, models):
+    owner_cls, _ = models
+    owner_cls.create(name='alice', age=1).commit()
+
+    session = Session()
+    first = session.query(owner_cls).filter_by(name='alice').first()
+    found = session.query(owner_cls).find()
+    scanned = list(session.query(owner_cls).scan())
+    assert found[0] is first
+    assert scanned[0] is first
+
+    backend.stats.clear()
+    assert session.get(owner_cls, first.object_id) is first
+    assert sum(backend.stats.values()) == 0
+
+    # plain queries are not affected
+    assert owner_cls.query().first() is not first
+
+
+def test_flush_in_single_batch(backend, models):
+    owner_cls, pet_cls = models
+    alice, bob = owner_cls.create(name='alice', age=1), owner_cls.create(name='bob', age=2)
+    owner_cls.commit_all(alice, bob).raise_for_errors()
+
+    session = Session()
+    alice = session.get(owner_cls, alice.object_id)
+    bob = session.get(owner_cls, bob.object_id)
+    alice.age = 10
+    session.delete(bob)
+    cat = pet_cls.create(name='cat')
+    session.add(cat, owner_cls.create(name='carol', age=3))
+    assert session.dirty == [alice]
+
+    backend.stats.clear()
+    result = session.flush()
+    assert result.ok
+    assert backend.stats['batch'] == 1
+    assert cat.object_id is not None and cat in session
+    assert bob.lc_object is None
+    assert session.new == session.dirty == session.deleted == []
+
+    assert sorted((o.name, o.age) for o in owner_cls.query().find()) == [('alice', 10), ('carol', 3)]
+    assert len(pet_cls.query().find()) == 1
+
+    backend.stats.clear()
+    assert session.flush().ok
+    assert backend.stats['batch'] == 0
+
+
+def test_flush_saves_referenced_objects_first(backend, models):
+    owner_cls, pet_cls = models
+    session = Session()
+    owner = owner_cls.create(name='dave', age=4)
+    pet = pet_cls.create(name='dog', owner=owner)
+    session.add(pet, owner)
+
+    backend.stats.clear()
+    assert session.flush().ok
+    assert backend.stats['batch'] == 2
+
+    stored = pet_cls.query().first()
+    assert stored.owner.object_id == owner.object_id
+
+
+def test_flush_reports_unsaved_references(models):
+    owner_cls, pet_cls = models
+    session = Session()
+    pet = pet_cls.create(name='dog', owner=owner_cls.create(name='nobody'))
+    session.add(pet)
+
+    result = session.flush()
+    assert [instance for instance, _ in result.failed] == [pet]
+    assert session.new == [pet]
+
+
+def test_add_conflicting_instance(models):
+    owner_cls, _ = models
+    owner = owner_cls.create(name='erin')
+    owner.commit()
+
+    session = Session()
+    session.add(owner)
+    with pytest.raises(ValueError):
+        session.add(owner_cls.query().first())
+
+    session.expunge(owner)
+    assert owner not in session
+
+
+def test_context_manager_flushes(models):
+    owner_cls, _ = models
+    with Session() as session:
+        session.add(owner_cls.create(name='frank'))
+    assert owner_cls.query().count() == 1
+
+    with pytest.raises(RuntimeError):
+        with Session() as session:
+            session.add(owner_cls.create(name='grace'))
+            raise RuntimeError()
+    assert owner_cls.query().count() == 1
@@ -0,0 +1,125 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from leancloud_better_storage.storage import aio, batch
+from leancloud_better_storage.storage.aio import AsyncCursor, AsyncPages, AsyncQuery
+from leancloud_better_storage.storage.fields import Field
+from leancloud_better_storage.storage.models import Model
+
+
+@pytest.fixture()
+def model_cls():
+    class AsyncPerson(Model):
+        name = Field()
+        age = Field()
+
+    AsyncPerson.clear()
+
+    yield AsyncPerson
+
+    AsyncPerson.clear()
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_commit_and_query(model_cls):
+    async def scenario():
+        person = model_cls.create(name='remilia', age=18)
+        await person.commit_async()
+        await model_cls.commit_all_async(*[model_cls.create(name='p{}'.format(i), age=i) for i in range(10)])
+
+        found = await model_cls.async_query().filter(model_cls.age >= 5).find()
+        first = await model_cls.async_query().filter_by(name='remilia').first()
+        count = await model_cls.async_query().count()
+        return person, found, first, count
+
+    person, found, first, count = run(scenario())
+    assert len(found) == 6
+    assert first.object_id == person.object_id
+    assert count == 11
+
+
+def test_async_scan(model_cls):
+    model_cls.commit_all(*[model_cls.create(age=i) for i in range(25)])
+
+    async def scenario():
+        cursor = model_cls.async_query().scan(batch_size=10)
+        assert isinstance(cursor, AsyncCursor)
+        return [person.age async for person in cursor]
+
+    assert sorted(run(scenario())) == list(range(25))
+
+
+def test_async_paginate(model_cls):
+    model_cls.commit_all(*[model_cls.create(age=i) for i in range(25)])
+
+    async def scenario():
+        pages = model_cls.async_query().order_by(model_cls.age.asc).paginate(0, 10)
+        assert isinstance(pages, AsyncPages)
+        assert not isinstance(pages.pages._query, AsyncQuery)
+        ages = [[person.age for person in await page.items()] async for page in pages]
+
+        keyset = model_cls.async_query().order_by(model_cls.age.desc).paginate(0, 10, keyset=True)
+        tokens = [await page.next_token() async for page in keyset]
+        resumed = model_cls.async_query().order_by(model_cls.age.desc).paginate(1, 10, keyset=True, token=tokens[0])
+        return ages, await pages.total_pages(), [person.age for person in await resumed.items()]
+
+    ages, total, resumed = run(scenario())
+    assert ages == [list(range(10)), list(range(10, 20)), list(range(20, 25))]
+    assert total == 3
+    assert resumed == list(range(14, 4, -1))
+
+
+def test_async_drop(model_cls):
+    people = [model_cls.create(age=i) for i in range(3)]
+    model_cls.commit_all(*people)
+
+    async def scenario():
+        await people[0].drop_async()
+        await model_cls.drop_all_async(*people[1:])
+        return await model_cls.async_query().count()
+
+    assert run(scenario()) == 0
+    assert all(person.lc_object is None for person in people)
+
+
+def test_concurrent_requests_do_not_block(model_cls):
+    model_cls.commit_all(*[model_cls.create(age=i) for i in range(10)])
+
+    async def scenario():
+        queries = [model_cls.async_query().filter_by(age=i).first() for i in range(10)]
+        return await asyncio.gather(*queries)
+
+    assert [person.age for person in run(scenario())] == list(range(10))
+
+
+def test_async_batches_share_executor(model_cls, monkeypatch):
+    def no_nested_pool(*args, **kwargs):
+        raise AssertionError('nested thread pool')
+
+    executor = ThreadPoolExecutor(max_workers=2)
+    aio.set_executor(executor)
+    monkeypatch.setattr(batch, 'ThreadPoolExecutor', no_nested_pool)
+
+    async def scenario():
+        groups = [[model_cls.create(age=i) for i in range(5)] for _ in range(4)]
+        results = await asyncio.gather(*[model_cls.commit_all_async(*group, chunk_size=1, workers=4)
+                                         for group in groups])
+        dropped = await model_cls.drop_all_async(*groups[0], chunk_size=1, workers=4)
+        return results, dropped
+
+    try:
+        results, dropped = run(asyncio.wait_for(scenario(), 10))
+    finally:
+        aio.set_executor(None)
+        executor.shutdown()
+    assert all(result.ok for result in results) and dropped.ok
+    assert model_cls.query().count() == 15
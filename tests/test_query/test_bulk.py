@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from leancloud_better_storage.storage.fields import Field
+from leancloud_better_storage.storage.models import Model
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture()
+def model_cls():
+    class BulkPerson(Model):
+        name = Field()
+        age = Field()
+
+    BulkPerson.clear()
+    BulkPerson.commit_all(*[BulkPerson.create(name='p{}'.format(i), age=i) for i in range(120)])
+
+    yield BulkPerson
+
+    BulkPerson.clear()
+
+
+def test_delete_by_query(model_cls):
+    result = model_cls.query().filter(model_cls.age >= 20).delete(chunk_size=25)
+    assert result.ok
+    assert result.processed == 100
+    assert model_cls.query().count() == 20
+
+
+def test_update_by_query(model_cls):
+    result = model_cls.query().filter(model_cls.age < 30).update({'name': 'young'}, chunk_size=7, workers=3)
+    assert result.ok
+    assert result.processed == 30
+    assert model_cls.query().filter_by(name='young').count() == 30
+    assert model_cls.query().filter_by(name='p30').count() == 1
+
+
+def test_update_unknown_field(model_cls):
+    with pytest.raises(KeyError):
+        model_cls.query().update({'unknown': 1})
+
+
+def test_update_field_named_like_option():
+    class Job(Model):
+        workers = Field()
+        progress = Field()
+
+    Job.commit_all(*[Job.create(workers=1, progress=0) for _ in range(5)])
+    result = Job.query().update({'workers': 8, 'progress': 100}, workers=2)
+    assert result.processed == 5
+    assert Job.query().filter_by(workers=8, progress=100).count() == 5
+    Job.clear()
+
+
+def test_progress(model_cls):
+    reported = []
+    model_cls.query().delete(chunk_size=50, progress=lambda result: reported.append(result.processed))
+    assert reported == [50, 100, 120]
+
+
+def test_resume_from_checkpoint(model_cls, tmp_path):
+    checkpoint = str(tmp_path / 'update.checkpoint')
+
+    def interrupt(result):
+        if result.processed >= 40:
+            raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        model_cls.query().update({'age': -1}, chunk_size=20, workers=1, progress=interrupt, checkpoint=checkpoint)
+    assert os.path.exists(checkpoint)
+
+    result = model_cls.query().update({'age': -1}, chunk_size=20, checkpoint=checkpoint)
+    assert result.ok
+    assert result.processed == 120
+    assert not os.path.exists(checkpoint)
+    assert model_cls.query().filter_by(age=-1).count() == 120
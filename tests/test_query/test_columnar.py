@@ -0,0 +1,90 @@
+from datetime import datetime
+
+import pytest
+
+from leancloud_better_storage.storage.fields import (BooleanField, DateTimeField, Field, GeoPointField, NumberField,
+                                                     ObjectField, RefField, StringField)
+from leancloud_better_storage.storage.models import Model
+
+np = pytest.importorskip('numpy')
+
+
+@pytest.fixture()
+def models(backend):
+    class ColumnCompany(Model):
+        name = Field()
+
+    class ColumnPerson(Model):
+        name = StringField('Name')
+        age = NumberField()
+        active = BooleanField()
+        birthday = DateTimeField()
+        location = GeoPointField()
+        profile = ObjectField()
+        company = RefField(ref_cls=ColumnCompany)
+
+    company = ColumnCompany.create(name='acme')
+    company.commit()
+    ColumnPerson.commit_all(*[ColumnPerson.create(name='person {}'.format(i), age=i, active=i % 2 == 0,
+                                                  birthday=datetime(2000, 1, i + 1), location=(i, -i),
+                                                  profile={'tags': ['a', i]}, company=company)
+                              for i in range(25)]).raise_for_errors()
+    return company, ColumnPerson
+
+
+def test_to_columns(models):
+    company, person_cls = models
+    columns = person_cls.query().filter(person_cls.age < 10).to_columns()
+    assert list(columns) == ['object_id', 'created_at', 'updated_at', 'name', 'age', 'active', 'birthday',
+                             'location_latitude', 'location_longitude', 'profile', 'company']
+
+    order = np.argsort(columns['age'])
+    assert columns['age'].dtype == np.float64
+    assert columns['age'][order].tolist() == list(range(10))
+    assert columns['active'].dtype == bool
+    assert columns['active'][order].tolist() == [i % 2 == 0 for i in range(10)]
+    assert columns['birthday'].dtype == np.dtype('datetime64[ms]')
+    assert columns['birthday'][order][3] == np.datetime64('2000-01-04T00:00:00')
+    assert columns['created_at'].dtype == np.dtype('datetime64[ms]')
+    assert columns['location_longitude'][order].tolist() == [-float(i) for i in range(10)]
+    assert columns['profile'][order][2] == {'tags': ['a', 2]}
+    assert set(columns['company']) == {company.object_id}
+
+
+def test_missing_values(models):
+    _, person_cls = models
+    person_cls.create(name='empty').commit()
+    columns = person_cls.query().filter_by(name='empty').limit(1).to_columns()
+    assert np.isnan(columns['age'][0]) and np.isnan(columns['location_latitude'][0])
+    assert np.isnat(columns['birthday'][0])
+    assert columns['active'].dtype == object and columns['active'][0] is None
+
+
+def test_to_columns_chunks(backend, models):
+    _, person_cls = models
+    backend.stats.clear()
+    chunks = list(person_cls.query().only(person_cls.age).to_columns(chunk_size=10, prefetch=1))
+    assert [len(chunk['age']) for chunk in chunks] == [10, 10, 5]
+    assert list(chunks[0]) == ['object_id', 'created_at', 'updated_at', 'age']
+    assert backend.stats['scan'] == 3
+
+
+def test_to_dataframe(models):
+    pd = pytest.importorskip('pandas')
+    _, person_cls = models
+    frame = person_cls.query().to_dataframe()
+    assert isinstance(frame, pd.DataFrame)
+    assert len(frame) == 25
+    assert frame['age'].sum() == sum(range(25))
+    assert str(frame['birthday'].dtype) == 'datetime64[ms]'
+
+    frames = list(person_cls.query().to_dataframe(chunk_size=20))
+    assert [len(frame) for frame in frames] == [20, 5]
+
+
+def test_empty_result(backend):
+    class ColumnNothing(Model):
+        age = NumberField()
+
+    columns = ColumnNothing.query().to_columns()
+    assert columns['age'].dtype == np.float64 and len(columns['age']) == 0
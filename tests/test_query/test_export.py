@@ -0,0 +1,103 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+from leancloud_better_storage.storage.fields import (BooleanField, DateTimeField, Field, GeoPointField, NumberField,
+                                                     ObjectField, RefField, StringField)
+from leancloud_better_storage.storage.models import Model
+
+
+@pytest.fixture()
+def models(backend):
+    class ExportCompany(Model):
+        name = Field()
+
+    class ExportPerson(Model):
+        name = StringField('Name')
+        age = NumberField()
+        active = BooleanField()
+        birthday = DateTimeField()
+        location = GeoPointField()
+        profile = ObjectField()
+        company = RefField(ref_cls=ExportCompany)
+
+    company = ExportCompany.create(name='acme')
+    company.commit()
+    ExportPerson.commit_all(*[ExportPerson.create(name='person {}'.format(i), age=i, active=i % 2 == 0,
+                                                  birthday=datetime(2000, 1, i + 1), location=(1.0, 2.0),
+                                                  profile={'tags': ['a', i]}, company=company)
+                              for i in range(25)]).raise_for_errors()
+    ExportPerson.create(name='empty').commit()
+    return company, ExportPerson
+
+
+def test_export_jsonl(backend, models):
+    company, person_cls = models
+    stream = io.StringIO()
+    backend.stats.clear()
+    assert person_cls.query().export(stream, batch_size=10) == 26
+    assert backend.stats['scan'] == 3
+
+    rows = sorted((json.loads(line) for line in stream.getvalue().splitlines()), key=lambda row: row['name'])
+    assert list(rows[0]) == ['object_id', 'created_at', 'updated_at',
+                             'name', 'age', 'active', 'birthday', 'location', 'profile', 'company']
+    assert rows[0]['name'] == 'empty' and rows[0]['location'] is None
+    row = rows[4]
+    assert row['name'] == 'person 11'
+    assert row['age'] == 11 and row['active'] is False
+    assert row['birthday'].startswith('2000-01-12T')
+    assert row['location'] == {'latitude': 1.0, 'longitude': 2.0}
+    assert row['profile'] == {'tags': ['a', 11]}
+    assert row['company'] == company.object_id
+    assert row['created_at'].endswith('Z')
+
+
+def test_export_csv(models, tmp_path):
+    _, person_cls = models
+    path = str(tmp_path / 'people.csv')
+    assert person_cls.query().filter(person_cls.age < 3).only(person_cls.name, person_cls.location) \
+        .export(path, format='csv') == 3
+
+    with open(path, encoding='utf-8', newline='') as fp:
+        rows = list(csv.DictReader(fp))
+    assert list(rows[0]) == ['object_id', 'created_at', 'updated_at', 'name', 'location_latitude', 'location_longitude']
+    assert sorted(row['name'] for row in rows) == ['person 0', 'person 1', 'person 2']
+    assert (rows[0]['location_latitude'], rows[0]['location_longitude']) == ('1.0', '2.0')
+
+
+def test_export_csv_encoding(models):
+    _, person_cls = models
+    stream = io.StringIO()
+    person_cls.query().filter_by(age=2).export(stream, format='csv')
+    row = next(csv.DictReader(io.StringIO(stream.getvalue())))
+    assert row['active'] == 'true'
+    assert json.loads(row['profile']) == {'tags': ['a', 2]}
+
+
+def test_export_parquet(models, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    _, person_cls = models
+    path = str(tmp_path / 'people.parquet')
+    assert person_cls.query().export(path, format='parquet', batch_size=10) == 26
+
+    parquet = pq.ParquetFile(path)
+    assert parquet.num_row_groups == 3
+    table = parquet.read()
+    assert str(table.schema.field('birthday').type) == 'timestamp[ms, tz=UTC]'
+    assert str(table.schema.field('age').type) == 'double'
+    assert str(table.schema.field('active').type) == 'bool'
+    rows = {row['name']: row for row in table.to_pylist()}
+    row = rows['person 3']
+    assert row['birthday'].replace(tzinfo=None) == datetime(2000, 1, 4)
+    assert (row['age'], row['location_latitude'], row['location_longitude']) == (3.0, 1.0, 2.0)
+    assert json.loads(row['profile']) == {'tags': ['a', 3]}
+    assert rows['empty']['age'] is None
+
+
+def test_export_unknown_format(models):
+    _, person_cls = models
+    with pytest.raises(ValueError):
+        person_cls.query().export(io.StringIO(), format='xml')
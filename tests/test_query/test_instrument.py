@@ -0,0 +1,137 @@
+import json
+import logging
+import urllib.request
+
+import pytest
+from leancloud import client
+
+from leancloud_better_storage.storage import instrument
+from leancloud_better_storage.storage.fields import Field
+from leancloud_better_storage.storage.metrics import Histogram, LoggingExporter, PrometheusExporter
+from leancloud_better_storage.storage.models import Model
+from leancloud_better_storage.storage.objectid import ObjectId
+
+
+@pytest.fixture()
+def model_cls(backend):
+    class InstrumentPerson(Model):
+        name = Field()
+        age = Field()
+
+    InstrumentPerson.commit_all(*[InstrumentPerson.create(name=str(i), age=i) for i in range(30)])
+    return InstrumentPerson
+
+
+@pytest.fixture()
+def events():
+    received = []
+    instrument.subscribe(received.append)
+    yield received
+    instrument.unsubscribe(received.append)
+
+
+def test_no_subscriber(model_cls):
+    assert not instrument.enabled()
+    assert instrument.operation('find', model_cls) is instrument.operation('count', model_cls)
+    assert instrument._on_response not in client.request_hooks.get('response', [])
+
+
+def test_find_event(model_cls, events):
+    query = model_cls.query().filter(model_cls.age >= 10)
+    people = query.find()
+
+    event, = events
+    assert event.kind == 'find'
+    assert event.model is model_cls
+    assert json.loads(event.where) == query.leancloud_query._where
+    assert event.objects == len(people) == 20
+    assert event.requests == 1
+    assert event.response_bytes > 0
+    assert event.duration >= 0
+    assert event.error is None
+
+
+def test_operation_kinds(model_cls, events):
+    query = model_cls.query()
+    assert query.count() == 30
+    person = query.first()
+    person.age = 100
+    person.commit()
+    assert len(list(query.scan(batch_size=10))) == 30
+    assert list(query.iter_records(batch_size=20))
+    model_cls.commit_all(*[model_cls.create(name='new') for _ in range(3)], chunk_size=1, workers=3)
+    person.drop()
+
+    assert [event.kind for event in events] == ['count', 'first', 'commit', 'scan', 'scan', 'scan', 'scan',
+                                                'scan', 'scan', 'commit_all', 'drop']
+    commit_all = events[-2]
+    assert (commit_all.objects, commit_all.requests) == (3, 3)  # responses of worker threads are counted
+    assert [event.objects for event in events if event.kind == 'scan'] == [10, 10, 10, 0, 20, 10]
+
+
+def test_fetch_event(model_cls, events):
+    person = model_cls.query().filter_by(name='7').first()
+    fetched = ObjectId(person.object_id, model_cls).fetch()
+
+    assert isinstance(fetched, model_cls)
+    assert (fetched.object_id, fetched.age) == (person.object_id, 7)
+    event = events[-1]
+    assert (event.kind, event.model, event.objects, event.requests, event.error) == ('fetch', model_cls, 1, 1, None)
+
+
+def test_error_event(model_cls, events, backend, monkeypatch):
+    monkeypatch.setattr(backend, 'handle', lambda *args: (500, {'code': 1, 'error': 'broken'}))
+    with pytest.raises(Exception):
+        model_cls.query().count()
+
+    event, = events
+    assert event.kind == 'count'
+    assert event.error is not None
+
+
+def test_failing_observer(model_cls, events):
+    def broken(event):
+        raise RuntimeError('broken')
+
+    instrument.subscribe(broken)
+    try:
+        assert model_cls.query().count() == 30
+    finally:
+        instrument.unsubscribe(broken)
+    assert len(events) == 1
+
+
+def test_histogram_and_prometheus(model_cls):
+    with Histogram() as histogram:
+        for _ in range(3):
+            model_cls.query().find()
+        model_cls.query().count()
+
+    snapshot = histogram.snapshot()
+    find = snapshot[('find', model_cls.__name__)]
+    assert find['count'] == 3
+    assert find['objects'] == 90
+    assert list(find['buckets'].values())[-1] == 3
+    assert histogram.quantile('find', model_cls, 0.5) is not None
+
+    exporter = PrometheusExporter(histogram).serve(0, '127.0.0.1')
+    try:
+        with urllib.request.urlopen('http://127.0.0.1:{}/metrics'.format(exporter.address[1])) as response:
+            text = response.read().decode('utf-8')
+    finally:
+        exporter.shutdown()
+    labels = 'kind="find",model="{}"'.format(model_cls.__name__)
+    assert 'leancloud_storage_operation_duration_seconds_count{{{}}} 3'.format(labels) in text
+    assert 'leancloud_storage_operation_duration_seconds_bucket{{{},le="+Inf"}} 3'.format(labels) in text
+    assert 'leancloud_storage_objects_total{{{}}} 90'.format(labels) in text
+
+
+def test_logging_exporter(model_cls, caplog):
+    with caplog.at_level(logging.INFO, logger='leancloud_better_storage.storage.metrics'):
+        with LoggingExporter():
+            model_cls.query().filter(model_cls.name == '1').find()
+
+    record, = caplog.records
+    assert record.storage_event['kind'] == 'find'
+    assert record.storage_event['objects'] == 1
+    assert json.loads(record.getMessage())['model'] == model_cls.__name__
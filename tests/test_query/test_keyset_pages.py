@@ -0,0 +1,64 @@
+import pytest
+
+from leancloud_better_storage.storage.fields import Field
+from leancloud_better_storage.storage.models import Model
+from leancloud_better_storage.storage.pages import KeysetPages
+
+
+@pytest.fixture(scope='module')
+def model_cls():
+    class KeysetPerson(Model):
+        name = Field()
+        age = Field()
+
+    KeysetPerson.clear()
+    KeysetPerson.commit_all(*[KeysetPerson.create(name='p{}'.format(i), age=i % 10) for i in range(95)])
+
+    yield KeysetPerson
+
+    KeysetPerson.clear()
+
+
+def ids_of(pages):
+    return [[item.object_id for item in page.items] for page in pages]
+
+
+def test_walk_all_pages(model_cls):
+    pages = model_cls.query().order_by(model_cls.age.desc).paginate(0, 10, keyset=True)
+    assert isinstance(pages, KeysetPages)
+
+    walked = ids_of(pages)
+    assert [len(page) for page in walked] == [10] * 9 + [5]
+    flat = [object_id for page in walked for object_id in page]
+    assert len(set(flat)) == 95
+
+
+def test_pages_follow_order(model_cls):
+    ages = [item.age
+            for page in model_cls.query().order_by(model_cls.age.desc).paginate(0, 7, keyset=True)
+            for item in page.items]
+    assert ages == sorted(ages, reverse=True)
+
+
+def test_keyset_with_filter(model_cls):
+    pages = model_cls.query().filter(model_cls.age >= 5).order_by(model_cls.age.asc).paginate(0, 8, keyset=True)
+    ages = [item.age for page in pages for item in page.items]
+    assert ages == sorted([i % 10 for i in range(95) if i % 10 >= 5])
+
+
+def test_resume_from_token(model_cls):
+    query = model_cls.query().order_by(model_cls.age.asc)
+    pages = query.paginate(0, 10, keyset=True)
+    next(pages)
+    token = next(pages).next_token
+    expected = [item.object_id for item in next(pages).items]
+
+    resumed = model_cls.query().order_by(model_cls.age.asc).paginate(1, 10, keyset=True, token=token)
+    assert [item.object_id for item in resumed.items] == expected
+
+
+def test_token_requires_keyset(model_cls):
+    with pytest.raises(ValueError):
+        model_cls.query().paginate(1, 10, token='abc')
+    with pytest.raises(ValueError):
+        model_cls.query().paginate(1, 10, keyset=True, token='not a token').items
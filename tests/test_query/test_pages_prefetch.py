@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from leancloud_better_storage.storage import pages as pages_module
+from leancloud_better_storage.storage.fields import Field
+from leancloud_better_storage.storage.models import Model
+
+
+@pytest.fixture(autouse=True)
+def count_cache():
+    pages_module.count_cache.clear()
+    yield pages_module.count_cache
+    pages_module.count_cache.clear()
+
+
+@pytest.fixture()
+def model_cls(backend):
+    class PagedPerson(Model):
+        age = Field()
+
+    PagedPerson.commit_all(*[PagedPerson.create(age=i) for i in range(95)])
+    return PagedPerson
+
+
+def test_prefetch_pages(model_cls):
+    query = model_cls.query().order_by(model_cls.age.asc)
+    ages = [item.age for page in query.paginate(0, 10, prefetch=3) for item in page.items]
+    assert ages == list(range(95))
+
+
+def test_prefetch_window_fetches_ahead(backend, model_cls):
+    backend.latency = 0.05
+    backend.stats.clear()
+    pages = model_cls.query().paginate(0, 10, prefetch=3)
+
+    begin = time.time()
+    next(pages)
+    assert time.time() - begin < 0.15
+    # current page and three pages ahead requested concurrently
+    deadline = time.time() + 2
+    while backend.stats['find'] < 4 and time.time() < deadline:
+        time.sleep(0.01)
+    assert backend.stats['find'] == 4
+
+
+def test_keyset_rejects_prefetch(model_cls):
+    with pytest.raises(ValueError):
+        model_cls.query().paginate(0, 10, keyset=True, prefetch=2)
+
+
+def test_total_pages_is_cached(backend, model_cls, count_cache, monkeypatch):
+    monkeypatch.setattr(count_cache, 'ttl', 60)
+    backend.stats.clear()
+    assert model_cls.query().paginate(1, 10).total_pages == 10
+    assert model_cls.query().paginate(1, 20).total_pages == 5
+    assert backend.stats['count'] == 1
+
+    assert model_cls.query().filter(model_cls.age < 50).paginate(1, 10).total_pages == 5
+    assert backend.stats['count'] == 2
+
+
+def test_count_cache_disabled_by_default(backend, model_cls):
+    backend.stats.clear()
+    model_cls.query().paginate(1, 10).total_pages
+    model_cls.query().paginate(1, 10).total_pages
+    assert backend.stats['count'] == 2
+
+
+def test_total_pages_after_write(model_cls):
+    assert model_cls.query().paginate(1, 10).total_pages == 10
+    model_cls.commit_all(*[model_cls.create(age=i) for i in range(10)])
+    assert model_cls.query().paginate(1, 10).total_pages == 11
+    model_cls.drop_all(*model_cls.query().filter(model_cls.age < 30).find())
+    assert model_cls.query().paginate(1, 10).total_pages == 7
+
+
+def test_pages_snapshot_query(model_cls):
+    query = model_cls.query().filter(model_cls.age < 30)
+    pages = query.paginate(1, 100)
+    query.order_by(model_cls.age.desc).includes(model_cls.age)
+    query.limit(1)
+
+    assert len(pages.items) == 30
+    assert pages.items[0].age == 0
@@ -0,0 +1,80 @@
+import time
+
+import leancloud
+import pytest
+
+from leancloud_better_storage.storage.fields import Field
+from leancloud_better_storage.storage.models import Model
+
+
+@pytest.fixture()
+def model_cls(backend):
+    class PrefetchPerson(Model):
+        age = Field()
+
+    PrefetchPerson.commit_all(*[PrefetchPerson.create(age=i) for i in range(50)])
+    return PrefetchPerson
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_prefetch_results(model_cls):
+    results = [person.age for person in model_cls.query().scan(batch_size=7, prefetch=2)]
+    assert sorted(results) == list(range(50))
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_batches(model_cls, prefetch):
+    with model_cls.query().scan(batch_size=7, prefetch=prefetch) as cursor:
+        first = next(cursor)
+        batches = list(cursor.batches())
+    assert all(0 < len(batch) <= 7 for batch in batches)
+    assert sorted([first.age] + [person.age for batch in batches for person in batch]) == list(range(50))
+
+
+def test_prefetch_runs_ahead_with_bounded_queue(backend, model_cls):
+    backend.stats.clear()
+    with model_cls.query().scan(batch_size=5, prefetch=2) as cursor:
+        next(cursor)
+        # first batch consumed by us, two more queued, one more held by the blocked producer thread.
+        assert wait_for(lambda: backend.stats['scan'] == 4)
+        time.sleep(0.1)
+        assert backend.stats['scan'] == 4
+
+
+def test_prefetch_close_stops_thread(model_cls):
+    cursor = model_cls.query().scan(batch_size=5, prefetch=1)
+    next(cursor)
+    cursor.close()
+    assert wait_for(lambda: not cursor._prefetcher.is_alive())
+
+
+def test_prefetch_abandoned_cursor_stops_thread(model_cls):
+    cursor = model_cls.query().scan(batch_size=5, prefetch=1)
+    prefetcher = cursor._prefetcher
+    for _ in cursor:
+        break
+    del cursor
+    assert wait_for(lambda: not prefetcher.is_alive())
+
+
+def test_prefetch_propagates_errors(backend, model_cls, monkeypatch):
+    monkeypatch.setattr(backend, 'handle', lambda *args: (500, {'code': 500, 'error': 'internal error'}))
+    cursor = model_cls.query().scan(prefetch=1)
+    with pytest.raises(leancloud.LeanCloudError):
+        next(cursor)
+
+
+def test_prefetch_keeps_raising_after_error(backend, model_cls, monkeypatch):
+    monkeypatch.setattr(backend, 'handle', lambda *args: (500, {'code': 500, 'error': 'internal error'}))
+    cursor = model_cls.query().scan(prefetch=1)
+    for _ in range(2):
+        with pytest.raises(leancloud.LeanCloudError):
+            next(cursor)
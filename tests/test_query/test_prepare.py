@@ -0,0 +1,106 @@
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from leancloud_better_storage.storage.fields import DateTimeField, Field, GeoPointField, StringField
+from leancloud_better_storage.storage.models import Model
+from leancloud_better_storage.storage.query import Param, QueryLogicalError
+
+
+@pytest.fixture()
+def model_cls(backend):
+    class PreparedPerson(Model):
+        name = StringField()
+        age = Field()
+        city = Field()
+        born = DateTimeField()
+        home = GeoPointField()
+
+    PreparedPerson.commit_all(*[PreparedPerson.create(name='p{}'.format(i), age=i, city=['a', 'b'][i % 2],
+                                                      born=datetime(2000 + i, 1, 1, tzinfo=timezone.utc),
+                                                      home=(i, i)) for i in range(20)])
+    return PreparedPerson
+
+
+def where_of(query):
+    return query.leancloud_query._where
+
+
+def test_same_where_as_filter(model_cls):
+    prepared = model_cls.query() \
+        .filter(model_cls.age >= Param('min_age'), model_cls.age < Param('max_age')) \
+        .filter_by(city=Param('city')) \
+        .filter(model_cls.name.startswith(Param('prefix')), model_cls.born > Param('born')) \
+        .order_by(model_cls.age.desc).prepare()
+    born = datetime(2005, 1, 1, tzinfo=timezone.utc)
+    bound = prepared.bind(min_age=3, max_age=15, city='a', prefix='p1', born=born)
+    plain = model_cls.query().filter(model_cls.age >= 3, model_cls.age < 15).filter_by(city='a') \
+        .filter(model_cls.name.startswith('p1'), model_cls.born > born).order_by(model_cls.age.desc)
+
+    assert prepared.params == {'min_age', 'max_age', 'city', 'prefix', 'born'}
+    assert where_of(bound) == where_of(plain)
+    assert [p.age for p in bound.find()] == [p.age for p in plain.find()] == [14, 12, 10]
+
+
+def test_bind_many_times(model_cls):
+    prepared = model_cls.query().filter(model_cls.age.in_(Param('ages'))).prepare()
+    assert {p.age for p in prepared.bind(ages=[1, 2]).find()} == {1, 2}
+    assert prepared.bind(ages=[5]).count() == 1
+    assert prepared.bind(ages=[]).first() is None
+
+    bound = prepared.bind(ages=[1, 2, 3])
+    bound.filter(model_cls.age > 1).limit(1)  # changing a bound query does not affect the template
+    assert prepared.bind(ages=[1, 2, 3]).count() == 3
+
+
+def test_params_inside_list(model_cls):
+    prepared = model_cls.query().filter(model_cls.age.in_([Param('low'), 10, Param('high')])).prepare()
+    assert prepared.params == {'low', 'high'}
+
+    bound = prepared.bind(low=1, high=19)
+    assert where_of(bound) == where_of(model_cls.query().filter(model_cls.age.in_([1, 10, 19])))
+    assert sorted(p.age for p in bound.find()) == [1, 10, 19]
+    assert prepared.bind(low=2, high=3).count() == 3
+
+    with pytest.raises(QueryLogicalError):
+        model_cls.query().filter(model_cls.age.in_([Param('age')])).find()
+
+
+def test_geo_params(model_cls):
+    near = model_cls.query().filter(model_cls.home.near(Param('point'))).limit(1).prepare()
+    assert where_of(near.bind(point=(3, 3))) == where_of(model_cls.query().filter(model_cls.home.near((3, 3))))
+
+    within = model_cls.query().filter(model_cls.home.within_kilometers(Param('point'), Param('km'))).prepare()
+    plain = model_cls.query().filter(model_cls.home.within_kilometers((3, 3), 100))
+    assert where_of(within.bind(point=(3, 3), km=100)) == where_of(plain)
+
+
+def test_bind_errors(model_cls):
+    prepared = model_cls.query().filter_by(city=Param('city')).prepare()
+    with pytest.raises(KeyError):
+        prepared.bind()
+    with pytest.raises(KeyError):
+        prepared.bind(city='a', age=1)
+
+
+def test_unbound_query_refuse_to_run(model_cls):
+    query = model_cls.query().filter_by(city=Param('city'))
+    for run in (query.find, query.count, query.first, lambda: list(query.scan()), lambda: query.paginate(1, 10)):
+        with pytest.raises(QueryLogicalError):
+            run()
+
+
+def test_bind_in_threads(model_cls):
+    prepared = model_cls.query().filter(model_cls.age == Param('age')).prepare()
+    results = {}
+
+    def run(age):
+        results[age] = [p.age for p in prepared.bind(age=age).find()]
+
+    threads = [threading.Thread(target=run, args=(age,)) for age in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {age: [age] for age in range(10)}
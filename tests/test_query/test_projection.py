@@ -0,0 +1,100 @@
+import pytest
+
+from leancloud_better_storage.storage.fields import Field, ObjectField
+from leancloud_better_storage.storage.models import Model
+
+
+@pytest.fixture()
+def model_cls(backend):
+    class ProjectedPerson(Model):
+        name = Field()
+        age = Field('Age')
+        profile = ObjectField()
+
+    ProjectedPerson.commit_all(*[ProjectedPerson.create(name='person {}'.format(i), age=i, profile={'bio': 'x' * 100})
+                                 for i in range(25)]).raise_for_errors()
+    backend.stats.clear()
+    return ProjectedPerson
+
+
+@pytest.fixture()
+def requests(backend, monkeypatch):
+    sent = []
+    handle = backend.handle
+
+    def spy(method, path, params, body):
+        sent.append((method, path, dict(params)))
+        return handle(method, path, params, body)
+
+    monkeypatch.setattr(backend, 'handle', spy)
+    return sent
+
+
+def test_only(model_cls, requests):
+    person = model_cls.query().only(model_cls.name).filter_by(name='person 3').first()
+    assert requests[0][2]['keys'] == 'name'
+    assert 'profile' not in person.lc_object._attributes
+    assert person.object_id and person.created_at
+    assert person.unloaded_fields == {'age', 'profile'}
+    assert person.name == 'person 3'
+    assert len(requests) == 1
+
+
+def test_defer(model_cls, requests):
+    people = model_cls.query().defer(model_cls.profile).find()
+    assert set(requests[0][2]['keys'].split(',')) == {'name', 'Age'}
+    assert len(people) == 25
+    assert all(person.unloaded_fields == {'profile'} for person in people)
+
+
+def test_access_unloaded_field_loads_once(backend, model_cls):
+    person = model_cls.query().only(model_cls.name).filter_by(name='person 5').first()
+    backend.stats.clear()
+    assert person.age == 5
+    assert person.profile == {'bio': 'x' * 100}
+    assert backend.stats['get'] == 1
+    assert person.unloaded_fields == set()
+
+
+def test_unloaded_field_keeps_local_changes(model_cls):
+    person = model_cls.query().only(model_cls.name).filter_by(name='person 1').first()
+    person.name = 'changed'
+    person.profile = {'bio': 'new'}
+    assert person.age == 1
+    assert person.dirty_fields.keys() == {'name', 'profile'}
+    person.commit()
+
+    stored = model_cls.query().filter_by(name='changed').first()
+    assert (stored.age, stored.profile) == (1, {'bio': 'new'})
+
+
+def test_scan_and_pages(model_cls, requests):
+    names = [person.name for person in model_cls.query().only(model_cls.name).scan(batch_size=10)]
+    assert len(names) == 25
+    assert all(params.get('keys') == 'name' for _, _, params in requests)
+
+    del requests[:]
+    for page in model_cls.query().only(model_cls.name).paginate(0, 10):
+        assert all(person.unloaded_fields == {'age', 'profile'} for person in page.items)
+    assert all(params.get('keys') == 'name' for _, _, params in requests)
+
+
+def test_keyset_pages_select_order_keys(model_cls):
+    query = model_cls.query().only(model_cls.name).order_by(model_cls.age.desc)
+    ages = []
+    for page in query.paginate(0, 10, keyset=True):
+        ages.extend(person.lc_object.get('Age') for person in page.items)
+    assert ages == list(range(24, -1, -1))
+
+
+def test_only_rejects_non_fields(model_cls):
+    with pytest.raises(ValueError):
+        model_cls.query().only('name')
+
+
+def test_filter_keeps_query_options(model_cls):
+    query = model_cls.query().only(model_cls.name).order_by(model_cls.age.desc).limit(3) \
+        .filter(model_cls.age < 10).filter_by(profile={'bio': 'x' * 100})
+    people = query.find()
+    assert [person.lc_object.get('Age') for person in people] == [None, None, None]
+    assert [person.age for person in people] == [9, 8, 7]
@@ -0,0 +1,101 @@
+import json
+import logging
+
+import pytest
+
+from leancloud_better_storage.storage.fields import Field
+from leancloud_better_storage.storage.models import Model
+from leancloud_better_storage.storage.querylog import QueryLog
+
+
+@pytest.fixture()
+def model_cls(backend):
+    class LogPerson(Model):
+        name = Field()
+        age = Field()
+        city = Field()
+
+    LogPerson.commit_all(*[LogPerson.create(name=str(i), age=i, city=['a', 'b'][i % 2]) for i in range(20)])
+    return LogPerson
+
+
+@pytest.fixture()
+def querylog(model_cls):
+    with QueryLog(slow_threshold=60) as installed:
+        yield installed
+
+
+def test_shape_strips_values(model_cls, querylog):
+    for age in (1, 5, 10):
+        model_cls.query().filter(model_cls.age > age).filter_by(city='a').find()
+    model_cls.query().filter_by(name='x').count()
+
+    find, count = querylog.stats(key='count')
+    assert find.count == 3 and count.count == 1
+    assert find.shape.branches == ((('age', '>'), ('city', '==')),)
+    assert str(find.shape) == 'find LogPerson WHERE (age > AND city ==)'
+    assert str(count.shape) == 'count LogPerson WHERE (name ==)'
+    assert '"?"' in find.example and '"a"' not in find.example  # where of the slowest one, values redacted
+
+
+def test_order_skip_and_or(model_cls, querylog):
+    model_cls.query().filter(model_cls.name.startswith('1')).or_().filter(model_cls.age < 3) \
+        .order_by(model_cls.age.desc).find(skip=5000)
+
+    stats, = querylog.stats()
+    shape = stats.shape
+    assert shape.branches == ((('age', '<'),), (('name', 'startswith'),))
+    assert shape.order == ('-age',)
+    assert str(shape).endswith('ORDER BY -age SKIP <10000')
+
+
+def test_slow_query_log(model_cls, caplog):
+    with caplog.at_level(logging.WARNING, logger='leancloud_better_storage.storage.querylog'):
+        with QueryLog(slow_threshold=0):
+            model_cls.query().filter_by(city='b').find()
+
+    record, = caplog.records
+    assert record.slow_query['shape'] == 'find LogPerson WHERE (city ==)'
+    assert record.slow_query['objects'] == 10
+    assert '"b"' not in record.getMessage()
+    assert json.loads(record.slow_query['where']) == {'$and': [{}, {'city': '?'}]}
+
+
+def test_capture_values(model_cls, caplog):
+    with caplog.at_level(logging.WARNING, logger='leancloud_better_storage.storage.querylog'):
+        with QueryLog(slow_threshold=0, capture_values=True) as querylog:
+            model_cls.query().filter_by(city='b').filter(model_cls.age.in_([1, 3])).find()
+
+    record, = caplog.records
+    assert '"b"' in record.slow_query['where']
+    assert '"b"' in querylog.stats()[0].example
+
+
+def test_recommend_indexes(model_cls, querylog):
+    for _ in range(3):
+        model_cls.query().filter_by(city='a').filter(model_cls.age >= 3).order_by(model_cls.name.asc).find()
+    model_cls.query().filter_by(city='a').find()  # prefix of the index above
+    model_cls.query().filter(model_cls.name != 'x').find(skip=2000)
+
+    recommendations = querylog.recommend_indexes()
+    first = recommendations[0]
+    assert first.fields == [('city', 1), ('name', 1), ('age', 1)]
+    assert first.count == 4
+
+    others = [recommendation for recommendation in recommendations if recommendation is not first]
+    assert not any(recommendation.fields == [('city', 1)] for recommendation in others)
+    notes = [note for recommendation in recommendations for note in recommendation.notes]
+    assert not any('name !=' in note for note in notes)  # != has no indexable field, no recommendation
+
+    report = querylog.report()
+    assert report['indexes'][0]['fields'] == [['city', 1], ['name', 1], ['age', 1]]
+    assert 'index recommendations:' in querylog.format_report()
+
+
+def test_periodic_report(model_cls, querylog):
+    import threading
+    reported = threading.Event()
+    querylog.start(0.01, lambda log: reported.set())
+    model_cls.query().count()
+    assert reported.wait(2)
+    querylog.stop()
@@ -0,0 +1,98 @@
+from datetime import datetime
+
+import pytest
+
+from leancloud_better_storage.storage.fields import DateTimeField, Field, GeoPointField, ObjectField, RefField
+from leancloud_better_storage.storage.models import Model
+from leancloud_better_storage.storage.records import Record
+
+
+@pytest.fixture()
+def models(backend):
+    class RecordCompany(Model):
+        name = Field()
+
+    class RecordPerson(Model):
+        name = Field('Name')
+        age = Field()
+        birthday = DateTimeField()
+        profile = ObjectField()
+        location = GeoPointField()
+        company = RefField(ref_cls=RecordCompany)
+
+    company = RecordCompany.create(name='acme')
+    company.commit()
+    RecordPerson.commit_all(*[RecordPerson.create(name='person {}'.format(i), age=i, birthday=datetime(2000, 1, i + 1),
+                                                  profile={'tags': ['a', i]}, location=(1.0, 2.0), company=company)
+                              for i in range(15)]).raise_for_errors()
+    return RecordCompany, RecordPerson
+
+
+def test_find_raw(models):
+    _, person_cls = models
+    records = person_cls.query().filter(person_cls.age < 5).order_by(person_cls.age.asc).find(raw=True)
+    assert len(records) == 5
+    record = records[3]
+    assert isinstance(record, Record)
+    assert record.name == 'person 3'
+    assert record.age == 3
+    assert record.birthday.replace(tzinfo=None) == datetime(2000, 1, 4)
+    assert record.profile == {'tags': ['a', 3]}
+    assert (record.location.latitude, record.location.longitude) == (1.0, 2.0)
+    assert isinstance(record.created_at, datetime)
+    assert record.object_id == record.raw['objectId']
+
+
+def test_refs_are_records(models):
+    company_cls, person_cls = models
+    record = person_cls.query().find(limit=1, raw=True)[0]
+    assert isinstance(record.company, company_cls.__meta__.record_class)
+    assert record.company.name is None
+
+    record = person_cls.query().includes(person_cls.company).find(limit=1, raw=True)[0]
+    assert record.company.name == 'acme'
+
+
+def test_records_are_read_only(models):
+    _, person_cls = models
+    record = person_cls.query().find(limit=1, raw=True)[0]
+    with pytest.raises(AttributeError):
+        record.name = 'changed'
+    with pytest.raises(AttributeError):
+        record.anything = 1
+    assert not hasattr(record, '__dict__')
+
+
+def test_decode_lazily_once(models):
+    _, person_cls = models
+    record = person_cls.query().find(limit=1, raw=True)[0]
+    assert record._decoded is None
+    assert record.birthday is record.birthday
+    assert list(record._decoded) == ['birthday']
+
+
+def test_to_model(models):
+    _, person_cls = models
+    record = person_cls.query().filter_by(age=1).find(raw=True)[0]
+    person = record.to_model()
+    assert person.dirty_fields == {}
+    assert record.to_dict()['name'] == person.name == 'person 1'
+    person.age = 100
+    person.commit()
+    assert person_cls.query().filter_by(age=100).count() == 1
+
+
+def test_iter_records(backend, models):
+    _, person_cls = models
+    backend.stats.clear()
+    records = list(person_cls.query().filter(person_cls.age >= 3).iter_records(batch_size=4))
+    assert sorted(record.age for record in records) == list(range(3, 15))
+    assert backend.stats['scan'] == 3
+
+
+def test_raw_unknown_class(backend):
+    class RecordNothing(Model):
+        name = Field()
+
+    assert RecordNothing.query().find(raw=True) == ()
+    assert list(RecordNothing.query().iter_records()) == []